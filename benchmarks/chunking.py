@@ -0,0 +1,95 @@
+# rag_system/benchmarks/chunking.py
+# Usage: python -m benchmarks.chunking --pages 40 --queries 10
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from benchmarks.fake_ollama import FakeOllama
+
+CONTEXT_WINDOW = 2048
+
+def dense_pages(count: int, sentences: int, seed: int = 7) -> list[str]:
+    # Long pages of distinct sentences, similar to dense PDF text with one line per sentence
+    rng = random.Random(seed)
+    words = ("retrieval embedding session vector index chunk token latency budget model answer page "
+             "document query context prompt cache ingest parse store overlap window").split()
+    pages = []
+    for p in range(count):
+        lines = []
+        for s in range(sentences):
+            body = " ".join(rng.choice(words) for _ in range(rng.randint(10, 22)))
+            lines.append(f"Fact {p}.{s}: the {body}.")
+        pages.append("\n".join(lines))
+    return pages
+
+def run(strategy: str, pages: list[str], questions: list[str], server: FakeOllama, data_dir: str) -> dict:
+    from llama_index.core.schema import Document
+    from src.config.app_settings import AppSettings
+    from src.ingestion.pdf_loader import compute_hash, tag_documents
+    from src.retrieval.query_engine import QueryEngine
+
+    AppSettings.CHROMA_DB = os.path.join(data_dir, f"chroma_{strategy}")
+    AppSettings.CHUNK_STRATEGY = strategy
+    engine = QueryEngine()
+
+    documents = [
+        Document(text=text, metadata={"filename": "dense.pdf", "page": i + 1}, doc_id=compute_hash(text))
+        for i, text in enumerate(pages)
+    ]
+    tag_documents(documents, file_hash="dense")
+    start = time.perf_counter()
+    chunks = engine.index_manager.add_documents(documents)
+    ingest_seconds = time.perf_counter() - start
+
+    latencies, tokens = [], []
+    for question in questions:
+        server.reset_calls()
+        start = time.perf_counter()
+        engine.query(question, use_cache=False)
+        latencies.append((time.perf_counter() - start) * 1000)
+        tokens.append(server.calls["prompt_tokens"])
+
+    result = {
+        "strategy": strategy,
+        "chunks": chunks,
+        "ingest_s": round(ingest_seconds, 2),
+        "prompt_tokens_mean": round(statistics.mean(tokens)),
+        "prompt_tokens_max": max(tokens),
+        "over_context": sum(1 for t in tokens if t > CONTEXT_WINDOW),
+        "ask_ms_p50": round(statistics.median(latencies), 1),
+        "ask_ms_max": round(max(latencies), 1),
+    }
+    print(f"{strategy:<10} {result['chunks']:>7} {result['prompt_tokens_mean']:>12} {result['prompt_tokens_max']:>11} "
+          f"{result['over_context']:>13} {result['ask_ms_p50']:>10.1f} {result['ask_ms_max']:>10.1f}")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt tokens and /ask latency for per-page vs token-aware chunking")
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--sentences", type=int, default=40, help="Sentences per page (about 20 tokens each)")
+    parser.add_argument("--queries", type=int, default=10)
+    parser.add_argument("--prompt-latency", type=float, default=0.0003, help="Fake prefill cost per prompt token (s)")
+    args = parser.parse_args()
+
+    server = FakeOllama(latency=0.005, item_latency=0.0005, parallel=8, prompt_latency=args.prompt_latency).start()
+    data_dir = tempfile.mkdtemp(prefix="chunking-bench-")
+    os.environ["OLLAMA_BASE_URL"] = server.url
+    os.environ["EMBED_CACHE_ENABLED"] = "false"
+    os.environ["ANSWER_CACHE_ENABLED"] = "false"
+    os.environ["FILE_REGISTRY_DB"] = f"sqlite:///{os.path.join(data_dir, 'file_registry.db')}"
+
+    pages = dense_pages(args.pages, args.sentences)
+    questions = [f"What is fact {i % args.pages}.{i % args.sentences} about?" for i in range(args.queries)]
+    print(f"{'strategy':<10} {'chunks':>7} {'prompt_tok':>12} {'max_tok':>11} {'over_2048':>13} {'p50_ms':>10} {'max_ms':>10}")
+    try:
+        for strategy in ("page", "sentence"):
+            run(strategy, pages, questions, server, data_dir)
+    finally:
+        server.stop()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# rag_system/benchmarks/context_reuse.py
+# Usage: python -m benchmarks.context_reuse --turns 6 [--ollama http://localhost:11434]
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+from benchmarks.end_to_end import WORDS, make_pdf
+from benchmarks.fake_ollama import FakeOllama
+
+def make_questions(turns: int, seed: int = 3) -> list[str]:
+    rng = random.Random(seed)
+    return [f"What does the document say about the {' '.join(rng.sample(WORDS, 2))}? ({turn + 1})" for turn in range(turns)]
+
+async def run_session(engine, contexts, questions: list[str], session_id: str) -> list[dict]:
+    # One session through QueryEngine.aquery, the path /ask takes; contexts=None is LLM_CONTEXT_REUSE=false.
+    # prompt_tokens is what each turn prefills, history_tokens what it continues without prefilling again.
+    engine.contexts = contexts
+    rows = []
+    for question in questions:
+        start = time.perf_counter()
+        result = await engine.aquery(question, session_id, use_cache=False)
+        usage = result["usage"] or {}
+        rows.append({
+            "ms": (time.perf_counter() - start) * 1000,
+            "history_tokens": usage.get("history_tokens", 0),
+            "context_tokens": usage.get("context_tokens", 0),
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+        })
+    return rows
+
+async def run_modes(questions: list[str], data_dir: str, pages: int) -> dict:
+    # Imported after the environment points at the server under test and the temporary stores
+    from src.chat.context_store import ContextStore
+    from src.retrieval.query_engine import QueryEngine
+    engine = QueryEngine()
+    results = {}
+    for mode, contexts in (("off", None), ("on", ContextStore(persist=False))):
+        # Each mode asks in its own session, indexed from its folder by a first question that is not timed
+        session_id = f"context-{mode}"
+        folder = os.path.join(data_dir, "source-data", session_id)
+        os.makedirs(folder)
+        make_pdf(os.path.join(folder, "doc.pdf"), pages, seed=7)
+        await run_session(engine, None, ["What is this document about?"], session_id)
+        results[mode] = await run_session(engine, contexts, questions, session_id)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-turn tokens and latency of one /ask session with and without Ollama context reuse")
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--pages", type=int, default=20, help="Pages of the synthetic PDF the session asks about")
+    parser.add_argument("--ollama", help="Real Ollama base URL; the fake server is used when omitted")
+    parser.add_argument("--prompt-latency", type=float, default=0.0005, help="Fake prefill cost per prompt token (s)")
+    parser.add_argument("--answer-tokens", type=int, default=64)
+    args = parser.parse_args()
+
+    server = None
+    data_dir = tempfile.mkdtemp(prefix="rag_context_bench_")
+    if args.ollama:
+        os.environ["OLLAMA_BASE_URL"] = args.ollama
+    else:
+        server = FakeOllama(latency=0.0, prompt_latency=args.prompt_latency, answer_tokens=args.answer_tokens).start()
+        os.environ["OLLAMA_BASE_URL"] = server.url
+    os.environ["VECTOR_BACKEND"] = "numpy"
+    os.environ["NUMPY_VECTOR_DIR"] = os.path.join(data_dir, "numpy_vectors")
+    os.environ["LEXICAL_DB"] = os.path.join(data_dir, "lexical_index.db")
+    os.environ["EMBED_CACHE_DB"] = os.path.join(data_dir, "embed_cache.db")
+    os.environ["SESSION_DB"] = f"sqlite:///{os.path.join(data_dir, 'chat.db')}"
+    os.environ["FILE_REGISTRY_DB"] = f"sqlite:///{os.path.join(data_dir, 'file_registry.db')}"
+    os.environ["SOURCE_DATA"] = os.path.join(data_dir, "source-data")
+
+    try:
+        results = asyncio.run(run_modes(make_questions(args.turns), data_dir, args.pages))
+    finally:
+        if server:
+            server.stop()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    print(f"{'':>4} {'reuse off':^26} {'reuse on':^35}")
+    print(f"{'turn':>4} {'context':>8} {'prompt':>8} {'ms':>8} {'history':>8} {'context':>8} {'prompt':>8} {'ms':>8}")
+    for turn, (off, on) in enumerate(zip(results["off"], results["on"]), start=1):
+        print(f"{turn:>4} {off['context_tokens']:>8} {off['prompt_tokens']:>8} {off['ms']:>8.0f} "
+              f"{on['history_tokens']:>8} {on['context_tokens']:>8} {on['prompt_tokens']:>8} {on['ms']:>8.0f}")
+    continued = sum(1 for row in results["on"] if row["history_tokens"])
+    print(f"\n{continued}/{args.turns} turns continued an earlier context; "
+          f"retrieved context per turn {sum(r['context_tokens'] for r in results['off']) / args.turns:.0f} tokens without reuse, "
+          f"{sum(r['context_tokens'] for r in results['on']) / args.turns:.0f} with it")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# rag_system/benchmarks/embed_throughput.py
+# Usage: python -m benchmarks.embed_throughput --pages 500
+import argparse
+import os
+import tempfile
+import time
+import requests
+from benchmarks.fake_ollama import FakeOllama
+
+def synthetic_pages(count: int) -> list[str]:
+    return [f"Page {i}. " + "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 30 for i in range(count)]
+
+def legacy_embed(url: str, model: str, texts: list[str]) -> list[list[float]]:
+    # The previous implementation: one blocking request and one new connection per text
+    embeddings = []
+    for text in texts:
+        response = requests.post(f"{url}/api/embeddings", json={"model": model, "prompt": text}, timeout=10)
+        response.raise_for_status()
+        embeddings.append(response.json()["embedding"])
+    return embeddings
+
+def measure(label: str, fn, pages: list[str], server: FakeOllama) -> dict:
+    server.reset_calls()
+    start = time.perf_counter()
+    embeddings = fn(pages)
+    elapsed = time.perf_counter() - start
+    assert len(embeddings) == len(pages)
+    result = {
+        "label": label,
+        "pages": len(pages),
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(len(pages) / elapsed, 1),
+        "http_calls": server.calls["embeddings"] + server.calls["embed"],
+    }
+    print(f"{label:<32} {result['pages_per_sec']:>10.1f} pages/sec  {result['seconds']:>8.3f}s  {result['http_calls']:>5} calls")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding throughput against a fake Ollama server")
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02, help="Fake per-request latency (s)")
+    parser.add_argument("--item-latency", type=float, default=0.002, help="Fake per-text latency (s)")
+    parser.add_argument("--parallel", type=int, default=4, help="Fake server parallel slots")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    server = FakeOllama(latency=args.latency, item_latency=args.item_latency, parallel=args.parallel).start()
+    legacy_server = FakeOllama(latency=args.latency, item_latency=args.item_latency,
+                               parallel=args.parallel, legacy=True).start()
+    os.environ["OLLAMA_BASE_URL"] = server.url
+    os.environ["EMBED_CACHE_ENABLED"] = "false"
+
+    # Imported after the environment points at the fake server
+    from src.embedding.ollama_embedder import OllamaEmbedding
+    from src.embedding.embedding_cache import EmbeddingCache
+
+    pages = synthetic_pages(args.pages)
+    model = "nomic-embed-text"
+    try:
+        measure("before: serial /api/embeddings", lambda texts: legacy_embed(server.url, model, texts), pages, server)
+
+        embedder = OllamaEmbedding(model=model, batch_size=args.batch_size, max_concurrency=args.concurrency)
+        measure("after: batched /api/embed", embedder.get_text_embedding_batch, pages, server)
+
+        fallback = OllamaEmbedding(model=model, batch_size=args.batch_size, max_concurrency=args.concurrency)
+        fallback.url = f"{legacy_server.url}/api/embeddings"
+        fallback.batch_url = f"{legacy_server.url}/api/embed"
+        measure("after: fallback on old server", fallback.get_text_embedding_batch, pages, legacy_server)
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = EmbeddingCache(path=os.path.join(cache_dir, "embed_cache.db"))
+            cached = OllamaEmbedding(model=model, batch_size=args.batch_size,
+                                     max_concurrency=args.concurrency, cache=cache)
+            measure("after: cold embedding cache", cached.get_text_embedding_batch, pages, server)
+            measure("after: warm embedding cache", cached.get_text_embedding_batch, pages, server)
+            cache.close()
+    finally:
+        server.stop()
+        legacy_server.stop()
+
+if __name__ == "__main__":
+    main()
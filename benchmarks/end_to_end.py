@@ -0,0 +1,261 @@
+# rag_system/benchmarks/end_to_end.py
+# Usage: python -m benchmarks.end_to_end --docs 6 --pages 20 --concurrency 1,4,16 --output bench.json
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from benchmarks.fake_ollama import FakeOllama
+
+WORDS = ("retrieval embedding session vector index chunk token latency budget model answer page document "
+         "query context prompt cache ingest parse store overlap window pump valve motor sensor bearing").split()
+
+def make_pdf(path: str, pages: int, seed: int) -> list[str]:
+    # A few paragraphs per page, each page naming one part number; returns the part numbers
+    import fitz
+    rng = random.Random(seed)
+    parts = []
+    pdf = fitz.open()
+    for p in range(pages):
+        part = f"PN-{seed}-{p:04d}"
+        parts.append(part)
+        lines = [f"Section {p + 1}: part {part} specification."]
+        for _ in range(12):
+            lines.append("The " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 14))) + ".")
+        page = pdf.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), "\n".join(lines), fontsize=10)
+    pdf.save(path)
+    pdf.close()
+    return parts
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(q * len(values)) - 1))]
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS; the resource module does not exist on Windows
+    try:
+        import resource
+    except ImportError:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(usage.ru_maxrss / scale, 1)
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+def ingest(client, server: FakeOllama, paths: list[str], pages: int, session_id: str) -> dict:
+    from src.ingestion.job_queue import FAILED, FINISHED_STATUSES
+    server.reset_calls()
+    start = time.perf_counter()
+    job_ids = []
+    for path in paths:
+        with open(path, "rb") as f:
+            response = client.post("/ingest", files={"file": (os.path.basename(path), f, "application/pdf")},
+                                   data={"session_id": session_id})
+        response.raise_for_status()
+        job_ids.append(response.json()["job_id"])
+
+    pending = set(job_ids)
+    failed = 0
+    while pending:
+        for job_id in list(pending):
+            status = client.get(f"/ingest/{job_id}").json()["status"]
+            if status in FINISHED_STATUSES:
+                pending.discard(job_id)
+                failed += status == FAILED
+        time.sleep(0.05)
+    seconds = time.perf_counter() - start
+
+    total_pages = pages * len(paths)
+    return {
+        "files": len(paths),
+        "pages": total_pages,
+        "failed": failed,
+        "seconds": round(seconds, 2),
+        "pages_per_s": round(total_pages / seconds, 1),
+        "embed_requests_per_page": round((server.calls["embed"] + server.calls["embeddings"]) / total_pages, 3),
+        "embed_inputs_per_page": round((server.calls["embed_inputs"] + server.calls["embeddings"]) / total_pages, 3),
+    }
+
+def ask_load(client, server: FakeOllama, questions: list[str], session_id: str, concurrency: int,
+             use_cache: bool) -> dict:
+    def ask(question: str):
+        start = time.perf_counter()
+        response = client.post("/ask", data={"query": question, "session_id": session_id,
+                                             "bypass_cache": str(not use_cache).lower()})
+        return (time.perf_counter() - start) * 1000, response.status_code
+
+    requests = len(questions)
+    server.reset_calls()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(ask, questions))
+    seconds = time.perf_counter() - start
+
+    latencies = [ms for ms, status in results if status == 200]
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": sum(1 for _, status in results if status != 200),
+        "rps": round(requests / seconds, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 1) if latencies else None,
+        "p95_ms": round(percentile(latencies, 0.95), 1) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99), 1) if latencies else None,
+        "embed_requests_per_ask": round((server.calls["embed"] + server.calls["embeddings"]) / requests, 2),
+        "generate_per_ask": round(server.calls["generate"] / requests, 2),
+        "prompt_tokens_per_ask": round(server.calls["prompt_tokens"] / requests),
+    }
+
+def stream_timing(client, questions: list[str], session_id: str) -> dict:
+    # The test client buffers the whole response, so the server-side timings of the "done" event are used
+    first, total = [], []
+    for question in questions:
+        response = client.post("/ask/stream", data={"query": question, "session_id": session_id,
+                                                    "bypass_cache": "true"})
+        for block in response.text.split("\n\n"):
+            if block.startswith("event: done"):
+                done = json.loads(block.split("data: ", 1)[1])
+                first.append(done["time_to_first_token_ms"])
+                total.append(done["total_ms"])
+    return {
+        "requests": len(questions),
+        "ttft_p50_ms": round(statistics.median(first), 1) if first else None,
+        "total_p50_ms": round(statistics.median(total), 1) if total else None,
+    }
+
+def compare(previous: dict, current: dict):
+    # Flattens both runs to "section.metric" keys and prints the relative change
+    def flatten(result: dict) -> dict:
+        rows = {f"ingest.{k}": v for k, v in result["ingest"].items()}
+        for level in result["ask"]:
+            rows.update({f"ask@{level['concurrency']}.{k}": v for k, v in level.items() if k != "concurrency"})
+        rows.update({f"stream.{k}": v for k, v in result["stream"].items()})
+        rows["peak_rss_mb"] = result["peak_rss_mb"]
+        return rows
+
+    old, new = flatten(previous), flatten(current)
+    print(f"\n{'metric':<36} {previous.get('commit') or 'previous':>12} {current.get('commit') or 'current':>12} {'change':>9}")
+    for key, value in new.items():
+        before = old.get(key)
+        if not isinstance(value, (int, float)) or not isinstance(before, (int, float)):
+            continue
+        change = f"{(value - before) / before * 100:+.1f}%" if before else "n/a"
+        print(f"{key:<36} {before:>12} {value:>12} {change:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end ingestion and /ask benchmark of the FastAPI app against a fake Ollama")
+    parser.add_argument("--docs", type=int, default=6, help="Synthetic PDFs to ingest")
+    parser.add_argument("--pages", type=int, default=20, help="Pages per PDF")
+    parser.add_argument("--concurrency", default="1,4,16", help="Concurrent /ask clients per level")
+    parser.add_argument("--requests", type=int, default=48, help="/ask requests per concurrency level")
+    parser.add_argument("--use-cache", action="store_true", help="Let /ask use the answer cache")
+    parser.add_argument("--latency", type=float, default=0.01, help="Fake fixed cost per Ollama request (s)")
+    parser.add_argument("--item-latency", type=float, default=0.001, help="Fake cost per embedded text (s)")
+    parser.add_argument("--prompt-latency", type=float, default=0.0001, help="Fake prefill cost per prompt token (s)")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="Fake generated tokens per second")
+    parser.add_argument("--answer-tokens", type=int, default=32)
+    parser.add_argument("--parallel", type=int, default=4, help="Fake OLLAMA_NUM_PARALLEL")
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    server = FakeOllama(latency=args.latency, item_latency=args.item_latency, parallel=args.parallel,
+                        prompt_latency=args.prompt_latency, token_rate=args.token_rate,
+                        answer_tokens=args.answer_tokens).start()
+    data_dir = tempfile.mkdtemp(prefix="e2e-bench-")
+    os.environ["OLLAMA_BASE_URL"] = server.url
+    os.environ["CHROMA_DB"] = os.path.join(data_dir, "chroma_db")
+    os.environ["NUMPY_VECTOR_DIR"] = os.path.join(data_dir, "numpy_vectors")
+    os.environ["LEXICAL_DB"] = os.path.join(data_dir, "lexical_index.db")
+    os.environ["EMBED_CACHE_DB"] = os.path.join(data_dir, "embed_cache.db")
+    os.environ["SESSION_DB"] = f"sqlite:///{os.path.join(data_dir, 'chat.db')}"
+    os.environ["FILE_REGISTRY_DB"] = f"sqlite:///{os.path.join(data_dir, 'file_registry.db')}"
+    os.environ["SOURCE_DATA"] = os.path.join(data_dir, "source-data")
+
+    # Imported after the environment points at the fake server and the temporary stores
+    from fastapi.testclient import TestClient
+    from src.api.app import app
+
+    try:
+        pdf_dir = os.path.join(data_dir, "pdfs")
+        os.makedirs(pdf_dir)
+        paths, parts = [], []
+        for d in range(args.docs):
+            path = os.path.join(pdf_dir, f"doc{d}.pdf")
+            parts += make_pdf(path, args.pages, seed=d)
+            paths.append(path)
+
+        rng = random.Random(5)
+        # Half identifier lookups (lexical fast path), half descriptive questions (embedding + hybrid search).
+        # Every level gets its own questions, so cached query embeddings do not flatter the later levels
+        levels = [int(c) for c in args.concurrency.split(",")]
+        questions = []
+        for i in range(args.requests * len(levels)):
+            if i % 2:
+                questions.append(rng.choice(parts))
+            else:
+                questions.append(f"What does the document say about the {' '.join(rng.sample(WORDS, 3))}? ({i})")
+
+        warmup_path = os.path.join(pdf_dir, "warmup.pdf")
+        make_pdf(warmup_path, 1, seed=args.docs)
+
+        with TestClient(app) as client:
+            # The first job pays for starting the parse workers, it is reported separately
+            cold_start = ingest(client, server, [warmup_path], 1, session_id="warmup")["seconds"]
+            ingest_result = ingest(client, server, paths, args.pages, session_id="bench")
+            ingest_result["cold_start_s"] = cold_start
+            print(f"ingest: {ingest_result['pages']} pages in {ingest_result['seconds']}s "
+                  f"({ingest_result['pages_per_s']} pages/s, {ingest_result['embed_requests_per_page']} embed requests/page, "
+                  f"cold start {cold_start}s)")
+
+            print(f"{'clients':>8} {'rps':>8} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} {'embeds/ask':>11} {'errors':>7}")
+            ask_results = []
+            for n, level in enumerate(levels):
+                level_questions = questions[n * args.requests:(n + 1) * args.requests]
+                row = ask_load(client, server, level_questions, "bench", level, args.use_cache)
+                ask_results.append(row)
+                print(f"{level:>8} {row['rps']:>8} {row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9} "
+                      f"{row['embed_requests_per_ask']:>11} {row['errors']:>7}")
+
+            stream_result = stream_timing(client, questions[:8], "bench")
+            print(f"stream: time to first token p50 {stream_result['ttft_p50_ms']} ms, "
+                  f"total p50 {stream_result['total_p50_ms']} ms")
+
+        result = {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "config": vars(args),
+            "ingest": ingest_result,
+            "ask": ask_results,
+            "stream": stream_result,
+            # App and fake server share this process; the PDF parse workers are not included
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        print(f"peak RSS: {result['peak_rss_mb']} MB")
+
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.output}")
+
+        if args.compare:
+            with open(args.compare, encoding="utf-8") as f:
+                compare(json.load(f), result)
+    finally:
+        server.stop()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# rag_system/benchmarks/fake_ollama.py
+import argparse
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def fake_embedding(text: str, dim: int) -> list[float]:
+    # Deterministic unit vector seeded by the text hash
+    values = []
+    counter = 0
+    while len(values) < dim:
+        digest = hashlib.sha256(f"{counter}:{text}".encode("utf-8")).digest()
+        values.extend(b / 255.0 - 0.5 for b in digest)
+        counter += 1
+    values = values[:dim]
+    norm = math.sqrt(sum(v * v for v in values)) or 1.0
+    return [v / norm for v in values]
+
+@lru_cache(maxsize=100000)
+def _word_vector(word: str, dim: int) -> tuple:
+    return tuple(fake_embedding(word, dim))
+
+def bag_of_words_embedding(text: str, dim: int) -> list[float]:
+    # Texts sharing words get similar vectors. Only letters count, digits are lost the way
+    # subword tokenizers fragment part numbers and other identifiers
+    values = [0.0] * dim
+    for word in re.findall(r"[a-z]+", text.lower()):
+        for i, v in enumerate(_word_vector(word, dim)):
+            values[i] += v
+    norm = math.sqrt(sum(v * v for v in values)) or 1.0
+    return [v / norm for v in values]
+
+def prompt_token_count(prompt: str) -> int:
+    # Rough tokenizer stand-in, about four characters per token
+    return max(1, len(prompt) // 4)
+
+_FILLER = "the context above describes this in more detail on the cited page".split()
+
+def canned_answer(prompt: str, tokens: int) -> list[str]:
+    # Same prompt, same answer; one word per generated token
+    words = f"Fake answer for a {len(prompt)} character prompt.".split()
+    words += [_FILLER[i % len(_FILLER)] for i in range(max(0, tokens - len(words)))]
+    return [w if i == 0 else " " + w for i, w in enumerate(words[:max(1, tokens)])]
+
+class FakeOllama:
+    """Stand-in for the Ollama HTTP API with configurable latency, used by the benchmarks."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, dim: int = 768,
+                 latency: float = 0.02, item_latency: float = 0.002, parallel: int = 4,
+                 legacy: bool = False, prompt_latency: float = 0.0, bag_of_words: bool = False,
+                 token_rate: float = 0.0, answer_tokens: int = 8):
+        self.dim = dim
+        self.latency = latency              # fixed cost of every request
+        self.item_latency = item_latency    # additional cost per embedded text
+        self.legacy = legacy                # no /api/embed, like Ollama < 0.3
+        self.prompt_latency = prompt_latency    # prefill cost per prompt token
+        self.token_rate = token_rate            # generated tokens per second, 0 for instant
+        self.answer_tokens = answer_tokens      # length of the canned answer
+        self.embed = bag_of_words_embedding if bag_of_words else fake_embedding
+        self.calls = {"embeddings": 0, "embed": 0, "embed_inputs": 0, "generate": 0, "prompt_tokens": 0,
+                      "generated_tokens": 0}
+        self._slots = threading.Semaphore(parallel)   # OLLAMA_NUM_PARALLEL
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllama":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_calls(self):
+        with self._lock:
+            for key in self.calls:
+                self.calls[key] = 0
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.calls[key] += amount
+
+    def _work(self, items: int, prompt_tokens: int = 0):
+        with self._slots:
+            time.sleep(self.latency + self.item_latency * items + self.prompt_latency * prompt_tokens)
+
+    def _decode(self, tokens: list[str], timing: dict):
+        # Generation holds a parallel slot, like prefill
+        with self._slots:
+            start = time.perf_counter_ns()
+            for token in tokens:
+                if self.token_rate:
+                    time.sleep(1.0 / self.token_rate)
+                yield token
+            timing["eval_duration"] = time.perf_counter_ns() - start
+
+    def _generate(self, body: dict):
+        prompt = body.get("prompt", "")
+        prompt_tokens = prompt_token_count(prompt)
+        tokens = canned_answer(prompt, self.answer_tokens)
+        self._count("generate")
+        self._count("prompt_tokens", prompt_tokens)
+        self._count("generated_tokens", len(tokens))
+        start = time.perf_counter_ns()
+        self._work(1, prompt_tokens)
+        # Same fields as Ollama's final message, durations in nanoseconds
+        # A context from an earlier call is already evaluated, only the new prompt is prefilled
+        context = list(body.get("context") or []) + list(range(prompt_tokens + len(tokens)))
+        final = {"model": body.get("model"), "done": True, "prompt_eval_count": prompt_tokens,
+                 "eval_count": len(tokens), "prompt_eval_duration": time.perf_counter_ns() - start,
+                 "context": context}
+
+        if body.get("stream", True):
+            def lines():
+                for token in self._decode(tokens, final):
+                    yield {"model": body.get("model"), "response": token, "done": False}
+                yield {**final, "response": ""}
+            return 200, lines()
+        answer = "".join(self._decode(tokens, final))
+        return 200, {**final, "response": answer}
+
+    def _handle(self, path: str, body: dict):
+        if path == "/api/embeddings":
+            self._count("embeddings")
+            self._work(1)
+            return 200, {"embedding": self.embed(body.get("prompt", ""), self.dim)}
+
+        if path == "/api/embed" and not self.legacy:
+            inputs = body.get("input", [])
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            self._count("embed")
+            self._count("embed_inputs", len(inputs))
+            self._work(len(inputs))
+            return 200, {"model": body.get("model"), "embeddings": [self.embed(t, self.dim) for t in inputs]}
+
+        if path == "/api/generate":
+            return self._generate(body)
+
+        return 404, None
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length)) if length else {}
+                status, payload = fake._handle(self.path, body)
+                if payload is not None and not isinstance(payload, dict):
+                    return self._stream(status, payload)
+                data = json.dumps(payload).encode("utf-8") if payload is not None else b"404 page not found"
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json" if payload is not None else "text/plain")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, status, lines):
+                # Newline-delimited JSON in HTTP/1.1 chunks, the way Ollama streams /api/generate
+                self.send_response(status)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for line in lines:
+                    data = json.dumps(line).encode("utf-8") + b"\n"
+                    self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake Ollama server")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--item-latency", type=float, default=0.002)
+    parser.add_argument("--parallel", type=int, default=4)
+    parser.add_argument("--prompt-latency", type=float, default=0.0, help="Prefill cost per prompt token (s)")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="Generated tokens per second, 0 for instant")
+    parser.add_argument("--answer-tokens", type=int, default=8, help="Tokens in the canned answer")
+    parser.add_argument("--legacy", action="store_true", help="Disable /api/embed")
+    args = parser.parse_args()
+
+    server = FakeOllama(port=args.port, latency=args.latency, item_latency=args.item_latency,
+                        parallel=args.parallel, legacy=args.legacy, prompt_latency=args.prompt_latency,
+                        token_rate=args.token_rate, answer_tokens=args.answer_tokens).start()
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,94 @@
+# rag_system/benchmarks/hybrid_retrieval.py
+# Usage: python -m benchmarks.hybrid_retrieval --docs 2000 --queries 100
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from benchmarks.fake_ollama import FakeOllama
+
+def vocabulary(size: int, rng: random.Random) -> list[str]:
+    return ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(4, 9))) for _ in range(size)]
+
+def corpus(count: int, seed: int = 11) -> list[tuple[str, str, str]]:
+    # Each document mentions one unique part number somewhere in ordinary text
+    rng = random.Random(seed)
+    words = vocabulary(3000, rng)
+    docs = []
+    for i in range(count):
+        part = f"PN-{rng.randint(10000, 99999)}-{i}"
+        text = [rng.choice(words) for _ in range(60)]
+        start = rng.randint(0, 50)
+        phrase = " ".join(text[start:start + 8])
+        text.insert(rng.randint(0, len(text)), part)
+        docs.append((part, phrase, "The " + " ".join(text) + "."))
+    return docs
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and recall of vector, hybrid and lexical fast-path retrieval")
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="Fake per-request embedding latency (s)")
+    args = parser.parse_args()
+
+    # Bag-of-words fake embeddings, so vector search behaves like a (weak) semantic model
+    server = FakeOllama(latency=args.embed_latency, item_latency=0.0005, parallel=8, bag_of_words=True).start()
+    data_dir = tempfile.mkdtemp(prefix="hybrid-bench-")
+    os.environ["OLLAMA_BASE_URL"] = server.url
+    os.environ["EMBED_CACHE_ENABLED"] = "false"
+    os.environ["CHROMA_DB"] = os.path.join(data_dir, "chroma_db")
+    os.environ["LEXICAL_DB"] = os.path.join(data_dir, "lexical_index.db")
+
+    # Imported after the environment points at the fake server and the temporary stores
+    from llama_index.core.schema import Document, QueryBundle
+    from src.ingestion.pdf_loader import compute_hash
+    from src.retrieval.hybrid_retriever import is_keyword_query, HYBRID, VECTOR
+    from src.vectorstore.index_manager import IndexManager
+
+    try:
+        manager = IndexManager()
+        docs = corpus(args.docs)
+        manager.add_documents([
+            Document(text=text, metadata={"filename": "parts.pdf", "page": i}, doc_id=compute_hash(text))
+            for i, (_, _, text) in enumerate(docs)
+        ])
+
+        rng = random.Random(3)
+        targets = rng.sample(range(len(docs)), min(args.queries, len(docs)))
+        # Identifier lookups, and descriptive queries made of words from the document
+        workloads = {
+            "identifier": [(docs[i][0], i) for i in targets],
+            "descriptive": [(docs[i][1], i) for i in targets],
+        }
+
+        def search(mode: str, query: str):
+            retriever = manager.get_retriever(similarity_top_k=args.top_k)
+            if mode == "auto" and is_keyword_query(query):
+                return retriever.retrieve(QueryBundle(query_str=query))
+            retriever.mode = VECTOR if mode == VECTOR else HYBRID
+            embedding = manager.embed_model.get_query_embedding(query)
+            return retriever.retrieve(QueryBundle(query_str=query, embedding=embedding))
+
+        print(f"{'workload':<12} {'retriever':<10} {'recall@' + str(args.top_k):>10} {'mean_ms':>10} {'p95_ms':>10}")
+        for workload, queries in workloads.items():
+            for mode in (VECTOR, HYBRID, "auto"):
+                hits, latencies = 0, []
+                for query, target in queries:
+                    start = time.perf_counter()
+                    nodes = search(mode, query)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    hits += any(n.node.metadata.get("page") == target for n in nodes)
+                latencies.sort()
+                p95 = latencies[int(len(latencies) * 0.95) - 1]
+                label = "before" if mode == VECTOR else mode
+                print(f"{workload:<12} {label:<10} {hits / len(queries):>10.2f} "
+                      f"{statistics.mean(latencies):>10.1f} {p95:>10.1f}")
+    finally:
+        server.stop()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# rag_system/benchmarks/import_time.py
+# Usage: python -m benchmarks.import_time --modules src.api.app,src.cli.ingest --repeat 5 --top 15
+import argparse
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+def isolated_env(data_dir: str) -> dict:
+    # Stores in a scratch directory, importing the app creates its SQLite files
+    env = dict(os.environ, PYTHONPATH=ROOT, LOG_DIR=os.path.join(data_dir, "logs"))
+    env.update({
+        "CHROMA_DB": os.path.join(data_dir, "chroma_db"),
+        "NUMPY_VECTOR_DIR": os.path.join(data_dir, "numpy_vectors"),
+        "LEXICAL_DB": os.path.join(data_dir, "lexical_index.db"),
+        "EMBED_CACHE_DB": os.path.join(data_dir, "embed_cache.db"),
+        "SESSION_DB": f"sqlite:///{os.path.join(data_dir, 'chat.db')}",
+        "FILE_REGISTRY_DB": f"sqlite:///{os.path.join(data_dir, 'file_registry.db')}",
+        "SOURCE_DATA": os.path.join(data_dir, "source-data"),
+    })
+    return env
+
+def measure(module: str, env: dict, cwd: str) -> float:
+    # A fresh interpreter per run, so nothing is cached in sys.modules
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, "-c", code], env=env, cwd=cwd, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+def import_profile(module: str, env: dict, cwd: str) -> dict:
+    # -X importtime self times (us) summed per top-level package
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], env=env, cwd=cwd,
+                            capture_output=True, text=True, check=True)
+    packages = defaultdict(int)
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            name = match.group(4)
+            package = ".".join(name.split(".")[:2]) if name.startswith("src.") else name.split(".")[0]
+            packages[package] += int(match.group(1))
+    return packages
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold import time of the package entry points, each in a fresh interpreter")
+    parser.add_argument("--modules", default="src.api.app,src.cli.ingest,src.vectorstore.index_manager")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Slowest packages listed per module")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="import-bench-")
+    try:
+        env = isolated_env(data_dir)
+        for module in args.modules.split(","):
+            # The first run creates the databases and warms the OS file cache, it is not counted
+            measure(module, env, data_dir)
+            times = [measure(module, env, data_dir) for _ in range(args.repeat)]
+            print(f"\n{module}: median {statistics.median(times) * 1000:.0f} ms, "
+                  f"min {min(times) * 1000:.0f} ms over {args.repeat} runs")
+            packages = import_profile(module, env, data_dir)
+            print(f"  {'package':<36} {'self_ms':>9}")
+            for package, micros in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+                print(f"  {package:<36} {micros / 1000:>9.1f}")
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
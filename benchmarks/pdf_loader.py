@@ -0,0 +1,129 @@
+# rag_system/benchmarks/pdf_loader.py
+# Usage: python -m benchmarks.pdf_loader --pages 2000 [--pdf big.pdf] [--modes legacy,list,stream,ranges]
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.end_to_end import make_pdf, peak_rss_mb
+
+MODES = ("legacy", "list", "stream", "ranges")
+
+def legacy_load(path: str):
+    # The loader before pages were streamed: all Documents plus the concatenated text of the file
+    import fitz
+    from llama_index.core.schema import Document
+    doc = fitz.open(path)
+    chunks, full_text = [], ""
+    for page_num, page in enumerate(doc):
+        text = page.get_text()
+        if not text.strip():
+            continue
+        full_text += text
+        page_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        chunks.append(Document(text=text, metadata={"filename": os.path.basename(path), "page": page_num + 1,
+                                                     "hash": page_hash}, doc_id=page_hash))
+    doc.close()
+    return chunks, hashlib.sha256(full_text.encode("utf-8")).hexdigest()
+
+def children_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return round(usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def run_mode(mode: str, path: str, pages_per_part: int) -> dict:
+    # Runs in its own interpreter, so peak RSS belongs to this mode alone
+    import fitz
+    import llama_index.core.schema
+    from src.ingestion import pdf_loader
+    baseline = peak_rss_mb()
+    pages, file_hash = 0, None
+    pool = pdf_loader.get_parse_pool() if mode == "ranges" else None
+    if pool:
+        pdf_loader.warm_parse_pool()
+
+    start = time.perf_counter()
+    if mode == "legacy":
+        documents, file_hash = legacy_load(path)
+        pages = len(documents)
+    elif mode == "list":
+        documents, file_hash = pdf_loader.load_pdf(path)
+        pages = len(documents)
+    elif mode == "stream":
+        iterator = pdf_loader.iter_pdf_pages(path)
+        while True:
+            try:
+                next(iterator)
+                pages += 1
+            except StopIteration as done:
+                file_hash = done.value
+                break
+    else:
+        for documents, _ in pdf_loader.iter_pdf_parts(path, pages_per_part=pages_per_part, pool=pool):
+            pages += len(documents)
+    seconds = time.perf_counter() - start
+
+    if pool:
+        pdf_loader.shutdown_parse_pool()
+    return {
+        "mode": mode,
+        "pages": pages,
+        "seconds": round(seconds, 2),
+        "pages_per_second": round(pages / seconds, 1) if seconds else 0.0,
+        "rss_after_imports_mb": baseline,
+        "peak_rss_mb": peak_rss_mb(),
+        "workers_peak_rss_mb": children_rss_mb() if pool else None,
+        "file_hash": file_hash,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse time and peak RSS of the PDF loader on one large PDF")
+    parser.add_argument("--pages", type=int, default=2000, help="Pages of the synthetic PDF")
+    parser.add_argument("--pdf", help="Parse this PDF instead of a synthetic one")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--pages-per-part", type=int, default=None, help="Pages per parse task in 'ranges' mode (default: PARSE_PAGES_PER_TASK)")
+    parser.add_argument("--run", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_mode(args.run, args.pdf, args.pages_per_part)))
+        return
+
+    workdir = None
+    path = args.pdf
+    if not path:
+        workdir = tempfile.mkdtemp(prefix="rag_pdf_bench_")
+        path = os.path.join(workdir, "synthetic.pdf")
+        make_pdf(path, args.pages, seed=11)
+        print(f"Generated {path}: {args.pages} pages, {os.path.getsize(path) / 1e6:.1f} MB")
+
+    command = [sys.executable, "-m", "benchmarks.pdf_loader", "--pdf", path]
+    if args.pages_per_part:
+        command += ["--pages-per-part", str(args.pages_per_part)]
+    results = []
+    try:
+        for mode in args.modes.split(","):
+            output = subprocess.run(command + ["--run", mode], capture_output=True, text=True, check=True).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+    finally:
+        if workdir:
+            for name in os.listdir(workdir):
+                os.remove(os.path.join(workdir, name))
+            os.rmdir(workdir)
+
+    print(f"{'mode':<8} {'pages':>6} {'seconds':>8} {'pages/s':>9} {'rss_imports_mb':>15} {'peak_rss_mb':>12} {'workers_mb':>11}")
+    for r in results:
+        print(f"{r['mode']:<8} {r['pages']:>6} {r['seconds']:>8.2f} {r['pages_per_second']:>9.1f} {r['rss_after_imports_mb']:>15} "
+              f"{r['peak_rss_mb']:>12} {r['workers_peak_rss_mb'] if r['workers_peak_rss_mb'] is not None else '-':>11}")
+    hashes = {r["file_hash"] for r in results if r["file_hash"]}
+    if len(hashes) > 1:
+        print("WARNING: the loaders returned different file hashes")
+
+if __name__ == "__main__":
+    main()
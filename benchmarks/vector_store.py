@@ -0,0 +1,97 @@
+# rag_system/benchmarks/vector_store.py
+# Usage: python -m benchmarks.vector_store --sizes 1000,10000,100000
+import argparse
+import shutil
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+SESSIONS = 10
+
+def make_nodes(vectors: np.ndarray):
+    from llama_index.core.schema import TextNode
+    return [
+        TextNode(id_=f"n{i}", text=f"chunk {i}", embedding=vector.tolist(),
+                 metadata={"session_id": f"s{i % SESSIONS}", "page": i})
+        for i, vector in enumerate(vectors)
+    ]
+
+def chroma_store(path: str):
+    from chromadb import PersistentClient
+    from llama_index.vector_stores.chroma import ChromaVectorStore
+    client = PersistentClient(path=path)
+    return ChromaVectorStore(chroma_collection=client.get_or_create_collection(name="bench"))
+
+def numpy_store(path: str, dtype: str):
+    from src.vectorstore.numpy_store import NumpyVectorStore
+    return NumpyVectorStore(path=path, dtype=dtype)
+
+def bench(label: str, store, nodes: list, vectors: np.ndarray, queries: np.ndarray, top_k: int, threads: int):
+    from llama_index.core.vector_stores import MetadataFilters, MetadataFilter, VectorStoreQuery
+
+    start = time.perf_counter()
+    for i in range(0, len(nodes), 5000):
+        store.add(nodes[i:i + 5000])
+    add_seconds = time.perf_counter() - start
+
+    def run(args):
+        q, session = args
+        filters = MetadataFilters(filters=[MetadataFilter(key="session_id", value=session)]) if session else None
+        t = time.perf_counter()
+        result = store.query(VectorStoreQuery(query_embedding=q.tolist(), similarity_top_k=top_k, filters=filters))
+        return (time.perf_counter() - t) * 1000, result.ids
+
+    rows = {}
+    for scope in ("all", "session"):
+        work = [(q, f"s{i % SESSIONS}" if scope == "session" else None) for i, q in enumerate(queries)]
+        timings, recalls = [], []
+        for q, session in work:
+            elapsed, ids = run((q, session))
+            timings.append(elapsed)
+            # Exact top-k for the same filter, the reference for recall
+            candidates = np.arange(len(vectors)) if session is None else np.arange(int(session[1:]), len(vectors), SESSIONS)
+            exact = candidates[np.argsort(-(vectors[candidates] @ q))[:top_k]]
+            recalls.append(len({f"n{i}" for i in exact} & set(ids)) / top_k)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(run, work * 3))
+        qps = len(work) * 3 / (time.perf_counter() - start)
+        rows[scope] = (statistics.median(timings), sorted(timings)[int(len(timings) * 0.95) - 1], qps, statistics.mean(recalls))
+
+    for scope, (p50, p95, qps, recall) in rows.items():
+        print(f"{len(nodes):>8} {label:<14} {scope:<8} {len(nodes) / add_seconds:>10.0f} {p50:>9.2f} {p95:>9.2f} "
+              f"{qps:>9.0f} {recall:>7.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Chroma vs NumPy vector store: add rate, query latency, concurrent QPS, recall")
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--dtypes", default="float32,float16,int8", help="NumPy storage types to compare")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'vectors':>8} {'backend':<14} {'filter':<8} {'adds/s':>10} {'p50_ms':>9} {'p95_ms':>9} {'qps':>9} {'recall':>7}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        vectors = rng.standard_normal((size, args.dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        nodes = make_nodes(vectors)
+
+        backends = [("chroma", lambda path: chroma_store(path))]
+        backends += [(f"numpy-{dtype}", lambda path, dtype=dtype: numpy_store(path, dtype)) for dtype in args.dtypes.split(",")]
+        for label, factory in backends:
+            path = tempfile.mkdtemp(prefix="vector-bench-")
+            try:
+                bench(label, factory(path), nodes, vectors, queries, args.top_k, args.threads)
+            finally:
+                shutil.rmtree(path, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,83 @@
 # rag_system\api\app.py
 from fastapi import FastAPI, Request, UploadFile, File, Form, HTTPException, Query
-from src.ingestion.pdf_loader import load_pdf
-from src.vectorstore.index_manager import IndexManager
-from src.retrieval.query_engine import QueryEngine
-from src.chat.session_store import save_chat, get_history, get_all_history, delete_history
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from src.ingestion.pdf_loader import shutdown_parse_pool
+from src.ingestion.uploads import ArchiveTooLarge, extract_pdfs, save_upload, unique_name
+from src.clients.http_pool import aclose_async_client, close_session
+from src.clients.admission import INTERACTIVE, set_work_class
+from src.container import get_container
+from src.chat.session_store import chat_writer, save_chat, get_history, get_all_history, iter_history_pages, delete_history
+from src.chat.context_store import conversation_contexts
+from src.monitoring.metrics import REQUEST_SECONDS, TIME_TO_FIRST_TOKEN, render, server_timing_header, start_request_timing
 import os
 import tempfile
-from fastapi.responses import JSONResponse
-from typing import Optional
+import zipfile
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from typing import List, Optional
 from uuid import uuid4
 from pathlib import Path
 from src.config.app_settings import AppSettings
-import shutil
-from datetime import datetime
-import csv
+import json
+import time
 import logging
 from src.config.logging_config import setup_logging
 
 setup_logging()
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
-query_engine = QueryEngine()
-index_manager = IndexManager()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Clients are built on first use, or here when warm-up is enabled
+    container = get_container()
+    app.state.container = container
+    container.ingest_queue.start()
+    chat_writer.start()
+    container.session_gc.start()
+    if AppSettings.WARMUP_ON_STARTUP:
+        await run_in_threadpool(container.warm_up)
+    yield
+    await run_in_threadpool(container.close)
+    # Flushes chat records still waiting for a group commit
+    await run_in_threadpool(chat_writer.stop)
+    await aclose_async_client()
+    close_session()
+    shutdown_parse_pool()
+
+app = FastAPI(lifespan=lifespan)
+
+async def get_query_engine():
+    # The first call builds the index manager and clients, that must not block the event loop
+    container = get_container()
+    if container.ready("query_engine"):
+        return container.query_engine
+    return await run_in_threadpool(lambda: container.query_engine)
 
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    logger.info(f"Incoming request: {request.method} {request.url.path} from {request.client.host}")
+    started = time.perf_counter()
+    timings = start_request_timing()
+    status = 500
     try:
         response = await call_next(request)
+        status = response.status_code
+        # Streamed bodies are still being generated here, their header covers the work before the first byte
+        total = time.perf_counter() - started
+        response.headers["Server-Timing"] = server_timing_header(timings, total)
+        logger.info(f"{request.method} {request.url.path} from {request.client.host}: {status} in {total * 1000:.1f} ms")
         return response
     except Exception:
-        logger.exception("Request processing failed")
+        logger.exception(f"Request processing failed: {request.method} {request.url.path}")
         raise
+    finally:
+        # Route templates, not raw paths, keep the label set bounded
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method,
+                                route=getattr(route, "path", "unmatched"), status=status)
+
+@app.get("/metrics")
+def metrics():
+    return Response(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -46,7 +91,8 @@ async def global_exception_handler(request: Request, exc: Exception):
 async def ask(
     query: str = Form(...),
     session_id: str = Form(None),
-    session_name: str = Form(None)
+    session_name: str = Form(None),
+    bypass_cache: bool = Form(False)
 ):
     if not query:
         raise HTTPException(status_code=400, detail="Query is required")
@@ -58,26 +104,99 @@ async def ask(
         # Derive session_name if not provided
         session_name = session_name or query.strip()[:50]
 
+        # Calls to Ollama made for this request queue ahead of ingestion, round-robin with other sessions
+        set_work_class(INTERACTIVE, session_id)
+
         # Ensure source-data/session_id directory exists
         source_folder = Path(f"{AppSettings.SOURCE_DATA}/{session_id}")
         source_folder.mkdir(parents=True, exist_ok=True)
 
         # Perform query
-        result = query_engine.query(query, session_id)
+        query_engine = await get_query_engine()
+        result = await query_engine.aquery(query, session_id, use_cache=not bypass_cache)
 
         # Save chat with optional session name
-        save_chat(session_id, query, result["answer"], result["sources"], session_name)
+        await run_in_threadpool(save_chat, session_id, query, result["answer"], result["sources"], session_name)
 
         return {
             "session_id": session_id,
             "session_name": session_name,
             "answer": result["answer"],
-            "sources": result["sources"]
+            "sources": result["sources"],
+            "cache_hit": result["cache_hit"],
+            "usage": result["usage"]
         }
+    except HTTPException:
+        raise
     except Exception:
         logger.exception("Query processing failed")
         raise HTTPException(status_code=500, detail="Query failed")
     
+@app.post("/ask/stream")
+async def ask_stream(
+    query: str = Form(...),
+    session_id: str = Form(None),
+    session_name: str = Form(None),
+    bypass_cache: bool = Form(False)
+):
+    if not query:
+        raise HTTPException(status_code=400, detail="Query is required")
+
+    try:
+        session_id = session_id or str(uuid4())
+        session_name = session_name or query.strip()[:50]
+        set_work_class(INTERACTIVE, session_id)
+
+        source_folder = Path(f"{AppSettings.SOURCE_DATA}/{session_id}")
+        source_folder.mkdir(parents=True, exist_ok=True)
+
+        started = time.perf_counter()
+        query_engine = await get_query_engine()
+        sources, tokens, cache_hit, usage = await query_engine.astream_query(query, session_id, use_cache=not bypass_cache)
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Streaming query failed")
+        raise HTTPException(status_code=500, detail="Query failed")
+
+    async def event_stream():
+        yield format_sse("sources", {
+            "session_id": session_id,
+            "session_name": session_name,
+            "sources": sources,
+            "cache_hit": cache_hit,
+        })
+
+        answer = ""
+        time_to_first_token = None
+        try:
+            async for chunk in tokens:
+                if time_to_first_token is None:
+                    time_to_first_token = time.perf_counter() - started
+                    TIME_TO_FIRST_TOKEN.observe(time_to_first_token, cache="hit" if cache_hit else "miss")
+                    logger.info(f"Time to first token for session {session_id}: {time_to_first_token:.3f}s")
+                answer = chunk.text
+                if chunk.delta:
+                    yield format_sse("token", {"text": chunk.delta})
+        except Exception:
+            logger.exception("Streaming answer failed")
+            yield format_sse("error", {"detail": "Query failed"})
+            return
+
+        total = time.perf_counter() - started
+        try:
+            await run_in_threadpool(save_chat, session_id, query, answer, sources, session_name)
+        except Exception:
+            logger.exception("Failed to save streamed chat")
+
+        yield format_sse("done", {
+            "time_to_first_token_ms": round((time_to_first_token or total) * 1000, 1),
+            "total_ms": round(total * 1000, 1),
+            "usage": usage,
+        })
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @app.post("/ingest")
 async def ingest(
     file: UploadFile = File(...),
@@ -109,122 +228,175 @@ async def ingest(
         session_folder = Path(AppSettings.SOURCE_DATA) / session_id
         session_folder.mkdir(parents=True, exist_ok=True)
 
-        # Define full file path under session folder
-        file_path = session_folder / file.filename
-
-        # Save uploaded file to disk
-        with open(file_path, "wb") as f:
-            f.write(await file.read())
-
-        # Load PDF and get documents + file hash
-        documents, file_hash = load_pdf(str(file_path))
-														 
-        # Check if file-level hash already exists
-        existing_file_hashes = index_manager.get_all_file_hashes()
-        if file_hash in existing_file_hashes:
-            logger.info(f"Duplicate file detected: {file.filename}, skipping ingestion.")
-            # # Optionally delete the uploaded duplicate file to save space
-            # file_path.unlink()
-            # return {
-            #     "message": f"Skipped ingestion: {file.filename} already ingested.",
-            #     "session_id": session_id
-            # }
-
-        # Add file-level hash to each chunk's metadata
-        for doc in documents:
-            doc.metadata["file_hash"] = file_hash
-
-        # Build index with new documents
-        index_manager.build_index(documents)
+        # Define full file path under session folder, keeping only the base name of the upload
+        filename = Path(file.filename).name
+        file_path = session_folder / filename
 
-        return {
-            "message": f"Ingested {file.filename} with {len(documents)} pages.",
-            "session_id": session_id
-        }
+        # Stream uploaded file to disk, hashing the raw bytes as they are written
+        file_hash, size_bytes = await save_upload(file, file_path)
+
+        # Parsing, embedding and writing happen on the background ingestion workers
+        job_id = await run_in_threadpool(
+            get_container().ingest_queue.submit, session_id, filename, str(file_path), file_hash, size_bytes
+        )
+
+        return JSONResponse(
+            status_code=202,
+            content={
+                "message": f"Queued {filename} for ingestion.",
+                "session_id": session_id,
+                "job_id": job_id,
+                "status": "queued"
+            }
+        )
     except Exception:
         logger.exception("Ingestion failed")
         raise HTTPException(status_code=500, detail="Ingestion failed")
 
+@app.post("/ingest/batch")
+async def ingest_batch(
+    files: List[UploadFile] = File(...),
+    session_id: str = Form(None),
+    ):
+    # Several PDFs, or zip archives of PDFs, ingested together by the pipelined batch worker
+    session_id = session_id or str(uuid4())
+    session_folder = Path(AppSettings.SOURCE_DATA) / session_id
+    session_folder.mkdir(parents=True, exist_ok=True)
+
+    saved, rejected, taken = [], [], set()
+    try:
+        for file in files:
+            name = file.filename or ""
+            if name.lower().endswith(".pdf"):
+                filename = unique_name(name, taken)
+                file_path = session_folder / filename
+                file_hash, size_bytes = await save_upload(file, file_path)
+                saved.append((filename, str(file_path), file_hash, size_bytes))
+            elif name.lower().endswith(".zip"):
+                handle, archive = tempfile.mkstemp(suffix=".zip")
+                os.close(handle)
+                try:
+                    await save_upload(file, Path(archive))
+                    extracted, skipped = await run_in_threadpool(extract_pdfs, Path(archive), session_folder, taken)
+                except zipfile.BadZipFile:
+                    rejected.append({"filename": name, "status": "failed", "error": "Not a valid zip archive"})
+                    continue
+                except ArchiveTooLarge as e:
+                    raise HTTPException(status_code=413, detail={"message": str(e), "filename": name})
+                finally:
+                    os.unlink(archive)
+                saved.extend(extracted)
+                rejected.extend({"filename": f"{name}/{member}", "status": "failed", "error": "Only PDF files are supported"}
+                                for member in skipped)
+            else:
+                rejected.append({"filename": name, "status": "failed", "error": "Only PDF and zip files are supported"})
+
+        if not saved:
+            raise HTTPException(status_code=400, detail={"message": "No PDF files in the upload", "files": rejected})
+
+        batch_id, job_ids = await run_in_threadpool(get_container().ingest_queue.submit_batch, session_id, saved)
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Batch ingestion failed")
+        raise HTTPException(status_code=500, detail="Batch ingestion failed")
+
+    queued = [{"filename": filename, "job_id": job_id, "status": "queued"} for (filename, *_), job_id in zip(saved, job_ids)]
+    return JSONResponse(
+        status_code=202,
+        content={
+            "message": f"Queued {len(saved)} file(s) for ingestion.",
+            "session_id": session_id,
+            "batch_id": batch_id,
+            "status": "queued",
+            "files": queued + rejected,
+        }
+    )
+
+@app.get("/ingest/batch/{batch_id}")
+def ingest_batch_status(batch_id: str):
+    try:
+        batch = get_container().ingest_queue.get_batch(batch_id)
+    except Exception:
+        logger.exception("Failed to retrieve ingestion batch")
+        raise HTTPException(status_code=500, detail="Failed to retrieve ingestion batch")
+    if batch is None:
+        raise HTTPException(status_code=404, detail=f"Ingestion batch not found: {batch_id}")
+    return batch
+
+@app.get("/ingest/{job_id}")
+def ingest_status(job_id: str):
+    try:
+        job = get_container().ingest_queue.get(job_id)
+    except Exception:
+        logger.exception("Failed to retrieve ingestion job")
+        raise HTTPException(status_code=500, detail="Failed to retrieve ingestion job")
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Ingestion job not found: {job_id}")
+    return job
+
 @app.get("/history/{session_id}")
-async def history(session_id: str):
+def history(
+    request: Request,
+    session_id: str,
+    cursor: Optional[int] = Query(None, description="Return records after this id (X-Next-Cursor of the previous page)"),
+    limit: int = Query(AppSettings.HISTORY_PAGE_SIZE, ge=1, le=AppSettings.HISTORY_MAX_PAGE_SIZE),
+    export: bool = Query(False, description="Stream the whole history as one JSON array")
+):
+    if export:
+        return export_history(session_id)
     try:
-        records = get_history(session_id)
-        return [{"query": r.query, "response": r.response, "sources": r.sources} for r in records]
+        records = get_history(session_id, after_id=cursor, limit=limit)
+        return history_page(request, [history_entry(r) for r in records], limit)
     except Exception:
         logger.exception("Failed to retrieve chat history")
         raise HTTPException(status_code=500, detail="Failed to retrieve history")
 
 @app.get("/history")
-async def all_history():
+def all_history(
+    request: Request,
+    cursor: Optional[int] = Query(None, description="Return records after this id (X-Next-Cursor of the previous page)"),
+    limit: int = Query(AppSettings.HISTORY_PAGE_SIZE, ge=1, le=AppSettings.HISTORY_MAX_PAGE_SIZE),
+    export: bool = Query(False, description="Stream the whole history as one JSON array")
+):
+    if export:
+        return export_history()
     try:
-        records = get_all_history()
-        return [
-            {
-                "session_id": r.session_id,
-                "query": r.query,
-                "response": r.response,
-                "sources": r.sources
-            }
-            for r in records
-        ]
+        records = get_all_history(after_id=cursor, limit=limit)
+        return history_page(request, [history_entry(r, with_session=True) for r in records], limit)
     except Exception:
         logger.exception("Failed to retrieve all chat history")
         raise HTTPException(status_code=500, detail="Failed to retrieve all history")
 
 @app.delete("/history/{session_id}")
-async def delete_session_history(session_id: str):
+def delete_session_history(session_id: str):
     try:
         count = delete_history(session_id)
+        # The next question starts a new conversation
+        conversation_contexts.reset(session_id)
         return {"message": f"Deleted {count} records for session {session_id}"}
     except Exception:
         logger.exception("Failed to delete session history")
         raise HTTPException(status_code=500, detail="Failed to delete session history")
 
 @app.delete("/cleanup-unused-sessions")
-async def cleanup_unused_sessions(
-    dry_run: bool = Query(False, description="If true, simulate deletions without actually deleting.")
+def cleanup_unused_sessions(
+    dry_run: bool = Query(False, description="If true, simulate deletions without actually deleting."),
+    time_budget: Optional[float] = Query(None, gt=0, description="Stop after this many seconds, the rest waits for the next run."),
+    min_age_seconds: float = Query(0, ge=0, description="Only remove sessions whose folder is at least this old."),
 ):
-    deleted_sessions = []
-    simulated_sessions = []
-
     try:
-        source_data_path = Path(AppSettings.SOURCE_DATA)
-        if not source_data_path.exists():
+        if not Path(AppSettings.SOURCE_DATA).exists():
             return {"message": "No source-data directory found."}
 
-        for session_folder in source_data_path.iterdir():
-            if session_folder.is_dir():
-                session_id = session_folder.name
-
-                try:
-                    history_records = get_history(session_id)
-                    has_history = len(history_records) > 0
-                except Exception:
-                    has_history = False
-
-                if not has_history:
-                    if dry_run:
-                        simulated_sessions.append(session_id)
-                        logger.info(f"[Dry Run] Would delete: {session_folder}")
-                    else:
-                        try:
-                            shutil.rmtree(session_folder)
-                            delete_history(session_id)
-                            deleted_sessions.append(session_id)
-                            logger.info(f"Deleted unused session folder and history: {session_folder}")
-                        except Exception as e:
-                            logger.warning(f"Failed to cleanup {session_folder}: {e}")
-
-        if not dry_run and deleted_sessions:
-            write_cleanup_log(deleted_sessions)
-
+        report = get_container().session_gc.run(dry_run=dry_run, time_budget=time_budget, min_age=min_age_seconds)
         return {
             "dry_run": dry_run,
             "message": (
-                f"Simulated {len(simulated_sessions)} deletions." if dry_run
-                else f"Deleted {len(deleted_sessions)} unused session(s)."
+                f"Simulated {len(report['sessions'])} deletions." if dry_run
+                else f"Deleted {len(report['sessions'])} unused session(s)."
             ),
-            "sessions": simulated_sessions if dry_run else deleted_sessions
+            **report,
         }
 
     except Exception as e:
@@ -235,14 +407,36 @@ async def cleanup_unused_sessions(
         )
 
 
-def write_cleanup_log(session_ids):
-    log_file = Path(AppSettings.LOG_CLEANUP_FILE)
-    is_new = not log_file.exists()
+def history_entry(record, with_session: bool = False) -> dict:
+    entry = {"id": record.id, "query": record.query, "response": record.response, "sources": record.sources}
+    if with_session:
+        entry = {"session_id": record.session_id, **entry}
+    return entry
+
+
+def history_page(request: Request, entries: list, limit: int) -> JSONResponse:
+    # The body stays a plain list; a full page points at the next one through X-Next-Cursor and Link
+    headers = {}
+    # A page ending in queued records (no id yet) is the last one
+    if len(entries) == limit and entries[-1]["id"] is not None:
+        cursor = entries[-1]["id"]
+        next_url = request.url.include_query_params(cursor=cursor, limit=limit)
+        headers = {"X-Next-Cursor": str(cursor), "Link": f'<{next_url}>; rel="next"'}
+    return JSONResponse(content=entries, headers=headers)
+
+
+def export_history(session_id: str = None) -> StreamingResponse:
+    def body():
+        # One chunk per page of records, not per record
+        separator = ""
+        yield "["
+        for records in iter_history_pages(session_id):
+            yield separator + ",".join(json.dumps(history_entry(r, with_session=session_id is None)) for r in records)
+            separator = ","
+        yield "]"
+
+    return StreamingResponse(body(), media_type="application/json")
+
 
-    with log_file.open("a", newline="") as csvfile:
-        writer = csv.writer(csvfile)
-        if is_new:
-            writer.writerow(["timestamp", "session_id"])
-        timestamp = datetime.now().isoformat()
-        for session_id in session_ids:
-            writer.writerow([timestamp, session_id])
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,94 @@
+# rag_system/chat/context_store.py
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional
+from src.chat.session_store import Session, ChatContext
+from src.config.app_settings import AppSettings
+from src.config.logging_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+class ContextStore:
+    """Ollama generate contexts per chat session, LRU in memory and optionally persisted in the chat database."""
+
+    def __init__(self, max_sessions: int = None, max_tokens: int = None, persist: bool = None):
+        self.max_sessions = max_sessions or AppSettings.LLM_CONTEXT_MAX_SESSIONS
+        self.max_tokens = max_tokens or AppSettings.LLM_CONTEXT_MAX_TOKENS
+        self.persist = AppSettings.LLM_CONTEXT_PERSIST if persist is None else persist
+        self._contexts = OrderedDict()      # session_id -> (model, token ids)
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str, model: str, max_tokens: int = None) -> Optional[List[int]]:
+        with self._lock:
+            entry = self._contexts.get(session_id)
+            if entry is not None:
+                self._contexts.move_to_end(session_id)
+        if entry is None and self.persist:
+            entry = self._load(session_id)
+            if entry is not None:
+                self._remember(session_id, entry)
+        # Token ids only mean something to the model that produced them
+        if entry is None or entry[0] != model:
+            return None
+        if len(entry[1]) > self._limit(max_tokens):
+            # Stored under a larger limit, or for a model with a larger window
+            self.reset(session_id)
+            return None
+        return entry[1]
+
+    def put(self, session_id: str, model: str, context: Optional[List[int]], max_tokens: int = None) -> bool:
+        # Returns False when the context is too long to continue, the session then starts over
+        if not context:
+            return False
+        if len(context) > self._limit(max_tokens):
+            logger.info(f"Context of session {session_id} reached {len(context)} tokens, starting over")
+            self.reset(session_id)
+            return False
+        self._remember(session_id, (model, list(context)))
+        if self.persist:
+            self._save(session_id, model, context)
+        return True
+
+    def reset(self, session_id: str):
+        with self._lock:
+            self._contexts.pop(session_id, None)
+        if self.persist:
+            try:
+                with Session() as s:
+                    s.query(ChatContext).filter_by(session_id=session_id).delete()
+                    s.commit()
+            except Exception:
+                logger.warning(f"Failed to delete stored context of session {session_id}", exc_info=True)
+
+    def _limit(self, max_tokens: int = None) -> int:
+        # A caller may tighten the cap, for example to what its model window leaves, but never raise it
+        return min(self.max_tokens, max_tokens) if max_tokens else self.max_tokens
+
+    def _remember(self, session_id: str, entry: tuple):
+        with self._lock:
+            self._contexts[session_id] = entry
+            self._contexts.move_to_end(session_id)
+            while len(self._contexts) > self.max_sessions:
+                self._contexts.popitem(last=False)
+
+    def _load(self, session_id: str) -> Optional[tuple]:
+        try:
+            with Session() as s:
+                row = s.query(ChatContext.model, ChatContext.context).filter_by(session_id=session_id).first()
+            return (row.model, row.context) if row else None
+        except Exception:
+            logger.warning(f"Failed to load stored context of session {session_id}", exc_info=True)
+            return None
+
+    def _save(self, session_id: str, model: str, context: List[int]):
+        try:
+            with Session() as s:
+                s.merge(ChatContext(session_id=session_id, model=model, context=list(context), updated_at=datetime.now()))
+                s.commit()
+        except Exception:
+            logger.warning(f"Failed to store context of session {session_id}", exc_info=True)
+
+conversation_contexts = ContextStore()
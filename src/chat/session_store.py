@@ -1,30 +1,221 @@
 # rag_system\chat\session_store.py
+import json
 import logging
-from sqlalchemy import create_engine, Column, String, Integer, Text
+import queue
+import re
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from itertools import count as sequence
+from sqlalchemy import create_engine, event, insert, Column, String, Integer, Text, JSON, Index, DateTime
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
 from src.config.app_settings import AppSettings
+from src.monitoring.metrics import CHAT_WRITE_QUEUE, timed
 from src.config.logging_config import setup_logging
 
 setup_logging()
 
 logger = logging.getLogger(__name__)
 
+# PRAGMA user_version of chat.db; 1 = (session_id, id) index and JSON sources
+SCHEMA_VERSION = 1
+_MIGRATION_BATCH = 5000
+# Bound parameters per IN (...) query, below SQLite's variable limit
+_IN_CLAUSE_BATCH = 500
+
 class Base(DeclarativeBase):
     pass
 
 engine = create_engine(AppSettings.SESSION_DB, echo=False)
 Session = sessionmaker(bind=engine)
 
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    if engine.dialect.name != "sqlite":
+        return
+    cursor = dbapi_connection.cursor()
+    # Readers no longer block the writer; NORMAL is durable across crashes in WAL mode
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA cache_size=-16000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
 class ChatHistory(Base):
     __tablename__ = "chat_history"
+    __table_args__ = (Index("ix_chat_history_session_id_id", "session_id", "id"),)
     id = Column(Integer, primary_key=True)
     session_id = Column(String, nullable=False)
     session_name = Column(String, nullable=True)
     query = Column(Text, nullable=False)
     response = Column(Text, nullable=False)
-    sources = Column(Text, nullable=False)
+    sources = Column(JSON, nullable=False)
+
+class ChatContext(Base):
+    # Ollama generate context of a session's conversation, see context_store
+    __tablename__ = "chat_context"
+    session_id = Column(String, primary_key=True)
+    model = Column(String, nullable=False)
+    context = Column(JSON, nullable=False)
+    updated_at = Column(DateTime, nullable=False, default=datetime.now)
+
+def legacy_sources(text: str) -> list:
+    # Sources used to be joined with ", ", and every source reads "<file>, page <n>" itself
+    if not text:
+        return []
+    return re.findall(r"(.*?, page [^,]*)(?:, |$)", text) or [text]
+
+def migrate():
+    Base.metadata.create_all(engine)
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+    if version >= SCHEMA_VERSION:
+        return
+
+    logger.info(f"Migrating chat history schema from version {version} to {SCHEMA_VERSION}")
+    # create_all does not add indexes to a table that already exists
+    for index in ChatHistory.__table__.indexes:
+        index.create(engine, checkfirst=True)
+
+    # Comma-joined sources become JSON arrays, in batches so a large table never sits in memory
+    converted, last_id = 0, 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.exec_driver_sql(
+                "SELECT id, sources FROM chat_history WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, _MIGRATION_BATCH),
+            ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            updates = [(json.dumps(legacy_sources(sources)), row_id) for row_id, sources in rows
+                       if not (sources or "").startswith("[")]
+            if updates:
+                conn.exec_driver_sql("UPDATE chat_history SET sources = ? WHERE id = ?", updates)
+                converted += len(updates)
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    logger.info(f"Chat history migration done, {converted} rows converted to JSON sources")
+
+migrate()
+
+# Shape of the rows read back from chat_history; queued records have no id yet
+ChatRecord = namedtuple("ChatRecord", "id session_id session_name query response sources")
+
+class ChatWriter:
+    """Write-behind queue for chat records, group-committed by a single writer thread."""
+
+    def __init__(self, batch_size: int = None, max_delay: float = None, max_queue: int = None):
+        self.batch_size = batch_size or AppSettings.CHAT_WRITE_BATCH_SIZE
+        self.max_delay = max_delay if max_delay is not None else AppSettings.CHAT_WRITE_MAX_DELAY_MS / 1000
+        self._queue = queue.Queue(maxsize=max_queue or AppSettings.CHAT_WRITE_QUEUE_SIZE)
+        self._pending = {}                      # seq -> record, until committed
+        self._seq = sequence()
+        self._pending_lock = threading.Lock()
+        # Held while a batch commits; readers take it so a record is seen in the queue or in the table, never both
+        self.commit_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def depth(self) -> int:
+        with self._pending_lock:
+            return len(self._pending)
+
+    def start(self):
+        if self.running:
+            return
+        self._thread = threading.Thread(target=self._run, name="chat-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"Chat writer started (batch {self.batch_size}, delay {self.max_delay * 1000:.0f} ms)")
+
+    def stop(self, timeout: float = 10.0):
+        # Everything queued before the sentinel is written first
+        if not self.running:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning(f"Chat writer did not finish within {timeout}s, {self.depth()} record(s) not written")
+        self._thread = None
+
+    def submit(self, record: dict):
+        seq = next(self._seq)
+        with self._pending_lock:
+            self._pending[seq] = record
+        # Blocks when the queue is full, pushing back on writers instead of growing without bound
+        self._queue.put(seq)
 
-Base.metadata.create_all(engine)
+    def pending(self, session_id: str = None) -> list:
+        with self._pending_lock:
+            records = list(self._pending.values())
+        return [
+            ChatRecord(None, r["session_id"], r["session_name"], r["query"], r["response"], r["sources"])
+            for r in records if session_id is None or r["session_id"] == session_id
+        ]
+
+    def discard(self, session_id: str) -> int:
+        with self._pending_lock:
+            seqs = [seq for seq, r in self._pending.items() if r["session_id"] == session_id]
+            for seq in seqs:
+                del self._pending[seq]
+        return len(seqs)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            seq = self._queue.get()
+            if seq is None:
+                break
+            batch = [seq]
+            # Group commit: collect until the batch is full or the delay since the first record has passed
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.batch_size:
+                try:
+                    seq = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if seq is None:
+                    stopping = True
+                    break
+                batch.append(seq)
+            self._write(batch)
+
+    def _write(self, seqs: list):
+        for attempt in range(1, 4):
+            try:
+                with self.commit_lock:
+                    with self._pending_lock:
+                        # Records of a session deleted meanwhile are gone from _pending and skipped
+                        rows = [self._pending[seq] for seq in seqs if seq in self._pending]
+                    if rows:
+                        with Session() as s:
+                            s.execute(insert(ChatHistory), rows)
+                            with timed("save_chat"):
+                                s.commit()
+                    with self._pending_lock:
+                        for seq in seqs:
+                            self._pending.pop(seq, None)
+                logger.info(f"Saved {len(rows)} chat record(s)")
+                return
+            except Exception:
+                logger.exception(f"Failed to write {len(seqs)} chat record(s) (attempt {attempt})")
+                time.sleep(0.1 * attempt)
+
+        with self._pending_lock:
+            for seq in seqs:
+                self._pending.pop(seq, None)
+        logger.error(f"Dropped {len(seqs)} chat record(s) after repeated write failures")
+
+chat_writer = ChatWriter()
+CHAT_WRITE_QUEUE.set_function(chat_writer.depth)
 
 def save_chat(session_id: str, query: str, response: str, sources: list, session_name: str = None):
     try:
@@ -32,48 +223,107 @@ def save_chat(session_id: str, query: str, response: str, sources: list, session
         if not session_name:
             session_name = query.strip()[:50]
 
+        record = {"session_id": session_id, "session_name": session_name, "query": query,
+                  "response": response, "sources": list(sources)}
+        # The API runs the write-behind writer; scripts without it write synchronously
+        if chat_writer.running:
+            chat_writer.submit(record)
+            return
+
         with Session() as s:
-            entry = ChatHistory(
-                session_id=session_id,
-                session_name=session_name,
-                query=query,
-                response=response,
-                sources=", ".join(sources)
-            )
-            s.add(entry)
-            s.commit()
+            s.execute(insert(ChatHistory), [record])
+            with timed("save_chat"):
+                s.commit()
             logger.info(f"Saved chat for session {session_id} with name '{session_name}'")
     except Exception as e:
         logger.exception(f"Failed to save chat for session {session_id} with name '{session_name}': {e}")
         raise RuntimeError(f"Failed to save chat for session {session_id} (name: '{session_name}'): {str(e)}")
 
-def get_history(session_id: str):
-    try:
+def _page(s, session_id: str = None, after_id: int = None, limit: int = None) -> list:
+    # Keyset pagination: (session_id, id) index range scan, no OFFSET. Plain rows, building
+    # ORM instances costs more than the query itself on large exports
+    query = s.query(ChatHistory.id, ChatHistory.session_id, ChatHistory.session_name,
+                    ChatHistory.query, ChatHistory.response, ChatHistory.sources)
+    if session_id is not None:
+        query = query.filter(ChatHistory.session_id == session_id)
+    if after_id is not None:
+        query = query.filter(ChatHistory.id > after_id)
+    query = query.order_by(ChatHistory.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+def _read_with_pending(session_id: str = None, after_id: int = None, limit: int = None) -> list:
+    # Queued records are newer than every stored row, they complete the last page
+    with chat_writer.commit_lock:
         with Session() as s:
-            records = s.query(ChatHistory).filter_by(session_id=session_id).all()
-            logger.info(f"Retrieved {len(records)} history records for session {session_id}")
-            return records
+            records = _page(s, session_id, after_id, limit)
+        if limit is None or len(records) < limit:
+            pending = chat_writer.pending(session_id)
+            records += pending if limit is None else pending[:limit - len(records)]
+    return records
+
+def get_history(session_id: str, after_id: int = None, limit: int = None):
+    try:
+        records = _read_with_pending(session_id, after_id, limit)
+        logger.info(f"Retrieved {len(records)} history records for session {session_id}")
+        return records
     except Exception as e:
         logger.exception(f"Failed to retrieve history for session {session_id}: {e}")
         raise RuntimeError(f"Failed to retrieve history: {str(e)}")
     
-def get_all_history():
+def get_all_history(after_id: int = None, limit: int = None):
     try:
-        with Session() as s:
-            records = s.query(ChatHistory).all()
-            logger.info(f"Retrieved all chat history: {len(records)} records")
-            return records
+        records = _read_with_pending(None, after_id, limit)
+        logger.info(f"Retrieved all chat history: {len(records)} records")
+        return records
     except Exception as e:
         logger.exception("Failed to retrieve all chat history")
         raise RuntimeError(f"Failed to retrieve all chat history: {str(e)}")
 
+def iter_history_pages(session_id: str = None, batch_size: int = 1000):
+    # Whole history one keyset page at a time, for exports that must not load every row
+    after_id = None
+    while True:
+        try:
+            records = _read_with_pending(session_id, after_id, batch_size)
+        except Exception as e:
+            logger.exception(f"Failed to export chat history (session {session_id})")
+            raise RuntimeError(f"Failed to export chat history: {str(e)}")
+        if records:
+            yield records
+        if len(records) < batch_size or records[-1].id is None:
+            return
+        after_id = records[-1].id
+
+def sessions_with_history(session_ids) -> set:
+    # Which of the given sessions have chat history: one DISTINCT query per chunk of ids, not one per session
+    session_ids = list(session_ids)
+    found = set()
+    try:
+        with chat_writer.commit_lock:
+            with Session() as s:
+                for i in range(0, len(session_ids), _IN_CLAUSE_BATCH):
+                    chunk = session_ids[i:i + _IN_CLAUSE_BATCH]
+                    rows = s.query(ChatHistory.session_id).filter(ChatHistory.session_id.in_(chunk)).distinct()
+                    found.update(row.session_id for row in rows)
+            wanted = set(session_ids)
+            found.update(r.session_id for r in chat_writer.pending() if r.session_id in wanted)
+        return found
+    except Exception as e:
+        logger.exception("Failed to look up sessions with chat history")
+        raise RuntimeError(f"Failed to look up sessions with history: {str(e)}")
+
 def delete_history(session_id: str):
     try:
-        with Session() as s:
-            count = s.query(ChatHistory).filter_by(session_id=session_id).delete()
-            s.commit()
-            logger.info(f"Deleted {count} chat records for session {session_id}")
-            return count
+        # Queued records of the session are dropped too, so they do not reappear after the delete
+        with chat_writer.commit_lock:
+            with Session() as s:
+                count = s.query(ChatHistory).filter_by(session_id=session_id).delete()
+                s.commit()
+            count += chat_writer.discard(session_id)
+        logger.info(f"Deleted {count} chat records for session {session_id}")
+        return count
     except Exception as e:
         logger.exception(f"Failed to delete history for session {session_id}")
         raise RuntimeError(f"Failed to delete history: {str(e)}")
@@ -0,0 +1,194 @@
+# rag_system\cli\compact.py
+import argparse
+import hashlib
+import logging
+import os
+import random
+import statistics
+import time
+from pathlib import Path
+from src.config.app_settings import AppSettings
+from src.config.logging_config import setup_logging
+from src.container import get_container
+from src.ingestion.file_registry import remove_file_session
+from src.maintenance.session_gc import folder_size
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+def storage_size() -> int:
+    # Vector files plus the lexical index written next to them
+    vectors = AppSettings.NUMPY_VECTOR_DIR if AppSettings.VECTOR_BACKEND == "numpy" else AppSettings.CHROMA_DB
+    size = folder_size(Path(vectors))
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(AppSettings.LEXICAL_DB + suffix):
+            size += os.path.getsize(AppSettings.LEXICAL_DB + suffix)
+    return size
+
+class CollectionCompaction:
+    """Pages through the vector collection once, then removes duplicate chunks and chunks whose file is gone from SOURCE_DATA."""
+
+    def __init__(self, index_manager, batch_size: int, queries: int, top_k: int, seed: int = 0):
+        self.index_manager = index_manager
+        self.batch_size = min(batch_size, index_manager.max_batch_size)
+        self.queries = queries
+        self.top_k = top_k
+        self.random = random.Random(seed)
+        self.duplicates = []        # ids of later copies of a chunk already seen
+        self.orphans = []           # ids of chunks of files no longer in their session folder
+        self.orphan_files = set()   # (file_hash, session_id) links to drop from the file registry
+        self.samples = []           # kept ids whose vectors are used as search queries
+        self.stats = {"scanned": 0, "duplicates": 0, "orphans": 0, "shared": 0}
+
+    def run(self, dry_run: bool = False) -> dict:
+        started = time.perf_counter()
+        size_before = storage_size()
+        self.scan()
+        queries = self._query_vectors()
+        before = self.measure_search(queries)
+        report = dict(self.stats, dry_run=dry_run, bytes_before=size_before, search_before=before)
+        if dry_run:
+            self._summary(report, started)
+            return report
+
+        removed = self.index_manager.delete_ids(self.duplicates + self.orphans)
+        for file_hash, session_id in self.orphan_files:
+            remove_file_session(file_hash, session_id)
+        self.index_manager.compact_storage()
+
+        size_after = storage_size()
+        report.update(
+            removed=removed,
+            bytes_after=size_after,
+            bytes_reclaimed=size_before - size_after,
+            search_after=self.measure_search(queries),
+        )
+        self._summary(report, started)
+        return report
+
+    def scan(self):
+        # One read-only pass; only a digest per kept chunk is held, not its text or vector
+        seen = set()
+        folders = {}
+        offset = 0
+        while True:
+            page = self.index_manager.collection.get(include=["metadatas", "documents"], limit=self.batch_size, offset=offset)
+            if not page["ids"]:
+                break
+            for node_id, metadata, document in zip(page["ids"], page["metadatas"], page["documents"]):
+                self.stats["scanned"] += 1
+                session_id = metadata.get("session_id") or ""
+                if not session_id:
+                    # Bulk-ingested chunks belong to no session folder, only duplicates are removed
+                    self.stats["shared"] += 1
+                elif metadata.get("filename"):
+                    key = (session_id, metadata["filename"])
+                    if key not in folders:
+                        folders[key] = (Path(AppSettings.SOURCE_DATA) / session_id / metadata["filename"]).is_file()
+                    if not folders[key]:
+                        self.orphans.append(node_id)
+                        self.orphan_files.add((metadata.get("file_hash"), session_id))
+                        continue
+
+                # Chunks written by different ingests of the same page carry the same text under different ids
+                digest = hashlib.sha1(
+                    f"{session_id}|{metadata.get('file_hash')}|{metadata.get('page')}|{document or ''}".encode("utf-8")
+                ).digest()
+                if digest in seen:
+                    self.duplicates.append(node_id)
+                    continue
+                seen.add(digest)
+                self._sample(node_id, len(seen))
+            offset += len(page["ids"])
+            logger.info(f"Scanned {self.stats['scanned']} vectors: {len(self.duplicates)} duplicates, {len(self.orphans)} orphans")
+        self.stats["duplicates"] = len(self.duplicates)
+        self.stats["orphans"] = len(self.orphans)
+
+    def _sample(self, node_id: str, kept: int):
+        # Reservoir sample over the kept chunks, so every query still has its vector after compaction
+        if len(self.samples) < self.queries:
+            self.samples.append(node_id)
+        else:
+            slot = self.random.randrange(kept)
+            if slot < self.queries:
+                self.samples[slot] = node_id
+
+    def _query_vectors(self) -> list:
+        if not self.samples:
+            return []
+        found = self.index_manager.collection.get(ids=self.samples, include=["embeddings", "metadatas"])
+        return [
+            (list(embedding), metadata.get("session_id") or None)
+            for embedding, metadata in zip(found["embeddings"], found["metadatas"])
+        ]
+
+    def measure_search(self, queries: list) -> dict:
+        # Session-scoped top-k searches like /ask makes; also how many hits repeat a text already in the same top-k
+        from llama_index.core.vector_stores import MetadataFilters, MetadataFilter, VectorStoreQuery
+        if not queries:
+            return {"queries": 0}
+        latencies, hits, repeated = [], 0, 0
+        for i, (embedding, session_id) in enumerate(queries):
+            filters = MetadataFilters(filters=[MetadataFilter(key="session_id", value=session_id)]) if session_id else None
+            query = VectorStoreQuery(query_embedding=embedding, similarity_top_k=self.top_k, filters=filters)
+            started = time.perf_counter()
+            result = self.index_manager.vector_store.query(query)
+            elapsed = time.perf_counter() - started
+            # The first search loads the index from disk and is not counted
+            if i == 0 and len(queries) > 1:
+                continue
+            latencies.append(elapsed)
+            texts = [node.get_content() for node in result.nodes or []]
+            hits += len(texts)
+            repeated += len(texts) - len(set(texts))
+        latencies.sort()
+        return {
+            "queries": len(latencies),
+            "p50_ms": round(statistics.median(latencies) * 1000, 2),
+            "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 2),
+            "duplicate_hits": round(repeated / hits, 3) if hits else 0.0,
+        }
+
+    def _summary(self, report: dict, started: float):
+        logger.info(
+            f"{'Dry run' if report['dry_run'] else 'Compaction'} finished in {time.perf_counter() - started:.1f}s: "
+            f"{report['scanned']} vectors scanned, {report['duplicates']} duplicates, {report['orphans']} orphans, "
+            f"{report['shared']} without a session"
+        )
+        before = report["search_before"]
+        if "bytes_after" in report:
+            after = report["search_after"]
+            logger.info(f"Storage: {report['bytes_before']} -> {report['bytes_after']} bytes ({report['bytes_reclaimed']} reclaimed)")
+            if before["queries"]:
+                logger.info(
+                    f"Search top-{self.top_k}: p50 {before['p50_ms']} -> {after['p50_ms']} ms, p95 {before['p95_ms']} -> "
+                    f"{after['p95_ms']} ms, duplicate hits {before['duplicate_hits']:.1%} -> {after['duplicate_hits']:.1%}"
+                )
+        else:
+            logger.info(f"Storage: {report['bytes_before']} bytes; nothing was removed")
+            if before["queries"]:
+                logger.info(f"Search top-{self.top_k}: p50 {before['p50_ms']} ms, p95 {before['p95_ms']} ms, "
+                            f"duplicate hits {before['duplicate_hits']:.1%}")
+
+def compact_collection(dry_run: bool = False, batch_size: int = None, queries: int = 50, top_k: int = 5) -> dict:
+    compaction = CollectionCompaction(
+        get_container().index_manager,
+        batch_size=batch_size or AppSettings.SESSION_GC_BATCH_SIZE,
+        queries=queries,
+        top_k=top_k,
+    )
+    return compaction.run(dry_run=dry_run)
+
+if __name__ == "__main__":
+    # Offline maintenance: stop the API first, it keeps its own view of the vector files
+    parser = argparse.ArgumentParser(description="Remove duplicate and orphaned vectors and reclaim their space")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be removed")
+    parser.add_argument("--batch-size", type=int, default=AppSettings.SESSION_GC_BATCH_SIZE, help="Vectors read per page")
+    parser.add_argument("--queries", type=int, default=50, help="Searches timed before and after")
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    try:
+        compact_collection(dry_run=args.dry_run, batch_size=args.batch_size, queries=args.queries, top_k=args.top_k)
+    except Exception as e:
+        logger.exception(f"Compaction terminated with error: {e}")
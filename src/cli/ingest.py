@@ -1,47 +1,284 @@
 # rag_system\cli\ingest.py
 import logging
 import os
+import json
+import time
+import hashlib
 import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from src.config.app_settings import AppSettings
 from src.config.logging_config import setup_logging
-from src.ingestion.pdf_loader import load_pdf
-from src.vectorstore.index_manager import IndexManager
+from src.ingestion.file_registry import get_file, get_file_sessions, register_file
+from src.ingestion.pdf_loader import load_pdf_first_range, load_pdf_range, tag_documents
+from src.container import get_container
+from src.clients.admission import BULK, work_class
 
 setup_logging()
 logger = logging.getLogger(__name__)
 
-index_manager = IndexManager()
+MANIFEST_NAME = ".ingest_manifest.jsonl"
 
-def ingest_folder(folder: str):
+def hash_file(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(AppSettings.UPLOAD_CHUNK_SIZE):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def parse_file(path: str, stop: int):
+    # Runs in a worker process: hash the raw bytes (same key as /ingest uploads) and parse the first
+    # range of pages, the page count tells which other ranges to submit
+    file_hash = hash_file(path)
+    documents, page_count = load_pdf_first_range(path, stop)
+    return file_hash, documents, page_count
+
+class Manifest:
+    """Append-only JSONL record of ingested files, keyed by path and matched on size, mtime and hash."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash can leave a truncated last line
+                        logger.warning(f"Ignoring malformed manifest line in {path}")
+                        continue
+                    self.entries[entry["path"]] = entry
+        self._file = open(path, "a", encoding="utf-8")
+
+    def is_unchanged(self, path: str, stat: os.stat_result) -> bool:
+        entry = self.entries.get(path)
+        return entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+
+    def record(self, path: str, stat: os.stat_result, file_hash: str, pages: int, status: str):
+        entry = {
+            "path": path,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "hash": file_hash,
+            "pages": pages,
+            "status": status,
+            "ingested_at": datetime.now().isoformat(),
+        }
+        self.entries[path] = entry
+        self._file.write(json.dumps(entry) + "\n")
+
+    def flush(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+class FolderIngestion:
+    """Parses PDFs in page ranges in a process pool and embeds/writes them in page batches, committing each batch to the manifest."""
+
+    def __init__(self, index_manager, manifest: Manifest, workers: int, batch_size: int):
+        self.index_manager = index_manager
+        self.manifest = manifest
+        self.workers = workers
+        self.batch_size = batch_size
+        self.pages_per_part = AppSettings.PARSE_PAGES_PER_TASK
+        self.pending = []       # (path, stat, file_hash, documents) parsed but not yet written
+        self.pending_pages = 0
+        self.seen_hashes = set()
+        self.replaced = []      # hashes of previous versions of changed files
+        self.stats = {"files": 0, "unchanged": 0, "duplicate": 0, "ingested": 0, "failed": 0, "pages": 0, "chunks": 0}
+        self.started = time.perf_counter()
+
+    def run(self, paths: list):
+        self.stats["files"] = len(paths)
+        todo = []
+        for path in paths:
+            stat = os.stat(path)
+            if self.manifest.is_unchanged(path, stat):
+                self.stats["unchanged"] += 1
+            else:
+                todo.append((path, stat))
+        logger.info(f"{len(todo)} of {len(paths)} PDF files need ingestion ({self.stats['unchanged']} unchanged)")
+
+        # Only a few page ranges are parsed at once, so memory does not grow with the folder. The ranges of
+        # files already started go before new files, a long PDF is spread over every worker.
+        max_in_flight = self.workers * 2
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            in_flight = {}          # future -> (path, first page of its range)
+            queued = deque()        # (path, start) ranges of files whose page count is known
+            files = {}              # path -> stat, hash, parsed ranges and ranges left of a file being parsed
+            remaining = iter(todo)
+            while True:
+                while len(in_flight) < max_in_flight:
+                    if queued:
+                        path, start = queued.popleft()
+                        if path in files:
+                            future = pool.submit(load_pdf_range, path, start, start + self.pages_per_part)
+                            in_flight[future] = (path, start)
+                        continue
+                    path, stat = next(remaining, (None, None))
+                    if path is None:
+                        break
+                    files[path] = {"stat": stat, "hash": None, "parts": {}, "left": 1}
+                    in_flight[pool.submit(parse_file, path, self.pages_per_part)] = (path, 0)
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, start = in_flight.pop(future)
+                    self._parsed(path, start, future, files, queued)
+                if self.pending_pages >= self.batch_size:
+                    self._flush()
+            self._flush()
+
+        self._remove_replaced()
+        self._summary()
+        return self.stats
+
+    def _parsed(self, path: str, start: int, future, files: dict, queued: deque):
+        state = files.get(path)
+        if state is None:
+            # Another range of the file failed, or the file turned out to be a duplicate
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            del files[path]
+            self.seen_hashes.discard(state["hash"])
+            self.stats["failed"] += 1
+            logger.error(f"Failed to load {path}: {e}")
+            return
+
+        if start == 0:
+            file_hash, documents, page_count = result
+            state["hash"] = file_hash
+            if not self._accept(path, state["stat"], file_hash, page_count):
+                del files[path]
+                return
+            later = [(path, s) for s in range(self.pages_per_part, page_count, self.pages_per_part)]
+            state["left"] += len(later)
+            queued.extendleft(reversed(later))
+        else:
+            documents = result
+        state["parts"][start] = documents
+        state["left"] -= 1
+        if state["left"] == 0:
+            del files[path]
+            documents = [doc for _, docs in sorted(state["parts"].items()) for doc in docs]
+            self._collect(path, state["stat"], state["hash"], documents)
+
+    def _accept(self, path: str, stat: os.stat_result, file_hash: str, pages: int) -> bool:
+        # Decided on the first range, the rest of a duplicate is never parsed
+        entry = self.manifest.entries.get(path)
+        # Touched but identical files, and files already in the vector store, are only recorded
+        if (entry and entry["hash"] == file_hash) or file_hash in self.seen_hashes or get_file(file_hash):
+            self.stats["duplicate"] += 1
+            self.manifest.record(path, stat, file_hash, pages, "duplicate")
+            logger.info(f"Skipping {os.path.basename(path)}: already ingested")
+            return False
+        if entry and entry["status"] == "ingested":
+            self.replaced.append(entry["hash"])
+        self.seen_hashes.add(file_hash)
+        return True
+
+    def _collect(self, path: str, stat: os.stat_result, file_hash: str, documents: list):
+        # Bulk rows belong to no API session, an explicit "" lets deletes target them alone
+        tag_documents(documents, file_hash=file_hash, session_id="")
+        self.pending.append((path, stat, file_hash, documents))
+        self.pending_pages += len(documents)
+
+    def _flush(self):
+        if not self.pending:
+            self.manifest.flush()
+            return
+        batch, self.pending, self.pending_pages = self.pending, [], 0
+        try:
+            # A previous run may have crashed after writing part of these files. Copies attached to
+            # API sessions are theirs and stay
+            for _, _, file_hash, _ in batch:
+                self.index_manager.delete_file_vectors(file_hash, session_id="")
+            documents = [doc for _, _, _, docs in batch for doc in docs]
+            chunks = self.index_manager.add_documents(documents, batch_size=self.batch_size)
+        except Exception as e:
+            self.stats["failed"] += len(batch)
+            self.seen_hashes.difference_update(file_hash for _, _, file_hash, _ in batch)
+            logger.error(f"Failed to write a batch of {len(batch)} files: {e}")
+            return
+
+        for path, stat, file_hash, docs in batch:
+            register_file(file_hash, os.path.basename(path), len(docs), stat.st_size)
+            self.manifest.record(path, stat, file_hash, len(docs), "ingested")
+        self.manifest.flush()
+
+        self.stats["ingested"] += len(batch)
+        self.stats["pages"] += len(documents)
+        self.stats["chunks"] += chunks
+        elapsed = time.perf_counter() - self.started
+        processed = self.stats["unchanged"] + self.stats["duplicate"] + self.stats["ingested"] + self.stats["failed"]
+        logger.info(
+            f"Progress: {processed}/{self.stats['files']} files, {self.stats['pages']} pages "
+            f"({self.stats['pages'] / elapsed:.1f} pages/s)"
+        )
+
+    def _remove_replaced(self):
+        # Drop vectors of old file versions unless another file or an API session still uses them
+        current = {entry["hash"] for entry in self.manifest.entries.values()}
+        for file_hash in self.replaced:
+            if file_hash in current or get_file_sessions(file_hash):
+                continue
+            self.index_manager.delete_file_vectors(file_hash, session_id="")
+            logger.info(f"Removed vectors of replaced file version {file_hash}")
+
+    def _summary(self):
+        elapsed = time.perf_counter() - self.started
+        s = self.stats
+        logger.info(
+            f"Ingestion complete in {elapsed:.1f}s: {s['ingested']} ingested, {s['unchanged']} unchanged, "
+            f"{s['duplicate']} duplicate, {s['failed']} failed; {s['pages']} pages, {s['chunks']} chunks "
+            f"({s['pages'] / elapsed if elapsed else 0:.1f} pages/s, {s['ingested'] / elapsed if elapsed else 0:.2f} files/s)"
+        )
+
+def ingest_folder(folder: str, workers: int = None, batch_size: int = None, manifest_path: str = None) -> dict:
     if not os.path.isdir(folder):
         logger.error(f"Provided path is not a directory: {folder}")
         raise ValueError(f"Path {folder} is not a directory")
 
-    all_docs = []
-    for filename in os.listdir(folder):
+    paths = []
+    for filename in sorted(os.listdir(folder)):
         if not filename.lower().endswith(".pdf"):
-            logger.warning(f"Skipping non-PDF file: {filename}")
+            if filename != MANIFEST_NAME:
+                logger.warning(f"Skipping non-PDF file: {filename}")
             continue
-        path = os.path.join(folder, filename)
-        try:
-            docs = load_pdf(path)
-            all_docs.extend(docs)
-            logger.info(f"Loaded {filename} ({len(docs)} chunks)")
-        except Exception as e:
-            logger.exception(f"Failed to load {filename}: {e}")
+        paths.append(os.path.abspath(os.path.join(folder, filename)))
 
+    manifest = Manifest(manifest_path or os.path.join(folder, MANIFEST_NAME))
     try:
-        index_manager.build_index(all_docs)
-        logger.info(f"Ingestion complete: {len(all_docs)} total chunks")
-    except Exception as e:
-        logger.exception(f"Index build failed: {e}")
-        logger.error("Ingestion failed.")
+        ingestion = FolderIngestion(
+            get_container().index_manager,
+            manifest,
+            workers=workers or AppSettings.PARSE_WORKERS,
+            batch_size=batch_size or AppSettings.INGEST_BATCH_SIZE,
+        )
+        # Bulk calls wait for an Ollama slot instead of failing
+        with work_class(BULK):
+            return ingestion.run(paths)
+    finally:
+        manifest.close()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--path", required=True, help="Folder with PDFs")
+    parser.add_argument("--workers", type=int, default=AppSettings.PARSE_WORKERS, help="PDF parsing processes")
+    parser.add_argument("--batch-size", type=int, default=AppSettings.INGEST_BATCH_SIZE, help="Pages embedded and written per batch")
+    parser.add_argument("--manifest", default=None, help=f"Manifest file (default: <path>/{MANIFEST_NAME})")
     args = parser.parse_args()
 
     try:
-        ingest_folder(args.path)
+        ingest_folder(args.path, workers=args.workers, batch_size=args.batch_size, manifest_path=args.manifest)
     except Exception as e:
-        logger.exception(f"CLI ingestion terminated with error: {e}")
\ No newline at end of file
+        logger.exception(f"CLI ingestion terminated with error: {e}")
@@ -0,0 +1,219 @@
+# rag_system/clients/admission.py
+import asyncio
+import contextvars
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from src.config.app_settings import AppSettings
+from src.monitoring.metrics import ADMISSION_ACTIVE, ADMISSION_QUEUE, ADMISSION_REJECTED, ADMISSION_WAIT, observe_stage
+from src.config.logging_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+PRIORITIES = (INTERACTIVE, BULK)  # a free slot goes to the first class with a waiting call
+
+class Overloaded(RuntimeError):
+    """An interactive call was refused because the Ollama queue is full or its wait ran out."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+# Priority and session of the calls made by the current request or job; threads started
+# through run_in_threadpool / asyncio.to_thread and tasks inherit it
+_work_class: contextvars.ContextVar[tuple] = contextvars.ContextVar("work_class", default=(INTERACTIVE, ""))
+
+def set_work_class(priority: str, session_id: str = None):
+    _work_class.set((priority, session_id or ""))
+
+@contextmanager
+def work_class(priority: str, session_id: str = None):
+    token = _work_class.set((priority, session_id or ""))
+    try:
+        yield
+    finally:
+        _work_class.reset(token)
+
+class _Waiter:
+    __slots__ = ("priority", "session_id", "wake", "granted")
+
+    def __init__(self, priority: str, session_id: str, wake):
+        self.priority = priority
+        self.session_id = session_id
+        self.wake = wake
+        self.granted = False
+
+class Slot:
+    """One admitted call to Ollama; release() hands the slot to the next waiting call."""
+
+    __slots__ = ("_scheduler", "_started")
+
+    def __init__(self, scheduler):
+        self._scheduler = scheduler
+        self._started = time.perf_counter()
+
+    def release(self):
+        # Idempotent, a stream may be closed both by its consumer and by an error
+        scheduler, self._scheduler = self._scheduler, None
+        if scheduler is not None:
+            scheduler._release(time.perf_counter() - self._started)
+
+class AdmissionScheduler:
+    """Bounds the calls in flight to Ollama. Waiting calls are served interactive before bulk and
+    round-robin across sessions within a class; interactive calls fail fast with Overloaded when
+    the queue is full or they waited longer than max_wait, bulk calls wait as long as it takes."""
+
+    def __init__(self, concurrency: int = None, queue_size: int = None, max_wait: float = None):
+        self.concurrency = concurrency if concurrency is not None else AppSettings.ADMISSION_CONCURRENCY
+        self.queue_size = queue_size if queue_size is not None else AppSettings.ADMISSION_QUEUE_SIZE
+        self.max_wait = max_wait if max_wait is not None else AppSettings.ADMISSION_MAX_WAIT
+        self._lock = threading.Lock()
+        self._active = 0
+        # Per class: session_id -> its waiting calls; the session served last moves to the end
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES}
+        self._depth = {priority: 0 for priority in PRIORITIES}
+        # Moving average of how long a call holds its slot, for Retry-After
+        self._hold_time = 1.0
+
+    def depth(self, priority: str = None) -> int:
+        return self._depth[priority] if priority else sum(self._depth.values())
+
+    def active(self) -> int:
+        return self._active
+
+    @contextmanager
+    def slot(self):
+        slot = self.acquire()
+        try:
+            yield slot
+        finally:
+            slot.release()
+
+    @asynccontextmanager
+    async def aslot(self):
+        slot = await self.aacquire()
+        try:
+            yield slot
+        finally:
+            slot.release()
+
+    def acquire(self) -> Slot:
+        if self.concurrency <= 0:
+            return Slot(None)
+        started = time.perf_counter()
+        event = threading.Event()
+        waiter = self._admit(event.set)
+        if waiter is not None and not event.wait(self._timeout(waiter)):
+            self._give_up(waiter, started)
+        return self._admitted(waiter, started)
+
+    async def aacquire(self) -> Slot:
+        if self.concurrency <= 0:
+            return Slot(None)
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+        # Granted by whichever thread or task releases a slot
+        waiter = self._admit(lambda: loop.call_soon_threadsafe(_resolve, granted))
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(granted), self._timeout(waiter))
+            except asyncio.TimeoutError:
+                self._give_up(waiter, started)
+            except asyncio.CancelledError:
+                # A client that went away must not keep a slot it was granted meanwhile
+                if not self._withdraw(waiter):
+                    self._release(None)
+                raise
+        return self._admitted(waiter, started)
+
+    def _admit(self, wake):
+        priority, session_id = _work_class.get()
+        with self._lock:
+            if self._active < self.concurrency:
+                self._active += 1
+                return None
+            if priority == INTERACTIVE and self._depth[INTERACTIVE] >= self.queue_size:
+                retry_after = self._retry_after()
+                ADMISSION_REJECTED.inc(reason="queue_full")
+                raise Overloaded(f"Ollama queue is full ({self._depth[INTERACTIVE]} interactive calls waiting)", retry_after)
+            waiter = _Waiter(priority, session_id, wake)
+            self._queues[priority].setdefault(session_id, deque()).append(waiter)
+            self._depth[priority] += 1
+            return waiter
+
+    def _timeout(self, waiter: _Waiter):
+        return self.max_wait if waiter.priority == INTERACTIVE and self.max_wait > 0 else None
+
+    def _give_up(self, waiter: _Waiter, started: float):
+        # Granted between the timeout and taking the lock: the slot is ours after all
+        if not self._withdraw(waiter):
+            return
+        with self._lock:
+            retry_after = self._retry_after()
+        ADMISSION_REJECTED.inc(reason="timeout")
+        raise Overloaded(f"No Ollama slot within {time.perf_counter() - started:.1f}s", retry_after)
+
+    def _withdraw(self, waiter: _Waiter) -> bool:
+        with self._lock:
+            if waiter.granted:
+                return False
+            waiting = self._queues[waiter.priority][waiter.session_id]
+            waiting.remove(waiter)
+            if not waiting:
+                del self._queues[waiter.priority][waiter.session_id]
+            self._depth[waiter.priority] -= 1
+            return True
+
+    def _admitted(self, waiter, started: float) -> Slot:
+        waited = time.perf_counter() - started
+        ADMISSION_WAIT.observe(waited, priority=waiter.priority if waiter else _work_class.get()[0])
+        if waiter is not None:
+            observe_stage("queued", waited)
+        return Slot(self)
+
+    def _release(self, held):
+        with self._lock:
+            if held is not None:
+                self._hold_time = 0.8 * self._hold_time + 0.2 * held
+            waiter = self._next_waiter()
+            if waiter is None:
+                self._active -= 1
+                return
+            # The slot passes straight to the waiter, _active is unchanged
+            waiter.granted = True
+            waiter.wake()
+
+    def _next_waiter(self):
+        for priority in PRIORITIES:
+            sessions = self._queues[priority]
+            if not sessions:
+                continue
+            session_id, waiting = next(iter(sessions.items()))
+            waiter = waiting.popleft()
+            if waiting:
+                sessions.move_to_end(session_id)
+            else:
+                del sessions[session_id]
+            self._depth[priority] -= 1
+            return waiter
+        return None
+
+    def _retry_after(self) -> int:
+        # Seconds until the calls already waiting have been served, at the observed hold time
+        return max(1, math.ceil((self._depth[INTERACTIVE] + 1) * self._hold_time / max(1, self.concurrency)))
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+admission = AdmissionScheduler()
+for _priority in PRIORITIES:
+    ADMISSION_QUEUE.set_function(lambda priority=_priority: admission.depth(priority), priority=_priority)
+ADMISSION_ACTIVE.set_function(admission.active)
@@ -0,0 +1,57 @@
+# rag_system/clients/http_pool.py
+import asyncio
+import logging
+import threading
+import weakref
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from src.config.app_settings import AppSettings
+from src.config.logging_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+_session = None
+_session_lock = threading.Lock()
+# httpx connections belong to the event loop that opened them, so keep one client per loop
+_async_clients = weakref.WeakKeyDictionary()
+
+def get_session() -> requests.Session:
+    # One keep-alive connection pool shared by every Ollama client in the process
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=AppSettings.HTTP_POOL_SIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+                logger.info(f"Created pooled HTTP session (pool size {AppSettings.HTTP_POOL_SIZE})")
+    return _session
+
+def close_session():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+def get_async_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        limits = httpx.Limits(
+            max_connections=AppSettings.HTTP_POOL_SIZE,
+            max_keepalive_connections=AppSettings.HTTP_POOL_SIZE,
+        )
+        client = httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(60.0, connect=10.0))
+        _async_clients[loop] = client
+        logger.info(f"Created pooled async HTTP client (pool size {AppSettings.HTTP_POOL_SIZE})")
+    return client
+
+async def aclose_async_client():
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,170 @@
+# rag_system/clients/single_flight.py
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable
+from src.monitoring.metrics import COALESCED, observe_stage
+from src.config.logging_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+def normalize_query(text: str) -> str:
+    # Questions differing only in case or spacing share one in-flight call
+    return " ".join(text.split()).casefold()
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class SingleFlight:
+    """Runs one call per key at a time across threads, concurrent callers with the same key share its result or exception."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            COALESCED.inc(kind=self.kind)
+            started = time.perf_counter()
+            call.done.wait()
+            observe_stage("coalesced", time.perf_counter() - started)
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn()
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # Callers arriving after this start a new call, the result is not cached
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+class AsyncSingleFlight:
+    """Event-loop counterpart of SingleFlight; the shared call runs as its own task, so a caller that
+    disconnects does not cancel it for the others."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            return await asyncio.shield(task)
+
+        COALESCED.inc(kind=self.kind)
+        started = time.perf_counter()
+        try:
+            return await asyncio.shield(task)
+        finally:
+            observe_stage("coalesced", time.perf_counter() - started)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Marks the exception as retrieved when every caller went away before it was raised
+        if not task.cancelled():
+            task.exception()
+
+class Broadcast:
+    """Fans one async iterator out to any number of subscribers; late subscribers replay the items already produced."""
+
+    def __init__(self, source: AsyncIterator):
+        self._items = []
+        self._done = False
+        self._error = None
+        self._changed = asyncio.Condition()
+        self._callbacks = []
+        # Pumped independently of the subscribers, a slow or gone client does not stall the others
+        self._task = asyncio.ensure_future(self._pump(source))
+
+    def on_close(self, callback: Callable[[], None]):
+        if self._done:
+            callback()
+        else:
+            self._callbacks.append(callback)
+
+    async def _pump(self, source: AsyncIterator):
+        try:
+            async for item in source:
+                async with self._changed:
+                    self._items.append(item)
+                    self._changed.notify_all()
+        except Exception as e:
+            self._error = e
+        finally:
+            async with self._changed:
+                self._done = True
+                self._changed.notify_all()
+            for callback in self._callbacks:
+                callback()
+
+    async def subscribe(self) -> AsyncIterator:
+        position = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: len(self._items) > position or self._done)
+                items, done, error = self._items[position:], self._done, self._error
+            for item in items:
+                yield item
+            position += len(items)
+            if done:
+                if error is not None:
+                    raise error
+                return
+
+class StreamSingleFlight:
+    """Shares one streamed call per key: the factory returns (metadata, async iterator) and every caller
+    gets the metadata plus its own subscription to the same stream, until the stream ends."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[tuple]]) -> tuple:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._start(key, factory))
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._failed(key, done))
+        else:
+            COALESCED.inc(kind=self.kind)
+        metadata, broadcast = await asyncio.shield(task)
+        return metadata, broadcast.subscribe()
+
+    async def _start(self, key: Hashable, factory: Callable[[], Awaitable[tuple]]) -> tuple:
+        metadata, source = await factory()
+        broadcast = Broadcast(source)
+        broadcast.on_close(lambda: self._forget(key))
+        return metadata, broadcast
+
+    def _forget(self, key: Hashable):
+        self._calls.pop(key, None)
+
+    def _failed(self, key: Hashable, task: asyncio.Task):
+        # A call that failed before streaming is not shared with callers arriving afterwards
+        if task.cancelled() or task.exception() is not None:
+            if self._calls.get(key) is task:
+                del self._calls[key]
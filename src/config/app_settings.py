@@ -11,10 +11,64 @@ class AppSettings:
     QA_MODEL = os.getenv("QA_MODEL", "deepseek-r1:1.5b")        # QA model
     OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
     CHROMA_DB = os.getenv("CHROMA_DB", "./chroma_db")
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")             # "chroma" or "numpy"
+    NUMPY_VECTOR_DIR = os.getenv("NUMPY_VECTOR_DIR", "./numpy_vectors")  # per-session matrices of the numpy backend
+    VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float32")                # numpy backend storage: float32, float16 or int8
     SESSION_DB = os.getenv("SESSION_DB", "sqlite:///chat.db")
+    FILE_REGISTRY_DB = os.getenv("FILE_REGISTRY_DB", "sqlite:///file_registry.db")
     SOURCE_DATA = os.getenv("SOURCE_DATA", "source-data")
     LOG_DIR = os.getenv("LOG_DIR", "logs")
     LOG_CLEANUP_FILE = os.getenv("LOG_CLEANUP_FILE", "cleanup_log.csv")
+    EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))        # texts per /api/embed call
+    EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))       # embedding batches in flight
+    EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", "60"))            # seconds per embedding batch
+    HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))            # keep-alive connections to Ollama
+    UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # bytes read per upload chunk
+    UPLOAD_MAX_EXTRACTED_BYTES = int(os.getenv("UPLOAD_MAX_EXTRACTED_BYTES", str(2 * 1024 ** 3)))  # PDF bytes one zip may extract to
+    UPLOAD_MAX_ARCHIVE_MEMBERS = int(os.getenv("UPLOAD_MAX_ARCHIVE_MEMBERS", "1000"))  # entries allowed in one zip
+    PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))  # PDF parsing processes
+    PARSE_PAGES_PER_TASK = int(os.getenv("PARSE_PAGES_PER_TASK", "200"))  # pages per parse task, longer PDFs are split across the pool
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))            # background ingestion job threads
+    INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))      # pages embedded and written per batch
+    INGEST_PIPELINE_QUEUE = int(os.getenv("INGEST_PIPELINE_QUEUE", "4"))  # files / page batches waiting between pipeline stages
+    CHUNK_STRATEGY = os.getenv("CHUNK_STRATEGY", "sentence")         # "sentence" (token-aware) or "page"
+    CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "256"))                   # tokens per chunk, 5 chunks fit the 2048 context
+    CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "32"))              # tokens shared by consecutive chunks
+    CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "10"))    # chunks retrieved before packing the prompt
+    CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))  # relevance vs. diversity when packing
+    CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.95"))  # cosine similarity of near-duplicates
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")           # "hybrid", "vector" or "lexical"
+    LEXICAL_DB = os.getenv("LEXICAL_DB", "lexical_index.db")            # SQLite FTS5 index of chunk text
+    RRF_K = int(os.getenv("RRF_K", "60"))                              # reciprocal rank fusion constant
+    LEXICAL_FAST_MODE = os.getenv("LEXICAL_FAST_MODE", "true").lower() == "true"  # keyword queries skip the embedding
+    LEXICAL_FAST_MAX_TERMS = int(os.getenv("LEXICAL_FAST_MAX_TERMS", "4"))
+    EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "true").lower() == "true"
+    EMBED_CACHE_DB = os.getenv("EMBED_CACHE_DB", "embed_cache.db")      # SQLite file for cached embeddings
+    EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "200000"))
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # cosine similarity to reuse an answer
+    ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))              # seconds
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+    HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "100"))            # /history records per page by default
+    HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "1000"))
+    CHAT_WRITE_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BATCH_SIZE", "256"))    # chat records per group commit
+    CHAT_WRITE_MAX_DELAY_MS = float(os.getenv("CHAT_WRITE_MAX_DELAY_MS", "5"))  # wait for more records before committing
+    CHAT_WRITE_QUEUE_SIZE = int(os.getenv("CHAT_WRITE_QUEUE_SIZE", "10000"))  # queued records before save_chat blocks
+    LLM_CONTEXT_REUSE = os.getenv("LLM_CONTEXT_REUSE", "true").lower() == "true"  # follow-ups continue the session's Ollama context
+    LLM_CONTEXT_MAX_TOKENS = int(os.getenv("LLM_CONTEXT_MAX_TOKENS", "1024"))   # longest context continued, longer ones start over
+    LLM_CONTEXT_MAX_SESSIONS = int(os.getenv("LLM_CONTEXT_MAX_SESSIONS", "1000"))  # contexts kept in memory (LRU)
+    LLM_CONTEXT_PERSIST = os.getenv("LLM_CONTEXT_PERSIST", "false").lower() == "true"  # also store them in the chat database
+    ADMISSION_CONCURRENCY = int(os.getenv("ADMISSION_CONCURRENCY", "4"))  # calls to Ollama in flight, 0 = unlimited
+    ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "32"))   # interactive calls waiting before 429
+    ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "20"))     # seconds an interactive call waits before 429, 0 = no limit
+    LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))                 # seconds per non-streamed generation, queueing excluded
+    COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "true").lower() == "true"  # identical concurrent queries share one call
+    SESSION_GC_INTERVAL = float(os.getenv("SESSION_GC_INTERVAL", "0"))        # seconds between background cleanups, 0 = off
+    SESSION_GC_TIME_BUDGET = float(os.getenv("SESSION_GC_TIME_BUDGET", "30"))  # seconds one background cleanup may take
+    SESSION_GC_MIN_AGE = float(os.getenv("SESSION_GC_MIN_AGE", "86400"))      # idle seconds before the GC removes a session
+    SESSION_GC_BATCH_SIZE = int(os.getenv("SESSION_GC_BATCH_SIZE", "1000"))   # vectors per delete call
+    WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "false").lower() == "true"  # load models before serving
+    WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "300"))               # seconds to wait for a model to load
      
 
 logger.info("Settings loaded: EMBED_MODEL=%s; QA_MODEL=%s", AppSettings.EMBED_MODEL, AppSettings.QA_MODEL)
\ No newline at end of file
@@ -9,7 +9,14 @@ LOG_DIR = AppSettings.LOG_DIR
 LOG_FILE = f"{datetime.now().strftime('%Y%m')}.log"
 os.makedirs(AppSettings.LOG_DIR, exist_ok=True)
 
+_configured = False
+
 def setup_logging():
+    # Every module calls this on import, only the first call does the work
+    global _configured
+    if _configured:
+        return
+    _configured = True
     log_formatter = logging.Formatter(
         "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     )
@@ -0,0 +1,100 @@
+# rag_system/container.py
+import logging
+import threading
+import time
+from src.config.logging_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+class Container:
+    """Application-scoped resources shared by the API, the ingestion queue and the CLI, each built on first use."""
+
+    def __init__(self):
+        # Reentrant: the query engine is built while holding it and asks for the index manager
+        self._lock = threading.RLock()
+        self._index_manager = None
+        self._query_engine = None
+        self._ingest_queue = None
+        self._session_gc = None
+
+    def _get(self, name: str, factory):
+        value = getattr(self, name)
+        if value is None:
+            with self._lock:
+                value = getattr(self, name)
+                if value is None:
+                    started = time.perf_counter()
+                    value = factory()
+                    setattr(self, name, value)
+                    logger.info(f"Built {type(value).__name__} in {time.perf_counter() - started:.2f}s")
+        return value
+
+    def ready(self, name: str) -> bool:
+        return getattr(self, f"_{name}") is not None
+
+    # llama_index and chromadb are imported by the factories, importing the API or CLI stays cheap
+
+    @property
+    def index_manager(self):
+        def build():
+            from src.vectorstore.index_manager import IndexManager
+            return IndexManager()
+        return self._get("_index_manager", build)
+
+    @property
+    def query_engine(self):
+        def build():
+            from src.retrieval.query_engine import QueryEngine
+            return QueryEngine(self.index_manager)
+        return self._get("_query_engine", build)
+
+    @property
+    def ingest_queue(self):
+        def build():
+            from src.ingestion.job_queue import IngestJobQueue
+            return IngestJobQueue(lambda: self.index_manager, on_complete=self.invalidate_cache)
+        return self._get("_ingest_queue", build)
+
+    @property
+    def session_gc(self):
+        def build():
+            from src.maintenance.session_gc import SessionGC
+            return SessionGC(lambda: self.index_manager, on_delete=self.invalidate_cache)
+        return self._get("_session_gc", build)
+
+    def invalidate_cache(self, session_id: str = None):
+        # Nothing is cached before the query engine exists
+        if self._query_engine is not None:
+            self._query_engine.invalidate_cache(session_id)
+
+    def warm_up(self):
+        # Builds the clients, starts the PDF parse workers and has Ollama load both models
+        from src.ingestion.pdf_loader import warm_parse_pool
+        started = time.perf_counter()
+        index_manager = self.index_manager
+        self.query_engine
+        warm_parse_pool()
+        for load in (index_manager.embed_model.load, index_manager.llm_model.load):
+            try:
+                load()
+            except Exception as e:
+                logger.warning(f"Warm-up continues without a loaded model: {e}")
+        logger.info(f"Warm-up finished in {time.perf_counter() - started:.2f}s")
+
+    def close(self):
+        if self._session_gc is not None:
+            self._session_gc.stop()
+        if self._ingest_queue is not None:
+            self._ingest_queue.stop()
+
+_container = None
+_container_lock = threading.Lock()
+
+def get_container() -> Container:
+    global _container
+    if _container is None:
+        with _container_lock:
+            if _container is None:
+                _container = Container()
+    return _container
@@ -0,0 +1,146 @@
+# rag_system/embedding/embedding_cache.py
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+from src.config.app_settings import AppSettings
+from src.monitoring.metrics import CACHE_ENTRIES, CACHE_EVICTIONS, CACHE_LOOKUPS
+from src.config.logging_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Keep IN (...) lists well below SQLite's host parameter limit
+_QUERY_CHUNK = 500
+# Hits update last_used in memory; they are written with the next put, or once this many are pending or this old
+_TOUCH_FLUSH_SIZE = 1024
+_TOUCH_FLUSH_SECONDS = 30.0
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """Persistent embedding cache keyed by (model, sha256 of the embedded text) with LRU eviction."""
+
+    def __init__(self, path: str = None, max_entries: int = None):
+        self.path = path or AppSettings.EMBED_CACHE_DB
+        self.max_entries = max_entries or AppSettings.EMBED_CACHE_MAX_ENTRIES
+        self._lock = threading.Lock()
+        self._touched = {}      # (model, text_hash) -> last_used not yet written
+        self._touched_since = time.monotonic()
+        try:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL,"
+                " text_hash TEXT NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " last_used REAL NOT NULL,"
+                " PRIMARY KEY (model, text_hash)"
+                ") WITHOUT ROWID"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+            self._conn.commit()
+            self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            logger.info(f"Embedding cache opened at {self.path} with {self._size} entries")
+        except Exception as e:
+            logger.exception(f"Failed to open embedding cache at {self.path}")
+            raise RuntimeError(f"Failed to open embedding cache: {str(e)}") from e
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            for i in range(0, len(unique), _QUERY_CHUNK):
+                chunk = unique[i:i + _QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *chunk],
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+
+            # A lookup only reads; recency is kept in memory and written in batches
+            now = time.time()
+            for key in found:
+                self._touched[(model, key)] = now
+            if len(self._touched) >= _TOUCH_FLUSH_SIZE or (
+                    self._touched and time.monotonic() - self._touched_since >= _TOUCH_FLUSH_SECONDS):
+                self._flush_touched()
+                self._conn.commit()
+        hits = sum(1 for h in hashes if h in found)
+        CACHE_LOOKUPS.inc(hits, cache="embedding", result="hit")
+        CACHE_LOOKUPS.inc(len(hashes) - hits, cache="embedding", result="miss")
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(model, key, array("f", vector).tobytes(), now) for key, vector in items.items()],
+            )
+            self._size += self._conn.total_changes - before
+            self._flush_touched()
+            if self._size > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def _flush_touched(self):
+        # Called with the lock held; eviction must see the recency of every hit so far
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                [(last_used, model, key) for (model, key), last_used in self._touched.items()],
+            )
+            self._touched = {}
+        self._touched_since = time.monotonic()
+
+    def _evict(self):
+        # Evict down to 90% of capacity so eviction runs once per batch of inserts, not on every put
+        excess = self._size - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE (model, text_hash) IN "
+            "(SELECT model, text_hash FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        self._size -= excess
+        CACHE_EVICTIONS.inc(excess, cache="embedding")
+        logger.info(f"Embedding cache evicted {excess} least recently used entries")
+
+    def get(self, model: str, key: str) -> Optional[List[float]]:
+        return self.get_many(model, [key]).get(key)
+
+    def size(self) -> int:
+        return self._size
+
+    def close(self):
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+            self._conn.close()
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    global _default_cache
+    if not AppSettings.EMBED_CACHE_ENABLED:
+        return None
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = EmbeddingCache()
+                CACHE_ENTRIES.set_function(_default_cache.size, cache="embedding")
+    return _default_cache
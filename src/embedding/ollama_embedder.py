@@ -1,11 +1,18 @@
 # rag_system/embedding/ollama_embedder.py
+import asyncio
+import contextvars
 import logging
+import math
+from concurrent.futures import ThreadPoolExecutor
 from src.config.app_settings import AppSettings
-import requests
-from typing import List
+from src.clients.http_pool import get_session, get_async_client
+from src.clients.admission import Overloaded, admission
+from src.clients.single_flight import SingleFlight, AsyncSingleFlight
+from src.embedding.embedding_cache import EmbeddingCache, get_embedding_cache, text_hash
+from src.monitoring.metrics import OLLAMA_ERRORS, timed
+from typing import List, Optional
 from llama_index.core.base.embeddings.base import BaseEmbedding
-from pydantic import Field
-import logging
+from pydantic import Field, PrivateAttr
 from src.config.logging_config import setup_logging
 
 setup_logging()
@@ -14,22 +21,45 @@ logger = logging.getLogger(__name__)
 class OllamaEmbedding(BaseEmbedding):
     model: str = Field(default=AppSettings.EMBED_MODEL, description="Ollama embedding model name")
     url: str = Field(default=f"{AppSettings.OLLAMA_BASE_URL}/api/embeddings", description="Ollama embeddings API endpoint")
+    batch_url: str = Field(default=f"{AppSettings.OLLAMA_BASE_URL}/api/embed", description="Ollama multi-input embed API endpoint")
+    batch_size: int = Field(default=AppSettings.EMBED_BATCH_SIZE, description="Texts sent per /api/embed call", gt=0)
+    max_concurrency: int = Field(default=AppSettings.EMBED_CONCURRENCY, description="Embedding batches in flight", gt=0)
+
+    _supports_batch: bool = PrivateAttr(default=True)
+    _cache: EmbeddingCache = PrivateAttr(default=None)
+    # Concurrent requests for the same query text share one embedding call
+    _flight: SingleFlight = PrivateAttr(default_factory=lambda: SingleFlight("embed"))
+    _async_flight: AsyncSingleFlight = PrivateAttr(default_factory=lambda: AsyncSingleFlight("embed"))
+
+    def __init__(self, model: str = AppSettings.EMBED_MODEL, batch_size: int = None, max_concurrency: int = None,
+                 cache: EmbeddingCache = None):
+        batch_size = batch_size or AppSettings.EMBED_BATCH_SIZE
+        max_concurrency = max_concurrency or AppSettings.EMBED_CONCURRENCY
+        # LlamaIndex hands us embed_batch_size texts at a time, enough to keep every worker busy
+        super().__init__(
+            model_name=model,
+            model=model,
+            batch_size=batch_size,
+            max_concurrency=max_concurrency,
+            embed_batch_size=min(batch_size * max_concurrency, 2048),
+        )
+        self._cache = cache if cache is not None else get_embedding_cache()
 
-    def __init__(self, model: str = AppSettings.EMBED_MODEL):
-        super().__init__(model_name=model)
+    def load(self):
+        # One uncached request, so Ollama has the model in memory before the first query
+        try:
+            self._embed_batch(["warm up"])
+        except Exception as e:
+            logger.exception(f"Failed to load embedding model {self.model}")
+            raise RuntimeError(f"Failed to load embedding model {self.model}: {str(e)}") from e
 
     def _get_query_embedding(self, query: str) -> List[float]:
         try:
-            response = requests.post(
-                self.url,
-                json={"model": self.model, "prompt": query},
-                timeout=10
-            )
-            response.raise_for_status()
-            embedding = response.json().get("embedding")
-            if embedding is None:
-                raise ValueError("No embedding in response")
-            return embedding
+            if not AppSettings.COALESCE_REQUESTS:
+                return self._embed_cached([query])[0]
+            return self._flight.do(text_hash(query), lambda: self._embed_cached([query])[0])
+        except Overloaded:
+            raise
         except Exception as e:
             logger.exception("Embedding failed for query")
             raise RuntimeError(f"Failed to get embedding: {str(e)}") from e
@@ -38,11 +68,196 @@ class OllamaEmbedding(BaseEmbedding):
         return self._get_query_embedding(text)
 
     async def _aget_query_embedding(self, query: str) -> List[float]:
-        raise NotImplementedError("Async embedding not supported")
+        try:
+            if not AppSettings.COALESCE_REQUESTS:
+                return (await self._aembed_cached([query]))[0]
+            return await self._async_flight.do(text_hash(query), lambda: self._aembed_one(query))
+        except Overloaded:
+            raise
+        except Exception as e:
+            logger.exception("Async embedding failed for query")
+            raise RuntimeError(f"Failed to get embedding: {str(e)}") from e
+
+    async def _aembed_one(self, text: str) -> List[float]:
+        return (await self._aembed_cached([text]))[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return await self._aget_query_embedding(text)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        try:
+            return await self._aembed_cached(texts)
+        except Overloaded:
+            raise
+        except Exception as e:
+            logger.exception("Async batch embedding failed")
+            raise RuntimeError(f"Failed to get batch embeddings: {str(e)}") from e
 
     def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
         try:
-            return [self._get_query_embedding(text) for text in texts]
+            return self._embed_cached(texts)
+        except Overloaded:
+            raise
         except Exception as e:
             logger.exception("Batch embedding failed")
             raise RuntimeError(f"Failed to get batch embeddings: {str(e)}") from e
+
+    def _embed_cached(self, texts: List[str]) -> List[List[float]]:
+        if self._cache is None:
+            return self._embed_texts(texts)
+
+        keys = [text_hash(text) for text in texts]
+        try:
+            found = self._cache.get_many(self.model, keys)
+        except Exception:
+            logger.warning("Embedding cache lookup failed, embedding without cache", exc_info=True)
+            found = {}
+
+        # Only unseen texts go to Ollama, identical texts within a batch are embedded once
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            embedded = dict(zip(missing.keys(), self._embed_texts(list(missing.values()))))
+            try:
+                self._cache.put_many(self.model, embedded)
+            except Exception:
+                logger.warning("Failed to store embeddings in cache", exc_info=True)
+            found.update(embedded)
+
+        return [found[key] for key in keys]
+
+    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) <= 1:
+            return [embedding for batch in batches for embedding in self._embed_batch(batch)]
+
+        # Pool threads do not inherit the caller's context, the admission class and session go along explicitly
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as pool:
+            results = list(pool.map(lambda batch: context.copy().run(self._embed_batch, batch), batches))
+        return [embedding for batch in results for embedding in batch]
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        with admission.slot():
+            try:
+                with timed("embed_batch"):
+                    return self._request_batch(texts)
+            except Exception:
+                OLLAMA_ERRORS.inc(endpoint="embed")
+                raise
+
+    def _request_batch(self, texts: List[str]) -> List[List[float]]:
+        if self._supports_batch:
+            response = get_session().post(
+                self.batch_url,
+                json={"model": self.model, "input": texts},
+                timeout=AppSettings.EMBED_TIMEOUT
+            )
+            embeddings = self._parse_batch_response(response, len(texts))
+            if embeddings is not None:
+                return embeddings
+
+        return [self._embed_single(text) for text in texts]
+
+    def _embed_single(self, text: str) -> List[float]:
+        response = get_session().post(
+            self.url,
+            json={"model": self.model, "prompt": text},
+            timeout=10
+        )
+        return self._parse_single_response(response)
+
+    async def _aembed_cached(self, texts: List[str]) -> List[List[float]]:
+        if self._cache is None:
+            return await self._aembed_texts(texts)
+
+        keys = [text_hash(text) for text in texts]
+        try:
+            found = await asyncio.to_thread(self._cache.get_many, self.model, keys)
+        except Exception:
+            logger.warning("Embedding cache lookup failed, embedding without cache", exc_info=True)
+            found = {}
+
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            embedded = dict(zip(missing.keys(), await self._aembed_texts(list(missing.values()))))
+            try:
+                await asyncio.to_thread(self._cache.put_many, self.model, embedded)
+            except Exception:
+                logger.warning("Failed to store embeddings in cache", exc_info=True)
+            found.update(embedded)
+
+        return [found[key] for key in keys]
+
+    async def _aembed_texts(self, texts: List[str]) -> List[List[float]]:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self._aembed_batch(batch)
+
+        results = await asyncio.gather(*(run(batch) for batch in batches))
+        return [embedding for batch in results for embedding in batch]
+
+    async def _aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        if self._supports_batch:
+            async with admission.aslot():
+                embeddings = await self._acall(self._arequest_batch(texts))
+            if embeddings is not None:
+                return embeddings
+
+        # Servers without /api/embed take one text per request: each request is admitted on its own,
+        # so the fallback stays within the admission limit, and at most max_concurrency of them wait for it
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def embed(text: str) -> List[float]:
+            async with semaphore, admission.aslot():
+                return await self._acall(self._aembed_single(text))
+
+        return list(await asyncio.gather(*(embed(text) for text in texts)))
+
+    async def _acall(self, request):
+        try:
+            with timed("embed_batch"):
+                return await request
+        except Exception:
+            OLLAMA_ERRORS.inc(endpoint="embed")
+            raise
+
+    async def _arequest_batch(self, texts: List[str]) -> Optional[List[List[float]]]:
+        # None when the server has no /api/embed
+        response = await get_async_client().post(
+            self.batch_url,
+            json={"model": self.model, "input": texts},
+            timeout=AppSettings.EMBED_TIMEOUT
+        )
+        return self._parse_batch_response(response, len(texts))
+
+    async def _aembed_single(self, text: str) -> List[float]:
+        response = await get_async_client().post(
+            self.url,
+            json={"model": self.model, "prompt": text},
+            timeout=10
+        )
+        return self._parse_single_response(response)
+
+    def _parse_batch_response(self, response, count: int) -> Optional[List[List[float]]]:
+        # Servers older than /api/embed answer with a bare 404, a missing model mentions the model
+        if response.status_code == 404 and "model" not in response.text:
+            logger.warning("Ollama server has no /api/embed endpoint, falling back to /api/embeddings")
+            self._supports_batch = False
+            return None
+        response.raise_for_status()
+        embeddings = response.json().get("embeddings")
+        if embeddings is None or len(embeddings) != count:
+            raise ValueError("Missing or incomplete embeddings in response")
+        return embeddings
+
+    def _parse_single_response(self, response) -> List[float]:
+        response.raise_for_status()
+        embedding = response.json().get("embedding")
+        if embedding is None:
+            raise ValueError("No embedding in response")
+        # /api/embed returns unit vectors, normalize so both endpoints produce comparable vectors
+        norm = math.sqrt(sum(x * x for x in embedding)) or 1.0
+        return [x / norm for x in embedding]
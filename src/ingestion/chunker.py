@@ -0,0 +1,59 @@
+# rag_system/ingestion/chunker.py
+import hashlib
+import logging
+import uuid
+from typing import Any, List, Sequence
+from llama_index.core.node_parser import NodeParser, SentenceSplitter
+from llama_index.core.node_parser.node_utils import build_nodes_from_splits
+from llama_index.core.schema import BaseNode
+from src.config.app_settings import AppSettings
+from src.config.logging_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+PAGE = "page"
+SENTENCE = "sentence"
+
+def stable_node_id(*parts) -> str:
+    # Same inputs always give the same id, so re-ingesting a file overwrites instead of duplicating
+    digest = hashlib.sha256("|".join(str(part) for part in parts).encode("utf-8")).digest()
+    return str(uuid.UUID(bytes=digest[:16]))
+
+def chunk_id_func(strategy: str, chunk_size: int = 0, chunk_overlap: int = 0):
+    def id_func(i: int, doc: BaseNode) -> str:
+        # Scoped by session and file, and by the page content hash (doc_id) and its page number
+        return stable_node_id(
+            doc.metadata.get("session_id", ""),
+            doc.metadata.get("file_hash", ""),
+            doc.metadata.get("page", ""),
+            doc.node_id,
+            f"{strategy}:{chunk_size}:{chunk_overlap}",
+            i,
+        )
+    return id_func
+
+class PageNodeParser(NodeParser):
+    """One node per page, the layout used before token-aware chunking."""
+
+    def _parse_nodes(self, nodes: Sequence[BaseNode], show_progress: bool = False, **kwargs: Any) -> List[BaseNode]:
+        return [node for doc in nodes for node in build_nodes_from_splits([doc.get_content()], doc, id_func=self.id_func)]
+
+def get_node_parser(strategy: str = None, chunk_size: int = None, chunk_overlap: int = None) -> NodeParser:
+    strategy = strategy or AppSettings.CHUNK_STRATEGY
+    if strategy == PAGE:
+        return PageNodeParser(id_func=chunk_id_func(PAGE))
+    if strategy != SENTENCE:
+        raise ValueError(f"Unknown chunk strategy: {strategy}")
+
+    chunk_size = chunk_size or AppSettings.CHUNK_SIZE
+    chunk_overlap = chunk_overlap if chunk_overlap is not None else AppSettings.CHUNK_OVERLAP
+    # Splits on paragraphs, then sentences, then words, packing each chunk up to chunk_size tokens
+    return SentenceSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        paragraph_separator="\n\n",
+        include_metadata=True,
+        include_prev_next_rel=False,
+        id_func=chunk_id_func(SENTENCE, chunk_size, chunk_overlap),
+    )
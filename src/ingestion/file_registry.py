@@ -0,0 +1,117 @@
+# rag_system/ingestion/file_registry.py
+import logging
+from datetime import datetime
+from sqlalchemy import create_engine, Column, String, Integer, DateTime, UniqueConstraint
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import DeclarativeBase, sessionmaker
+from src.config.app_settings import AppSettings
+from src.config.logging_config import setup_logging
+
+setup_logging()
+
+logger = logging.getLogger(__name__)
+
+class Base(DeclarativeBase):
+    pass
+
+engine = create_engine(AppSettings.FILE_REGISTRY_DB, echo=False)
+Session = sessionmaker(bind=engine, expire_on_commit=False)
+
+class IngestedFile(Base):
+    __tablename__ = "ingested_files"
+    file_hash = Column(String, primary_key=True)   # sha256 of the raw upload bytes
+    filename = Column(String, nullable=False)
+    page_count = Column(Integer, nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    ingested_at = Column(DateTime, nullable=False, default=datetime.now)
+
+class FileSession(Base):
+    __tablename__ = "file_sessions"
+    __table_args__ = (UniqueConstraint("file_hash", "session_id", name="uq_file_sessions_file_session"),)
+    id = Column(Integer, primary_key=True)
+    file_hash = Column(String, nullable=False, index=True)
+    session_id = Column(String, nullable=False, index=True)
+
+Base.metadata.create_all(engine)
+
+def get_file(file_hash: str):
+    try:
+        with Session() as s:
+            return s.get(IngestedFile, file_hash)
+    except Exception as e:
+        logger.exception(f"Failed to look up file {file_hash}")
+        raise RuntimeError(f"Failed to look up file: {str(e)}")
+
+def get_file_sessions(file_hash: str) -> list:
+    try:
+        with Session() as s:
+            rows = s.query(FileSession.session_id).filter_by(file_hash=file_hash).all()
+            return [row.session_id for row in rows]
+    except Exception as e:
+        logger.exception(f"Failed to retrieve sessions for file {file_hash}")
+        raise RuntimeError(f"Failed to retrieve file sessions: {str(e)}")
+
+def is_file_in_session(file_hash: str, session_id: str) -> bool:
+    try:
+        with Session() as s:
+            return s.query(FileSession.id).filter_by(file_hash=file_hash, session_id=session_id).first() is not None
+    except Exception as e:
+        logger.exception(f"Failed to check file {file_hash} in session {session_id}")
+        raise RuntimeError(f"Failed to check file session: {str(e)}")
+
+def register_file(file_hash: str, filename: str, page_count: int, size_bytes: int, session_id: str = None):
+    try:
+        with Session() as s:
+            # Concurrent ingestion of the same file must not fail on the primary key
+            s.execute(sqlite_insert(IngestedFile).values(
+                file_hash=file_hash,
+                filename=filename,
+                page_count=page_count,
+                size_bytes=size_bytes,
+                ingested_at=datetime.now(),
+            ).on_conflict_do_nothing())
+            if session_id:
+                s.execute(sqlite_insert(FileSession).values(
+                    file_hash=file_hash,
+                    session_id=session_id,
+                ).on_conflict_do_nothing())
+            s.commit()
+            logger.info(f"Registered file {filename} ({file_hash}) for session {session_id}")
+    except Exception as e:
+        logger.exception(f"Failed to register file {filename} ({file_hash})")
+        raise RuntimeError(f"Failed to register file {filename}: {str(e)}")
+
+def remove_session_files(session_id: str) -> int:
+    # The file stays registered for other sessions, only this session's link goes
+    try:
+        with Session() as s:
+            count = s.query(FileSession).filter_by(session_id=session_id).delete()
+            s.commit()
+            logger.info(f"Detached {count} file(s) from session {session_id}")
+            return count
+    except Exception as e:
+        logger.exception(f"Failed to detach files from session {session_id}")
+        raise RuntimeError(f"Failed to detach files from session: {str(e)}")
+
+def remove_file_session(file_hash: str, session_id: str) -> int:
+    try:
+        with Session() as s:
+            count = s.query(FileSession).filter_by(file_hash=file_hash, session_id=session_id).delete()
+            s.commit()
+            return count
+    except Exception as e:
+        logger.exception(f"Failed to detach file {file_hash} from session {session_id}")
+        raise RuntimeError(f"Failed to detach file from session: {str(e)}")
+
+def add_file_session(file_hash: str, session_id: str):
+    try:
+        with Session() as s:
+            s.execute(sqlite_insert(FileSession).values(
+                file_hash=file_hash,
+                session_id=session_id,
+            ).on_conflict_do_nothing())
+            s.commit()
+            logger.info(f"Attached file {file_hash} to session {session_id}")
+    except Exception as e:
+        logger.exception(f"Failed to attach file {file_hash} to session {session_id}")
+        raise RuntimeError(f"Failed to attach file to session: {str(e)}")
@@ -0,0 +1,338 @@
+# rag_system/ingestion/job_queue.py
+import json
+import logging
+import queue
+import threading
+from datetime import datetime
+from uuid import uuid4
+from sqlalchemy import Column, String, Integer, Text, DateTime
+from src.config.app_settings import AppSettings
+from src.config.logging_config import setup_logging
+from src.clients.admission import BULK, work_class
+from src.ingestion.file_registry import Base, engine, Session, get_file, is_file_in_session, register_file, add_file_session
+from src.ingestion.pdf_loader import iter_pdf_parts, tag_documents
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+PARSING = "parsing"
+EMBEDDING = "embedding"
+DONE = "done"
+DUPLICATE = "duplicate"
+FAILED = "failed"
+FINISHED_STATUSES = (DONE, DUPLICATE, FAILED)
+
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+    id = Column(String, primary_key=True)
+    session_id = Column(String, nullable=False, index=True)
+    filename = Column(String, nullable=False)
+    file_path = Column(String, nullable=False)
+    file_hash = Column(String, nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    status = Column(String, nullable=False, index=True, default=QUEUED)
+    pages_total = Column(Integer, nullable=False, default=0)
+    pages_parsed = Column(Integer, nullable=False, default=0)
+    pages_embedded = Column(Integer, nullable=False, default=0)
+    pages_written = Column(Integer, nullable=False, default=0)
+    message = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class IngestBatch(Base):
+    __tablename__ = "ingest_batches"
+    id = Column(String, primary_key=True)
+    session_id = Column(String, nullable=False, index=True)
+    job_ids = Column(Text, nullable=False)  # JSON list, in upload order
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+
+Base.metadata.create_all(engine)
+
+def get_session_job_statuses(session_id: str) -> list:
+    try:
+        with Session() as s:
+            return [row.status for row in s.query(IngestJob.status).filter_by(session_id=session_id).all()]
+    except Exception as e:
+        logger.exception(f"Failed to retrieve ingestion jobs for session {session_id}")
+        raise RuntimeError(f"Failed to retrieve ingestion jobs: {str(e)}")
+
+def active_job_sessions() -> set:
+    # Sessions with a job still queued or running, their folders and vectors are in use
+    try:
+        with Session() as s:
+            rows = s.query(IngestJob.session_id).filter(IngestJob.status.notin_(FINISHED_STATUSES)).distinct()
+            return {row.session_id for row in rows}
+    except Exception as e:
+        logger.exception("Failed to retrieve sessions with active ingestion jobs")
+        raise RuntimeError(f"Failed to retrieve active ingestion jobs: {str(e)}")
+
+class IngestJobQueue:
+    """Persistent ingestion queue processed by background worker threads (parse -> embed -> write)."""
+
+    def __init__(self, index_manager, on_complete=None, workers: int = None):
+        self._index_manager = index_manager  # an IndexManager, or a callable returning it on first use
+        self.on_complete = on_complete      # called with the session_id after vectors change
+        self.workers = workers or AppSettings.INGEST_WORKERS
+        self._queue = queue.Queue()
+        self._batches = queue.Queue()
+        self._threads = []
+        self._file_locks = [threading.Lock() for _ in range(64)]
+
+    @property
+    def index_manager(self):
+        # Resolved by the first job, starting the workers does not open the vector store
+        return self._index_manager() if callable(self._index_manager) else self._index_manager
+
+    def start(self):
+        # Jobs left unfinished by a previous run are picked up again
+        with Session() as s:
+            pending = s.query(IngestJob.id).filter(IngestJob.status.notin_(FINISHED_STATUSES)).order_by(IngestJob.created_at).all()
+        for row in pending:
+            self._queue.put(row.id)
+        if pending:
+            logger.info(f"Resuming {len(pending)} unfinished ingestion job(s)")
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"ingest-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        # One batch at a time, each one already keeps the parse pool and Ollama busy
+        thread = threading.Thread(target=self._work_batches, name="ingest-batch", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        logger.info(f"Started {self.workers} ingestion worker(s)")
+
+    def stop(self, timeout: float = 5.0):
+        self._batches.put(None)
+        for _ in range(self.workers):
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def submit(self, session_id: str, filename: str, file_path: str, file_hash: str, size_bytes: int) -> str:
+        try:
+            job_id = str(uuid4())
+            with Session() as s:
+                s.add(IngestJob(
+                    id=job_id,
+                    session_id=session_id,
+                    filename=filename,
+                    file_path=file_path,
+                    file_hash=file_hash,
+                    size_bytes=size_bytes,
+                    status=QUEUED,
+                ))
+                s.commit()
+            self._queue.put(job_id)
+            logger.info(f"Queued ingestion job {job_id} for {filename} (session {session_id})")
+            return job_id
+        except Exception as e:
+            logger.exception(f"Failed to queue ingestion of {filename}")
+            raise RuntimeError(f"Failed to queue ingestion: {str(e)}")
+
+    def submit_batch(self, session_id: str, files: list) -> tuple:
+        # files: (filename, file_path, file_hash, size_bytes); returns the batch id and one job id per file.
+        # The jobs are ordinary ingestion jobs, after a restart unfinished ones are resumed one by one.
+        try:
+            batch_id = str(uuid4())
+            jobs = [
+                IngestJob(id=str(uuid4()), session_id=session_id, filename=filename, file_path=file_path,
+                          file_hash=file_hash, size_bytes=size_bytes, status=QUEUED)
+                for filename, file_path, file_hash, size_bytes in files
+            ]
+            job_ids = [job.id for job in jobs]
+            with Session() as s:
+                s.add_all(jobs)
+                s.add(IngestBatch(id=batch_id, session_id=session_id, job_ids=json.dumps(job_ids)))
+                s.commit()
+            self._batches.put(batch_id)
+            logger.info(f"Queued ingestion batch {batch_id} with {len(files)} file(s) (session {session_id})")
+            return batch_id, job_ids
+        except Exception as e:
+            logger.exception(f"Failed to queue ingestion batch of {len(files)} file(s)")
+            raise RuntimeError(f"Failed to queue ingestion batch: {str(e)}")
+
+    def get_batch(self, batch_id: str):
+        try:
+            with Session() as s:
+                batch = s.get(IngestBatch, batch_id)
+                if batch is None:
+                    return None
+                job_ids = json.loads(batch.job_ids)
+                jobs = {job.id: job for job in s.query(IngestJob).filter(IngestJob.id.in_(job_ids)).all()}
+                return self._batch_to_dict(batch, [jobs[job_id] for job_id in job_ids if job_id in jobs])
+        except Exception as e:
+            logger.exception(f"Failed to retrieve ingestion batch {batch_id}")
+            raise RuntimeError(f"Failed to retrieve ingestion batch: {str(e)}")
+
+    def get(self, job_id: str):
+        try:
+            with Session() as s:
+                job = s.get(IngestJob, job_id)
+                if job is None:
+                    return None
+                return self._to_dict(job)
+        except Exception as e:
+            logger.exception(f"Failed to retrieve ingestion job {job_id}")
+            raise RuntimeError(f"Failed to retrieve ingestion job: {str(e)}")
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            try:
+                self._run(job_id)
+            except Exception as e:
+                logger.exception(f"Ingestion job {job_id} failed")
+                self._update(job_id, status=FAILED, error=str(e), finished_at=datetime.now())
+
+    def _work_batches(self):
+        while True:
+            batch_id = self._batches.get()
+            if batch_id is None:
+                return
+            try:
+                self._run_batch(batch_id)
+            except Exception:
+                logger.exception(f"Ingestion batch {batch_id} failed")
+
+    def _run_batch(self, batch_id: str):
+        # Imported here, the pipeline module imports this one for the job statuses
+        from src.ingestion.pipeline import IngestPipeline
+        with Session() as s:
+            batch = s.get(IngestBatch, batch_id)
+            job_ids = json.loads(batch.job_ids)
+            jobs = {job.id: job for job in s.query(IngestJob).filter(IngestJob.id.in_(job_ids)).all()}
+        jobs = [jobs[job_id] for job_id in job_ids if job_id in jobs and jobs[job_id].status not in FINISHED_STATUSES]
+        pipeline = IngestPipeline(self.index_manager, prepare=self._prepare, update=self._update, finish=self._finish)
+        pipeline.run(jobs, session_id=batch.session_id)
+
+    def _run(self, job_id: str):
+        with Session() as s:
+            job = s.get(IngestJob, job_id)
+        if job is None or job.status in FINISHED_STATUSES:
+            return
+
+        # Jobs for the same file run one at a time, so the second one finds the first in the registry.
+        # Their embedding calls yield to interactive questions and never get a 429.
+        with self._file_lock(job.file_hash), work_class(BULK, job.session_id):
+            self._process(job)
+
+    def _process(self, job):
+        job_id = job.id
+        if self._prepare(job):
+            return
+
+        counters = {"parsed": 0, "embedded": 0, "written": 0}
+
+        def progress(stage: str, pages: int):
+            counters[stage] += pages
+            self._update(job_id, pages_embedded=counters["embedded"], pages_written=counters["written"])
+
+        # CPU-bound parsing runs in the shared process pool, a long PDF as page ranges spread over its
+        # workers; each range is embedded and written while the next ones are parsed
+        try:
+            for documents, page_count in iter_pdf_parts(job.file_path):
+                tag_documents(documents, file_hash=job.file_hash, session_id=job.session_id)
+                counters["parsed"] += len(documents)
+                self._update(job_id, status=EMBEDDING, pages_total=page_count, pages_parsed=counters["parsed"])
+                self.index_manager.add_documents(documents, progress=progress)
+        except Exception:
+            # Ranges written before the failure would answer for half a file
+            if counters["written"]:
+                self.index_manager.delete_file_vectors(job.file_hash, job.session_id)
+            raise
+        pages = counters["parsed"]
+        register_file(job.file_hash, job.filename, pages, job.size_bytes, job.session_id)
+        self._finish(job, DONE, f"Ingested {job.filename} with {pages} pages.", pages)
+
+    def _prepare(self, job) -> bool:
+        # Returns True when the file is already ingested and the job has been finished here
+        interrupted = job.status != QUEUED
+        self._update(job.id, status=PARSING, started_at=datetime.now(), error=None,
+                     pages_parsed=0, pages_embedded=0, pages_written=0)
+
+        # Known files skip parsing and embedding, their vectors are attached to this session
+        known_file = get_file(job.file_hash)
+        if known_file:
+            if is_file_in_session(job.file_hash, job.session_id):
+                self._finish(job, DUPLICATE, f"Skipped ingestion: {job.filename} already ingested.", known_file.page_count)
+                return True
+            attached = self.index_manager.attach_file_to_session(job.file_hash, job.session_id, job.filename)
+            if attached:
+                add_file_session(job.file_hash, job.session_id)
+                self._finish(job, DUPLICATE, f"Ingested {job.filename} with {known_file.page_count} pages (reused existing vectors).",
+                             known_file.page_count)
+                return True
+            logger.warning(f"File {job.filename} is registered but has no vectors, ingesting it again.")
+
+        if interrupted:
+            # A previous run stopped mid-way, drop whatever part of the file it already wrote
+            self.index_manager.delete_file_vectors(job.file_hash, job.session_id)
+        return False
+
+    def _file_lock(self, file_hash: str) -> threading.Lock:
+        return self._file_locks[int(file_hash[:8], 16) % len(self._file_locks)]
+
+    def _finish(self, job, status: str, message: str, pages: int):
+        self._update(job.id, status=status, message=message, pages_total=pages, pages_parsed=pages,
+                     pages_embedded=pages, pages_written=pages, finished_at=datetime.now())
+        logger.info(f"Ingestion job {job.id} {status}: {message}")
+        if self.on_complete:
+            self.on_complete(job.session_id)
+
+    def _update(self, job_id: str, **fields):
+        with Session() as s:
+            s.query(IngestJob).filter_by(id=job_id).update(fields)
+            s.commit()
+
+    @classmethod
+    def _batch_to_dict(cls, batch, jobs: list) -> dict:
+        files = [cls._to_dict(job) for job in jobs]
+        counts = {status: sum(1 for job in jobs if job.status == status) for status in FINISHED_STATUSES}
+        started = [job.started_at for job in jobs if job.started_at]
+        finished = all(job.status in FINISHED_STATUSES for job in jobs)
+        end = max((job.finished_at for job in jobs if job.finished_at), default=None) if finished else datetime.now()
+        elapsed = (end - min(started)).total_seconds() if started and end else 0.0
+        pages = sum(job.pages_written for job in jobs)
+        return {
+            "batch_id": batch.id,
+            "session_id": batch.session_id,
+            "status": DONE if finished else (EMBEDDING if started else QUEUED),
+            "files_total": len(jobs),
+            "ingested": counts[DONE],
+            "duplicate": counts[DUPLICATE],
+            "failed": counts[FAILED],
+            "pages_written": pages,
+            "elapsed_seconds": round(elapsed, 3),
+            "pages_per_second": round(pages / elapsed, 2) if elapsed > 0 else 0.0,
+            "files_per_second": round(sum(counts.values()) / elapsed, 2) if elapsed > 0 else 0.0,
+            "created_at": batch.created_at.isoformat(),
+            "files": files,
+        }
+
+    @staticmethod
+    def _to_dict(job) -> dict:
+        end = job.finished_at or datetime.now()
+        elapsed = (end - job.started_at).total_seconds() if job.started_at else 0.0
+        return {
+            "job_id": job.id,
+            "session_id": job.session_id,
+            "filename": job.filename,
+            "status": job.status,
+            "pages_total": job.pages_total,
+            "pages_parsed": job.pages_parsed,
+            "pages_embedded": job.pages_embedded,
+            "pages_written": job.pages_written,
+            "elapsed_seconds": round(elapsed, 3),
+            "pages_per_second": round(job.pages_embedded / elapsed, 2) if elapsed > 0 else 0.0,
+            "message": job.message,
+            "error": job.error,
+            "created_at": job.created_at.isoformat(),
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        }
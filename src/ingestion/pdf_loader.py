@@ -1,9 +1,20 @@
 # rag_system\ingestion\pdf_loader.py
+from __future__ import annotations
 import logging
-import fitz  # PyMuPDF
+import multiprocessing
+import threading
 import hashlib
-from llama_index.core.schema import Document
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Iterator
+from src.config.app_settings import AppSettings
 from src.config.logging_config import setup_logging
+from src.monitoring.metrics import timed
+
+if TYPE_CHECKING:
+    from llama_index.core.schema import Document
 
 setup_logging()
 logger = logging.getLogger(__name__)
@@ -11,32 +22,154 @@ logger = logging.getLogger(__name__)
 def compute_hash(text: str) -> str:
     return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
-def load_pdf(path: str) -> tuple[list[Document], str]:
+def tag_documents(documents: list[Document], **metadata) -> list[Document]:
+    # Bookkeeping keys are used for filtering only, keep them out of embeddings and prompts
+    for doc in documents:
+        doc.metadata.update(metadata)
+        for key in metadata:
+            if key not in doc.excluded_embed_metadata_keys:
+                doc.excluded_embed_metadata_keys.append(key)
+            if key not in doc.excluded_llm_metadata_keys:
+                doc.excluded_llm_metadata_keys.append(key)
+    return documents
+
+def iter_pdf_pages(path: str, start: int = 0, stop: int = None, hasher=None) -> Iterator[Document]:
+    # Yields one Document per non-empty page in [start, stop) and returns the sha256 of their text,
+    # so only the current page is held; pass a hasher to continue the hash of an earlier range
+    # Imported here, the API and CLI processes only need them once a PDF is parsed
+    import fitz  # PyMuPDF
+    from llama_index.core.schema import Document
+    hasher = hasher or hashlib.sha256()
+    filename = path.split("/")[-1]
     doc = None
     try:
         doc = fitz.open(path)
-        chunks = []
-        full_text = ""
-
-        for page_num, page in enumerate(doc):
-            text = page.get_text()
+        stop = doc.page_count if stop is None else min(stop, doc.page_count)
+        for page_num in range(start, stop):
+            text = doc.load_page(page_num).get_text()
             if not text.strip():
                 continue
-            full_text += text
-            page_hash = compute_hash(text)
+            encoded = text.encode("utf-8")
+            hasher.update(encoded)
+            page_hash = hashlib.sha256(encoded).hexdigest()
             metadata = {
-                "filename": path.split("/")[-1],
+                "filename": filename,
                 "page": page_num + 1,
                 "hash": page_hash,
             }
-            chunks.append(Document(text=text, metadata=metadata, doc_id=page_hash))
-
-        file_hash = compute_hash(full_text)
-        logger.info("Loaded %d chunks from PDF: %s", len(chunks), path)
-        return chunks, file_hash
+            yield Document(text=text, metadata=metadata, doc_id=page_hash)
+        return hasher.hexdigest()
     except Exception as e:
         logger.exception("Failed to load PDF: %s", path)
         raise RuntimeError(f"Failed to load PDF {path}: {e}") from e
     finally:
         if doc:
             doc.close()
+
+def load_pdf(path: str) -> tuple[list[Document], str]:
+    chunks = []
+    pages = iter_pdf_pages(path)
+    while True:
+        try:
+            chunks.append(next(pages))
+        except StopIteration as done:
+            logger.info("Loaded %d chunks from PDF: %s", len(chunks), path)
+            return chunks, done.value
+
+def load_pdf_range(path: str, start: int, stop: int) -> list[Document]:
+    # One parse task of a PDF split across the pool
+    return list(iter_pdf_pages(path, start, stop))
+
+def pdf_page_count(path: str) -> int:
+    import fitz
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+def load_pdf_first_range(path: str, stop: int) -> tuple[list[Document], int]:
+    # The first parse task of a file whose page count is not known yet returns it with its pages
+    return load_pdf_range(path, 0, stop), pdf_page_count(path)
+
+def iter_pdf_parts(path: str, pages_per_part: int = None, pool: ProcessPoolExecutor = None) -> Iterator[tuple[list[Document], int]]:
+    # Yields (documents, page_count) per range of pages_per_part pages, in page order. The ranges are parsed
+    # in the pool, a few ahead of the consumer, so a long PDF uses every worker and is never held whole
+    pages_per_part = pages_per_part or AppSettings.PARSE_PAGES_PER_TASK
+    shared = pool is None
+    pool = pool or get_parse_pool()
+    page_count, retried = None, False
+    in_flight = deque()     # (start, future) in page order
+    try:
+        while True:
+            try:
+                if page_count is None:
+                    page_count = pool.submit(pdf_page_count, path).result()
+                    ranges = iter(range(0, page_count, pages_per_part))
+                for start in ranges:
+                    in_flight.append((start, pool.submit(load_pdf_range, path, start, start + pages_per_part)))
+                    if len(in_flight) >= AppSettings.PARSE_WORKERS * 2:
+                        break
+                if not in_flight:
+                    return
+                with timed("load_pdf"):
+                    documents = in_flight[0][1].result()
+            except BrokenProcessPool:
+                # A worker died and took the pool with it: the shared pool is replaced and the ranges
+                # still in flight are parsed again, once
+                if not shared:
+                    raise
+                pool = reset_parse_pool(pool)
+                if retried:
+                    raise
+                retried = True
+                logger.warning("Parse pool broke while parsing %s, retrying on a new pool", path)
+                in_flight = deque((start, future if future.done() and not future.exception()
+                                   else pool.submit(load_pdf_range, path, start, start + pages_per_part))
+                                  for start, future in in_flight)
+                continue
+            in_flight.popleft()
+            yield documents, page_count
+    finally:
+        # A failed range or a consumer that stopped early leaves nothing queued in the pool
+        for _, future in in_flight:
+            future.cancel()
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    # PyMuPDF parsing is CPU-bound, run it in worker processes rather than on the event loop
+    global _parse_pool
+    if _parse_pool is None:
+        with _parse_pool_lock:
+            if _parse_pool is None:
+                _parse_pool = ProcessPoolExecutor(
+                    max_workers=AppSettings.PARSE_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _parse_pool
+
+def reset_parse_pool(broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+    # Called with a pool that raised BrokenProcessPool. Callers sharing it race here, only the first
+    # replaces it and the others get the new one.
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is broken:
+            _parse_pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+    return get_parse_pool()
+
+def _warm_worker() -> int:
+    import fitz
+    import llama_index.core.schema
+    return os.getpid()
+
+def warm_parse_pool():
+    # Starts the worker processes and pays their imports before the first upload does
+    pool = get_parse_pool()
+    wait([pool.submit(_warm_worker) for _ in range(AppSettings.PARSE_WORKERS)])
+
+def shutdown_parse_pool():
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is not None:
+            _parse_pool.shutdown(cancel_futures=True)
+            _parse_pool = None
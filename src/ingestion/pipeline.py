@@ -0,0 +1,276 @@
+# rag_system/ingestion/pipeline.py
+import logging
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from llama_index.core.schema import MetadataMode
+from src.clients.admission import BULK, work_class
+from src.config.app_settings import AppSettings
+from src.config.logging_config import setup_logging
+from src.ingestion.file_registry import register_file
+from src.ingestion.job_queue import DONE, DUPLICATE, EMBEDDING, FAILED
+from src.ingestion.pdf_loader import get_parse_pool, load_pdf_first_range, load_pdf_range, reset_parse_pool, tag_documents
+from src.monitoring.metrics import timed
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+def _parsed(future: Future) -> bool:
+    return future.done() and not future.cancelled() and future.exception() is None
+
+class IngestPipeline:
+    """Ingests a set of files in three stages linked by bounded queues: parsing page ranges in the process
+    pool, embedding in page batches that span files, and writing on its own thread."""
+
+    def __init__(self, index_manager, prepare, update, finish, batch_size: int = None, queue_size: int = None):
+        self.index_manager = index_manager
+        self.prepare = prepare      # prepare(job) -> True when the file is already ingested and the job finished
+        self.update = update        # update(job_id, **fields) writes job progress
+        self.finish = finish        # finish(job, status, message, pages)
+        self.batch_size = batch_size or AppSettings.INGEST_BATCH_SIZE
+        self.pages_per_part = AppSettings.PARSE_PAGES_PER_TASK
+        self.queue_size = queue_size or AppSettings.INGEST_PIPELINE_QUEUE
+        self.max_parsing = AppSettings.PARSE_WORKERS * 2
+        self.failed = set()         # file hashes of failed jobs, their later parts are dropped
+        self.finished = set()       # ids of jobs that reached a final status
+        self.retried = set()        # ids of jobs already parsed again after the parse pool broke
+        self.progress = {}          # job id -> pages parsed / embedded / written
+        self._lock = threading.Lock()  # guards failed / finished, the three stage threads end jobs
+
+    def run(self, jobs: list, session_id: str = None):
+        parsed = queue.Queue(maxsize=self.queue_size)     # (job, documents, last) per page range
+        embedded = queue.Queue(maxsize=self.queue_size)   # (nodes, parts) per page batch
+        embedder = threading.Thread(target=self._embed_stage, args=(parsed, embedded, session_id), name="ingest-embed", daemon=True)
+        writer = threading.Thread(target=self._write_stage, args=(embedded,), name="ingest-write", daemon=True)
+        embedder.start()
+        writer.start()
+        error = None
+        try:
+            self._parse_stage(jobs, parsed)
+        except Exception as e:
+            logger.exception("Parse stage of the ingestion pipeline failed")
+            error = e
+        finally:
+            parsed.put(_END)
+            embedder.join()
+            writer.join()
+        # Every job ends with a final status, even when a stage stopped early
+        for job in jobs:
+            if job.id not in self.finished:
+                self._fail(job, error or RuntimeError("Ingestion pipeline stopped before this file was written"))
+
+    def _parse_stage(self, jobs: list, parsed: queue.Queue):
+        # Files are parsed in page ranges, as single uploads are. The first range of a file also returns
+        # its page count, its other ranges are submitted once that is known. Ranges are read back in
+        # submission order, so the pages of each file stay in order and its last range comes last.
+        pool = get_parse_pool()
+        in_flight, pending, seen = deque(), deque(), {}
+        remaining = iter(jobs)
+        while True:
+            # Only a few ranges are parsed ahead, a full queue downstream stops submitting here
+            while len(in_flight) < self.max_parsing:
+                if pending:
+                    job, start, last = pending.popleft()
+                    if job.file_hash not in self.failed:
+                        in_flight.append((job, start, last, self._submit(pool, job, start, last)))
+                    continue
+                job = self._next_job(remaining, seen)
+                if job is None:
+                    break
+                in_flight.append((job, 0, None, self._submit(pool, job, 0, None)))
+            if not in_flight:
+                return
+            job, start, last, future = in_flight[0]
+            if job.file_hash in self.failed:
+                in_flight.popleft()
+                future.cancel()
+                continue
+            try:
+                with timed("load_pdf"):
+                    documents = future.result()
+            except BrokenProcessPool as e:
+                pool, in_flight = self._restart_pool(pool, in_flight, e)
+                continue
+            except Exception as e:
+                in_flight.popleft()
+                self._fail(job, e)
+                continue
+            in_flight.popleft()
+            try:
+                if last is None:
+                    documents, page_count = documents
+                    starts = range(self.pages_per_part, page_count, self.pages_per_part)
+                    pending.extend((job, s, s + self.pages_per_part >= page_count) for s in starts)
+                    last = not starts
+                    self.progress[job.id] = {"parsed": 0, "embedded": 0, "written": 0}
+                    self.update(job.id, status=EMBEDDING, pages_total=page_count)
+                tag_documents(documents, file_hash=job.file_hash, session_id=job.session_id)
+                self.progress[job.id]["parsed"] += len(documents)
+                self.update(job.id, pages_parsed=self.progress[job.id]["parsed"])
+            except Exception as e:
+                self._fail(job, e)
+                continue
+            parsed.put((job, documents, last))
+
+    def _submit(self, pool, job, start: int, last) -> Future:
+        # last is None for the first range of a file, whose page count is not known yet
+        try:
+            if last is None:
+                return pool.submit(load_pdf_first_range, job.file_path, self.pages_per_part)
+            return pool.submit(load_pdf_range, job.file_path, start, start + self.pages_per_part)
+        except BrokenProcessPool as e:
+            # Surfaces when the range is read back, where the pool is replaced
+            future = Future()
+            future.set_exception(e)
+            return future
+
+    def _restart_pool(self, pool, in_flight: deque, error: BrokenProcessPool):
+        # A worker died and took the pool with it. The ranges it lost are parsed again on a new pool,
+        # once per file: a file that loses ranges a second time fails.
+        pool = reset_parse_pool(pool)
+        lost = {job.id: job for job, _, _, future in in_flight if not _parsed(future)}
+        for job in lost.values():
+            if job.id in self.retried:
+                self._fail(job, error)
+        logger.warning(f"Parse pool broke with {len(lost)} file(s) in flight, retrying on a new pool")
+        self.retried |= lost.keys()
+        return pool, deque((job, start, last, future if _parsed(future) else self._submit(pool, job, start, last))
+                           for job, start, last, future in in_flight if job.file_hash not in self.failed)
+
+    def _next_job(self, remaining, seen: dict):
+        # The next job of the batch that needs parsing, duplicates and known files are finished here
+        for job in remaining:
+            if job.file_hash in seen:
+                self._finish(job, DUPLICATE, f"Skipped ingestion: {job.filename} is the same file as {seen[job.file_hash]}.", 0)
+                continue
+            seen[job.file_hash] = job.filename
+            # No per-file lock across stages: a /ingest of the same file racing this one writes the
+            # same chunk ids, and the upsert keeps a single copy
+            try:
+                if self.prepare(job):
+                    self._claim(job)
+                    continue
+            except Exception as e:
+                self._fail(job, e)
+                continue
+            return job
+        return None
+
+    def _embed_stage(self, parsed: queue.Queue, embedded: queue.Queue, session_id: str):
+        # Pages of consecutive files share a batch, so every embedding call is full.
+        # Nothing escapes this loop: it reads until _END, or the parse stage would block on a full queue.
+        documents, parts = [], []
+        with work_class(BULK, session_id):
+            while True:
+                item = parsed.get()
+                if item is _END:
+                    break
+                job, pages, last = item
+                try:
+                    offset = 0
+                    while True:
+                        taken = pages[offset:offset + self.batch_size - len(documents)]
+                        offset += len(taken)
+                        documents.extend(taken)
+                        parts.append((job, len(taken), last and offset >= len(pages)))
+                        if len(documents) >= self.batch_size:
+                            self._embed_batch(documents, parts, embedded)
+                            documents, parts = [], []
+                        if offset >= len(pages):
+                            break
+                except Exception as e:
+                    logger.exception("Embedding stage of the ingestion pipeline failed")
+                    for failed, _, _ in parts:
+                        self._fail(failed, e)
+                    self._fail(job, e)
+                    documents, parts = [], []
+            if parts:
+                try:
+                    self._embed_batch(documents, parts, embedded)
+                except Exception as e:
+                    logger.exception("Embedding stage of the ingestion pipeline failed")
+                    for job, _, _ in parts:
+                        self._fail(job, e)
+        embedded.put(_END)
+
+    def _embed_batch(self, documents: list, parts: list, embedded: queue.Queue):
+        documents = [doc for doc in documents if doc.metadata.get("file_hash") not in self.failed]
+        try:
+            nodes = self.index_manager.node_parser.get_nodes_from_documents(documents)
+            texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+            for node, embedding in zip(nodes, self.index_manager.embed_model.get_text_embedding_batch(texts)):
+                node.embedding = embedding
+        except Exception as e:
+            for job, _, _ in parts:
+                self._fail(job, e)
+            return
+        for job, pages, _ in parts:
+            if job.file_hash not in self.failed:
+                self.progress[job.id]["embedded"] += pages
+                self.update(job.id, pages_embedded=self.progress[job.id]["embedded"])
+        embedded.put((nodes, parts))
+
+    def _write_stage(self, embedded: queue.Queue):
+        # Like the embedding stage, an error fails the files of one batch and the loop goes on
+        while True:
+            item = embedded.get()
+            if item is _END:
+                return
+            nodes, parts = item
+            try:
+                self._write_batch(nodes, parts)
+            except Exception as e:
+                logger.exception("Write stage of the ingestion pipeline failed")
+                for job, _, _ in parts:
+                    self._fail(job, e)
+
+    def _write_batch(self, nodes: list, parts: list):
+        with timed("write_batch"):
+            self.index_manager.upsert_nodes([n for n in nodes if n.metadata.get("file_hash") not in self.failed])
+        for job, pages, last in parts:
+            if job.file_hash in self.failed:
+                continue
+            progress = self.progress[job.id]
+            progress["written"] += pages
+            self.update(job.id, pages_written=progress["written"])
+            if last:
+                self._finish(job, DONE, f"Ingested {job.filename} with {progress['parsed']} pages.", progress["parsed"], written=True)
+
+    def _claim(self, job, failed: bool = False) -> bool:
+        # True for the one caller that gets to give the job its final status
+        with self._lock:
+            if job.id in self.finished or (failed and job.file_hash in self.failed):
+                return False
+            self.finished.add(job.id)
+            if failed:
+                self.failed.add(job.file_hash)
+            return True
+
+    def _finish(self, job, status: str, message: str, pages: int, written: bool = False):
+        if not self._claim(job):
+            return
+        try:
+            if written:
+                register_file(job.file_hash, job.filename, pages, job.size_bytes, job.session_id)
+            self.finish(job, status, message, pages)
+        except Exception:
+            # Released so the stage's error handling can still fail the job
+            with self._lock:
+                self.finished.discard(job.id)
+            raise
+
+    def _fail(self, job, error: Exception):
+        if not self._claim(job, failed=True):
+            return
+        logger.error(f"Ingestion job {job.id} ({job.filename}) failed: {error}")
+        try:
+            # Batches already written for this file are removed, a retry starts clean
+            self.index_manager.delete_file_vectors(job.file_hash, job.session_id)
+            self.update(job.id, status=FAILED, error=str(error), finished_at=datetime.now())
+        except Exception:
+            logger.warning(f"Failed to record the failure of {job.filename}", exc_info=True)
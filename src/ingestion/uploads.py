@@ -0,0 +1,95 @@
+# rag_system/ingestion/uploads.py
+import hashlib
+import logging
+import shutil
+import zipfile
+from pathlib import Path
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from src.config.app_settings import AppSettings
+from src.config.logging_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+async def save_upload(file: UploadFile, destination: Path) -> tuple[str, int]:
+    # Copy the upload to disk in chunks, hashing the raw bytes on the way
+    hasher = hashlib.sha256()
+    size = 0
+    handle = await run_in_threadpool(open, destination, "wb")
+    try:
+        while chunk := await file.read(AppSettings.UPLOAD_CHUNK_SIZE):
+            hasher.update(chunk)
+            size += len(chunk)
+            await run_in_threadpool(handle.write, chunk)
+    finally:
+        await run_in_threadpool(handle.close)
+
+    logger.info(f"Saved upload {file.filename} to {destination} ({size} bytes)")
+    return hasher.hexdigest(), size
+
+def unique_name(filename: str, taken: set) -> str:
+    # Files of one batch land in the same session folder, a repeated name gets a counter
+    name = Path(filename).name
+    stem, suffix = Path(name).stem, Path(name).suffix
+    counter = 2
+    while name in taken:
+        name = f"{stem} ({counter}){suffix}"
+        counter += 1
+    taken.add(name)
+    return name
+
+class ArchiveTooLarge(ValueError):
+    """A zip upload has too many members or would extract to too many bytes."""
+
+class _HashingWriter:
+    def __init__(self, handle, budget: int):
+        self.handle = handle
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.budget = budget
+
+    def write(self, chunk):
+        # The sizes in the zip directory are not trusted, the limit is enforced on the bytes actually written
+        self.size += len(chunk)
+        if self.size > self.budget:
+            raise ArchiveTooLarge(f"Archive extracts to more than {AppSettings.UPLOAD_MAX_EXTRACTED_BYTES} bytes")
+        self.hasher.update(chunk)
+        return self.handle.write(chunk)
+
+def extract_pdfs(archive: Path, destination: Path, taken: set) -> tuple[list, list]:
+    # Returns (filename, path, file_hash, size_bytes) per extracted PDF and the names of the skipped members.
+    # Only the base name of a member is used, so no path in the archive can point outside the session folder.
+    # Raises ArchiveTooLarge past UPLOAD_MAX_ARCHIVE_MEMBERS or UPLOAD_MAX_EXTRACTED_BYTES, files written so far are removed.
+    extracted, skipped = [], []
+    with zipfile.ZipFile(archive) as zf:
+        members = [member for member in zf.infolist() if not member.is_dir()]
+        if len(members) > AppSettings.UPLOAD_MAX_ARCHIVE_MEMBERS:
+            raise ArchiveTooLarge(f"Archive has {len(members)} members, at most {AppSettings.UPLOAD_MAX_ARCHIVE_MEMBERS} are allowed")
+        pdfs = [member for member in members if member.filename.lower().endswith(".pdf")]
+        declared = sum(member.file_size for member in pdfs)
+        if declared > AppSettings.UPLOAD_MAX_EXTRACTED_BYTES:
+            raise ArchiveTooLarge(f"Archive extracts to {declared} bytes, at most {AppSettings.UPLOAD_MAX_EXTRACTED_BYTES} are allowed")
+
+        total = 0
+        try:
+            for member in members:
+                basename = Path(member.filename.replace("\\", "/")).name
+                if not basename.lower().endswith(".pdf"):
+                    skipped.append(member.filename)
+                    continue
+                filename = unique_name(basename, taken)
+                file_path = destination / filename
+                extracted.append((filename, str(file_path), None, 0))
+                with zf.open(member) as source, open(file_path, "wb") as handle:
+                    writer = _HashingWriter(handle, AppSettings.UPLOAD_MAX_EXTRACTED_BYTES - total)
+                    shutil.copyfileobj(source, writer, AppSettings.UPLOAD_CHUNK_SIZE)
+                total += writer.size
+                extracted[-1] = (filename, str(file_path), writer.hasher.hexdigest(), writer.size)
+        except Exception:
+            for filename, file_path, *_ in extracted:
+                Path(file_path).unlink(missing_ok=True)
+                taken.discard(filename)
+            raise
+    logger.info(f"Extracted {len(extracted)} PDF(s) from {archive} ({len(skipped)} other member(s) skipped)")
+    return extracted, skipped
@@ -1,7 +1,14 @@
 # rag_system\llm\ollama_llm.py
 from llama_index.core.llms import LLM, CompletionResponse, ChatResponse, ChatMessage, LLMMetadata
-import requests
+from llama_index.core.base.llms.types import (
+    CompletionResponseGen, ChatResponseGen, CompletionResponseAsyncGen, ChatResponseAsyncGen
+)
+import json
+import httpx
 from src.config.app_settings import AppSettings
+from src.clients.http_pool import get_session, get_async_client
+from src.clients.admission import Overloaded, admission
+from src.monitoring.metrics import LLM_TOKENS, OLLAMA_ERRORS, observe_stage, timed
 from pydantic import Field
 import logging
 from src.config.logging_config import setup_logging
@@ -9,6 +16,17 @@ from src.config.logging_config import setup_logging
 setup_logging()
 logger = logging.getLogger(__name__)
 
+def record_generation(data: dict):
+    # Ollama reports token counts and prefill/decode durations (ns) on the final response
+    if data.get("prompt_eval_count"):
+        LLM_TOKENS.inc(data["prompt_eval_count"], kind="prompt")
+    if data.get("eval_count"):
+        LLM_TOKENS.inc(data["eval_count"], kind="generated")
+    if data.get("prompt_eval_duration"):
+        observe_stage("llm_prefill", data["prompt_eval_duration"] / 1e9)
+    if data.get("eval_duration"):
+        observe_stage("llm_generate", data["eval_duration"] / 1e9)
+
 class OllamaLLM(LLM):
     model: str = Field(default=AppSettings.QA_MODEL, description="Ollama QA model name")
     url: str = Field(default=f"{AppSettings.OLLAMA_BASE_URL}/api/generate", description="Ollama generate API endpoint")
@@ -16,65 +34,228 @@ class OllamaLLM(LLM):
     def __init__(self, model: str = None):
         super().__init__(model_name=model or AppSettings.QA_MODEL)
 
+    def load(self):
+        # An empty prompt makes Ollama load the model into memory without generating
+        try:
+            response = get_session().post(self.url, json={"model": self.model, "prompt": "", "stream": False},
+                                          timeout=AppSettings.WARMUP_TIMEOUT)
+            response.raise_for_status()
+        except Exception as e:
+            OLLAMA_ERRORS.inc(endpoint="generate")
+            logger.exception(f"Failed to load model {self.model}.")
+            raise RuntimeError(f"Failed to load model {self.model}: {str(e)}") from e
+
     def complete(self, prompt: str, **kwargs) -> CompletionResponse:
+        # Waiting for a slot is not part of the request timeout; Overloaded is raised as is
+        with admission.slot():
+            return self._complete(prompt, **kwargs)
+
+    def _complete(self, prompt: str, **kwargs) -> CompletionResponse:
         try:
-            response = requests.post(
-                self.url,
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False
-                },
-                timeout=30
-            )
+            with timed("llm"):
+                response = get_session().post(
+                    self.url,
+                    json=self._payload(prompt, False, kwargs.get("context")),
+                    timeout=AppSettings.LLM_TIMEOUT
+                )
             response.raise_for_status()
             data = response.json()
             content = data.get("response")
             if content is None:
                 raise ValueError("Missing 'response' in Ollama server response")
-            return CompletionResponse(text=content)
+            record_generation(data)
+            return CompletionResponse(text=content, raw=data)
         except Exception as e:
+            OLLAMA_ERRORS.inc(endpoint="generate")
             logger.exception(f"LLM completion failed.")
             raise RuntimeError(f"Failed to get completion: {str(e)}") from e
 
     def chat(self, messages: list[ChatMessage], **kwargs) -> ChatResponse:
+        with admission.slot():
+            return self._chat(messages, **kwargs)
+
+    def _chat(self, messages: list[ChatMessage], **kwargs) -> ChatResponse:
         try:
-            # Format messages for deepseek-r1:1.5b
-            prompt = ""
-            for m in messages:
-                role = "user" if m.role == "user" else "assistant"
-                prompt += f"[{role}] {m.content}\n"
-            response = requests.post(
-                self.url,
-                json={"model": self.model, "prompt": prompt, "stream": False},
-                timeout=30
-            )
+            prompt = self._format_messages(messages)
+            with timed("llm"):
+                response = get_session().post(
+                    self.url,
+                    json=self._payload(prompt, False, kwargs.get("context")),
+                    timeout=AppSettings.LLM_TIMEOUT
+                )
             response.raise_for_status()
-            content = response.json().get("response")
+            data = response.json()
+            content = data.get("response")
             if content is None:
                 raise ValueError("Missing 'response' in Ollama server response")
-            return ChatResponse(message=ChatMessage(role="assistant", content=content))
+            record_generation(data)
+            return ChatResponse(message=ChatMessage(role="assistant", content=content), raw=data)
         except Exception as e:
+            OLLAMA_ERRORS.inc(endpoint="generate")
             logger.exception(f"LLM chat failed.")
             raise RuntimeError(f"Failed to get chat response: {str(e)}") from e
 
     async def acomplete(self, prompt: str, **kwargs) -> CompletionResponse:
-        raise NotImplementedError("Async complete not implemented")
+        async with admission.aslot():
+            return await self._acomplete(prompt, **kwargs)
 
-    def stream_complete(self, prompt: str, **kwargs):
-        raise NotImplementedError("Stream complete not implemented")
+    async def _acomplete(self, prompt: str, **kwargs) -> CompletionResponse:
+        try:
+            with timed("llm"):
+                response = await get_async_client().post(
+                    self.url,
+                    json=self._payload(prompt, False, kwargs.get("context")),
+                    timeout=AppSettings.LLM_TIMEOUT
+                )
+            response.raise_for_status()
+            data = response.json()
+            content = data.get("response")
+            if content is None:
+                raise ValueError("Missing 'response' in Ollama server response")
+            record_generation(data)
+            return CompletionResponse(text=content, raw=data)
+        except Exception as e:
+            OLLAMA_ERRORS.inc(endpoint="generate")
+            logger.exception(f"Async LLM completion failed.")
+            raise RuntimeError(f"Failed to get completion: {str(e)}") from e
 
-    async def astream_complete(self, prompt: str, **kwargs):
-        raise NotImplementedError("Async stream complete not implemented")
+    def stream_complete(self, prompt: str, **kwargs) -> CompletionResponseGen:
+        # The slot is held until the stream is exhausted or closed
+        slot = admission.acquire()
+        try:
+            # Read timeout applies between streamed lines, not to the whole generation
+            response = get_session().post(
+                self.url,
+                json=self._payload(prompt, True, kwargs.get("context")),
+                stream=True,
+                timeout=(10, 60)
+            )
+            response.raise_for_status()
+        except Exception as e:
+            slot.release()
+            OLLAMA_ERRORS.inc(endpoint="generate")
+            logger.exception(f"LLM stream completion failed.")
+            raise RuntimeError(f"Failed to start streaming completion: {str(e)}") from e
+
+        def gen() -> CompletionResponseGen:
+            text = ""
+            try:
+                # Ollama streams one JSON object per line, the last one has "done": true
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if "error" in data:
+                        raise ValueError(data["error"])
+                    delta = data.get("response", "")
+                    text += delta
+                    yield CompletionResponse(text=text, delta=delta, raw=data)
+                    if data.get("done"):
+                        record_generation(data)
+                        break
+            except Exception as e:
+                OLLAMA_ERRORS.inc(endpoint="generate")
+                logger.exception(f"LLM stream completion failed.")
+                raise RuntimeError(f"Failed to stream completion: {str(e)}") from e
+            finally:
+                response.close()
+                slot.release()
+
+        return gen()
+
+    async def astream_complete(self, prompt: str, **kwargs) -> CompletionResponseAsyncGen:
+        client = get_async_client()
+        request = client.build_request(
+            "POST",
+            self.url,
+            json=self._payload(prompt, True, kwargs.get("context")),
+            timeout=httpx.Timeout(60.0, connect=10.0)
+        )
+        slot = await admission.aacquire()
+        try:
+            response = await client.send(request, stream=True)
+            response.raise_for_status()
+        except Exception as e:
+            slot.release()
+            OLLAMA_ERRORS.inc(endpoint="generate")
+            logger.exception(f"Async LLM stream completion failed.")
+            raise RuntimeError(f"Failed to start streaming completion: {str(e)}") from e
+
+        async def gen() -> CompletionResponseAsyncGen:
+            text = ""
+            try:
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if "error" in data:
+                        raise ValueError(data["error"])
+                    delta = data.get("response", "")
+                    text += delta
+                    yield CompletionResponse(text=text, delta=delta, raw=data)
+                    if data.get("done"):
+                        record_generation(data)
+                        break
+            except Exception as e:
+                OLLAMA_ERRORS.inc(endpoint="generate")
+                logger.exception(f"Async LLM stream completion failed.")
+                raise RuntimeError(f"Failed to stream completion: {str(e)}") from e
+            finally:
+                await response.aclose()
+                slot.release()
+
+        return gen()
 
     async def achat(self, messages: list[ChatMessage], **kwargs) -> ChatResponse:
-        raise NotImplementedError("Async chat not implemented")
+        try:
+            completion = await self.acomplete(self._format_messages(messages), **kwargs)
+            return ChatResponse(message=ChatMessage(role="assistant", content=completion.text))
+        except Overloaded:
+            raise
+        except Exception as e:
+            logger.exception(f"Async LLM chat failed.")
+            raise RuntimeError(f"Failed to get chat response: {str(e)}") from e
+
+    def stream_chat(self, messages: list[ChatMessage], **kwargs) -> ChatResponseGen:
+        completions = self.stream_complete(self._format_messages(messages), **kwargs)
+
+        def gen() -> ChatResponseGen:
+            for completion in completions:
+                yield ChatResponse(
+                    message=ChatMessage(role="assistant", content=completion.text),
+                    delta=completion.delta,
+                    raw=completion.raw,
+                )
+
+        return gen()
+
+    async def astream_chat(self, messages: list[ChatMessage], **kwargs) -> ChatResponseAsyncGen:
+        completions = await self.astream_complete(self._format_messages(messages), **kwargs)
+
+        async def gen() -> ChatResponseAsyncGen:
+            async for completion in completions:
+                yield ChatResponse(
+                    message=ChatMessage(role="assistant", content=completion.text),
+                    delta=completion.delta,
+                    raw=completion.raw,
+                )
+
+        return gen()
 
-    def stream_chat(self, messages: list[ChatMessage], **kwargs):
-        raise NotImplementedError("Stream chat not implemented")
+    def _payload(self, prompt: str, stream: bool, context: list = None) -> dict:
+        payload = {"model": self.model, "prompt": prompt, "stream": stream}
+        # Token ids returned by an earlier call (raw["context"]), Ollama continues from them without re-running their prefill
+        if context:
+            payload["context"] = context
+        return payload
 
-    async def astream_chat(self, messages: list[ChatMessage], **kwargs):
-        raise NotImplementedError("Async stream chat not implemented")
+    def _format_messages(self, messages: list[ChatMessage]) -> str:
+        # Format messages for deepseek-r1:1.5b
+        prompt = ""
+        for m in messages:
+            role = "user" if m.role == "user" else "assistant"
+            prompt += f"[{role}] {m.content}\n"
+        return prompt
 
     @property
     def metadata(self) -> LLMMetadata:
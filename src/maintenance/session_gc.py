@@ -0,0 +1,141 @@
+# rag_system/maintenance/session_gc.py
+import csv
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from src.chat.session_store import sessions_with_history, delete_history
+from src.chat.context_store import conversation_contexts
+from src.config.app_settings import AppSettings
+from src.ingestion.file_registry import remove_session_files
+from src.ingestion.job_queue import active_job_sessions
+from src.config.logging_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+def folder_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def write_cleanup_log(session_ids):
+    log_file = Path(AppSettings.LOG_CLEANUP_FILE)
+    is_new = not log_file.exists()
+
+    with log_file.open("a", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        if is_new:
+            writer.writerow(["timestamp", "session_id"])
+        timestamp = datetime.now().isoformat()
+        for session_id in session_ids:
+            writer.writerow([timestamp, session_id])
+
+class SessionGC:
+    """Removes sessions without chat history: upload folder, vectors, lexical rows and file links."""
+
+    def __init__(self, index_manager, on_delete=None, interval: float = None, time_budget: float = None,
+                 min_age: float = None):
+        self._index_manager = index_manager  # an IndexManager, or a callable returning it on first use
+        self.on_delete = on_delete          # called with the session_id after its data is gone
+        self.interval = interval if interval is not None else AppSettings.SESSION_GC_INTERVAL
+        self.time_budget = time_budget if time_budget is not None else AppSettings.SESSION_GC_TIME_BUDGET
+        self.min_age = min_age if min_age is not None else AppSettings.SESSION_GC_MIN_AGE
+        # One run at a time, the endpoint and the background thread may overlap
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def index_manager(self):
+        return self._index_manager() if callable(self._index_manager) else self._index_manager
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="session-gc", daemon=True)
+        self._thread.start()
+        logger.info(f"Session GC runs every {self.interval:.0f}s (budget {self.time_budget:.0f}s, "
+                    f"sessions idle for {self.min_age:.0f}s)")
+
+    def stop(self, timeout: float = 10.0):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run(time_budget=self.time_budget, min_age=self.min_age)
+            except Exception:
+                logger.exception("Background session cleanup failed")
+
+    def find_unused(self, min_age: float = 0) -> list:
+        source_data = Path(AppSettings.SOURCE_DATA)
+        if not source_data.exists():
+            return []
+        cutoff = time.time() - min_age
+        folders = {}
+        with os.scandir(source_data) as entries:
+            for entry in entries:
+                if entry.is_dir() and entry.stat().st_mtime <= cutoff:
+                    folders[entry.name] = entry.stat().st_mtime
+        # Two set lookups for the whole listing instead of a history query per folder
+        in_use = sessions_with_history(folders) | active_job_sessions()
+        return sorted((name for name in folders if name not in in_use), key=folders.get)
+
+    def run(self, dry_run: bool = False, time_budget: float = None, min_age: float = 0) -> dict:
+        with self._run_lock:
+            started = time.monotonic()
+            unused = self.find_unused(min_age)
+            report = {"sessions": [], "vectors_deleted": 0, "bytes_reclaimed": 0, "remaining": 0}
+            if dry_run:
+                report["sessions"] = unused
+                report["bytes_reclaimed"] = sum(folder_size(Path(AppSettings.SOURCE_DATA) / s) for s in unused)
+                return report
+
+            # Oldest first, whatever the budget leaves is picked up by the next run
+            for i, session_id in enumerate(unused):
+                if time_budget and time.monotonic() - started >= time_budget:
+                    report["remaining"] = len(unused) - i
+                    break
+                try:
+                    vectors, reclaimed = self.remove_session(session_id)
+                except Exception as e:
+                    logger.warning(f"Failed to cleanup session {session_id}: {e}")
+                    continue
+                report["sessions"].append(session_id)
+                report["vectors_deleted"] += vectors
+                report["bytes_reclaimed"] += reclaimed
+
+            if report["sessions"]:
+                write_cleanup_log(report["sessions"])
+                logger.info(f"Session cleanup removed {len(report['sessions'])} session(s), {report['vectors_deleted']} "
+                            f"vectors, {report['bytes_reclaimed']} bytes in {time.monotonic() - started:.2f}s "
+                            f"({report['remaining']} left for the next run)")
+            return report
+
+    def remove_session(self, session_id: str) -> tuple:
+        # The folder goes last: a failure before it leaves the session listed for the next run
+        folder = Path(AppSettings.SOURCE_DATA) / session_id
+        vectors, reclaimed = self.index_manager.delete_session_vectors(session_id)
+        remove_session_files(session_id)
+        delete_history(session_id)
+        conversation_contexts.reset(session_id)
+        if self.on_delete:
+            self.on_delete(session_id)
+        reclaimed += folder_size(folder)
+        shutil.rmtree(folder)
+        logger.info(f"Deleted unused session {session_id}: {vectors} vectors, {reclaimed} bytes")
+        return vectors, reclaimed
@@ -0,0 +1,167 @@
+# rag_system/monitoring/metrics.py
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# Seconds; covers a cache hit (ms) up to a slow generation on CPU (a minute)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines += [line for key, value in items for line in self._lines(key, value)]
+        return lines
+
+    def _lines(self, key: Tuple[str, ...], value) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._functions = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function, **labels):
+        # Read at scrape time, for values owned by another component such as a queue length
+        with self._lock:
+            self._functions[self._key(labels)] = function
+
+    def render(self) -> List[str]:
+        with self._lock:
+            functions = list(self._functions.items())
+        for key, function in functions:
+            try:
+                value = function()
+            except Exception:
+                continue
+            with self._lock:
+                self._values[key] = value
+        return super().render()
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (the last one is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _lines(self, key, value) -> List[str]:
+        counts, total, count = value
+        lines, cumulative = [], 0
+        for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket
+            le = "+Inf" if bound == float("inf") else _format_value(bound)
+            labels = _format_labels(self.labelnames, key, 'le="' + le + '"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+REGISTRY: List[_Metric] = []
+
+REQUEST_SECONDS = Histogram("rag_http_request_duration_seconds", "HTTP request latency.", ("method", "route", "status"))
+TIME_TO_FIRST_TOKEN = Histogram("rag_time_to_first_token_seconds", "Time from a streamed question to its first answer token.", ("cache",))
+STAGE_SECONDS = Histogram("rag_stage_duration_seconds", "Time spent in each pipeline stage.", ("stage",))
+LLM_TOKENS = Counter("rag_llm_tokens_total", "Tokens processed by the LLM.", ("kind",))
+OLLAMA_ERRORS = Counter("rag_ollama_errors_total", "Failed requests to Ollama.", ("endpoint",))
+CHAT_WRITE_QUEUE = Gauge("rag_chat_write_queue_depth", "Chat records waiting for the write-behind writer.")
+CACHE_LOOKUPS = Counter("rag_cache_lookups_total", "Embedding and answer cache lookups.", ("cache", "result"))
+CACHE_ENTRIES = Gauge("rag_cache_entries", "Entries held by a cache.", ("cache",))
+CACHE_EVICTIONS = Counter("rag_cache_evictions_total", "Entries evicted from a cache to stay under its size limit.", ("cache",))
+COALESCED = Counter("rag_coalesced_requests_total", "Calls that joined an identical call already in flight.", ("kind",))
+ADMISSION_WAIT = Histogram("rag_admission_wait_seconds", "Time calls to Ollama waited for a slot.", ("priority",))
+ADMISSION_QUEUE = Gauge("rag_admission_queue_depth", "Calls to Ollama waiting for a slot.", ("priority",))
+ADMISSION_ACTIVE = Gauge("rag_admission_active", "Calls to Ollama holding a slot.")
+ADMISSION_REJECTED = Counter("rag_admission_rejected_total", "Interactive calls refused with 429.", ("reason",))
+
+def render() -> str:
+    # Prometheus text exposition format 0.0.4
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+# Stage durations of the current request, read back into the Server-Timing header.
+# Threads started through run_in_threadpool / asyncio.to_thread inherit it.
+_request_timings: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("request_timings", default=None)
+
+def start_request_timing() -> dict:
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+@contextmanager
+def timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+def server_timing_header(timings: dict, total: float) -> str:
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
@@ -0,0 +1,114 @@
+# rag_system/retrieval/answer_cache.py
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from itertools import count
+from typing import Optional
+import numpy as np
+from src.config.app_settings import AppSettings
+from src.monitoring.metrics import CACHE_LOOKUPS
+from src.config.logging_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+GLOBAL_SCOPE = "__global__"
+
+@dataclass
+class CachedAnswer:
+    scope: str
+    version: int
+    embedding: np.ndarray
+    node_ids: list
+    answer: str
+    sources: list
+    created_at: float = field(default_factory=time.time)
+
+class AnswerCache:
+    """In-memory semantic cache of /ask answers, scoped per session (or global) and corpus version."""
+
+    def __init__(self, threshold: float = None, ttl: float = None, max_entries: int = None):
+        self.threshold = threshold if threshold is not None else AppSettings.ANSWER_CACHE_THRESHOLD
+        self.ttl = ttl if ttl is not None else AppSettings.ANSWER_CACHE_TTL
+        self.max_entries = max_entries or AppSettings.ANSWER_CACHE_MAX_ENTRIES
+        self._entries = OrderedDict()   # entry id -> CachedAnswer, least recently used first
+        self._scopes = {}               # scope -> set of entry ids
+        self._versions = {}             # scope -> corpus version
+        self._ids = count()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def scope_for(session_id: str = None) -> str:
+        return session_id or GLOBAL_SCOPE
+
+    def version(self, scope: str) -> int:
+        with self._lock:
+            return self._versions.get(scope, 0)
+
+    def invalidate(self, session_id: str = None):
+        # Session documents are also visible to global queries, so both scopes change
+        scopes = {self.scope_for(session_id), GLOBAL_SCOPE}
+        with self._lock:
+            for scope in scopes:
+                self._versions[scope] = self._versions.get(scope, 0) + 1
+                for entry_id in self._scopes.pop(scope, set()):
+                    self._entries.pop(entry_id, None)
+        logger.info(f"Answer cache invalidated for scopes: {sorted(scopes)}")
+
+    def lookup(self, scope: str, embedding: list) -> Optional[tuple[CachedAnswer, float]]:
+        query = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            current_version = self._versions.get(scope, 0)
+            best, best_id, best_score = None, None, self.threshold
+            for entry_id in list(self._scopes.get(scope, ())):
+                entry = self._entries[entry_id]
+                if entry.version != current_version or now - entry.created_at > self.ttl:
+                    self._remove(entry_id)
+                    continue
+                score = float(np.dot(query, entry.embedding))
+                if score >= best_score:
+                    best, best_id, best_score = entry, entry_id, score
+
+            if best is None:
+                CACHE_LOOKUPS.inc(cache="answer", result="miss")
+                return None
+            self._entries.move_to_end(best_id)
+            CACHE_LOOKUPS.inc(cache="answer", result="hit")
+            return best, best_score
+
+    def store(self, scope: str, version: int, embedding: list, node_ids: list, answer: str, sources: list):
+        entry = CachedAnswer(
+            scope=scope,
+            version=version,
+            embedding=self._normalize(embedding),
+            node_ids=list(node_ids),
+            answer=answer,
+            sources=list(sources),
+        )
+        with self._lock:
+            # The corpus changed while this answer was being generated
+            if version != self._versions.get(scope, 0):
+                return
+            entry_id = next(self._ids)
+            self._entries[entry_id] = entry
+            self._scopes.setdefault(scope, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id, None)
+        if entry is not None:
+            ids = self._scopes.get(entry.scope)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._scopes[entry.scope]
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
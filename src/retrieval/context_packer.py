@@ -0,0 +1,128 @@
+# rag_system/retrieval/context_packer.py
+import hashlib
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from llama_index.core.schema import NodeWithScore
+from llama_index.core.utils import get_tokenizer
+from src.config.app_settings import AppSettings
+from src.config.logging_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+SEPARATOR = "\n\n"
+
+def content_hash(text: str) -> str:
+    # Whitespace and case differences from PDF extraction should not make two chunks distinct
+    normalized = re.sub(r"\s+", " ", text).strip().lower()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+@dataclass
+class PackedContext:
+    nodes: List[NodeWithScore]
+    text: str
+    context_tokens: int
+    token_budget: int
+    retrieved: int
+    duplicates: int = 0
+    near_duplicates: int = 0
+    over_budget: int = 0
+    truncated: bool = False
+    usage: dict = field(default_factory=dict)
+
+class ContextPacker:
+    """Picks retrieved chunks for the prompt: exact and near-duplicate removal, MMR ordering, token budget."""
+
+    def __init__(self, tokenizer: Callable = None, mmr_lambda: float = None, duplicate_threshold: float = None):
+        self.tokenizer = tokenizer or get_tokenizer()
+        self.mmr_lambda = mmr_lambda if mmr_lambda is not None else AppSettings.CONTEXT_MMR_LAMBDA
+        self.duplicate_threshold = duplicate_threshold if duplicate_threshold is not None else AppSettings.CONTEXT_DUPLICATE_THRESHOLD
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenizer(text))
+
+    def pack(self, nodes: List[NodeWithScore], budget: int, query_embedding: Optional[list] = None,
+             embeddings: Optional[Dict[str, list]] = None) -> PackedContext:
+        embeddings = embeddings or {}
+        packed = PackedContext(nodes=[], text="", context_tokens=0, token_budget=max(budget, 0), retrieved=len(nodes))
+
+        # Exact duplicates (same chunk stored for several sessions or files) keep their best-ranked copy
+        candidates, seen = [], set()
+        for node in nodes:
+            key = content_hash(node.node.get_content())
+            if key in seen:
+                packed.duplicates += 1
+                continue
+            seen.add(key)
+            candidates.append(node)
+
+        vectors = [self._normalize(embeddings.get(node.node.node_id)) for node in candidates]
+        query = self._normalize(query_embedding)
+        relevance = [
+            float(np.dot(query, vector)) if query is not None and vector is not None else (node.score or 0.0)
+            for node, vector in zip(candidates, vectors)
+        ]
+
+        selected_vectors, parts, remaining = [], [], list(range(len(candidates)))
+        separator_tokens = self.count_tokens(SEPARATOR)
+        while remaining:
+            best, best_score = None, None
+            for i in list(remaining):
+                redundancy = max((float(np.dot(vectors[i], s)) for s in selected_vectors if vectors[i] is not None), default=0.0)
+                if redundancy >= self.duplicate_threshold:
+                    remaining.remove(i)
+                    packed.near_duplicates += 1
+                    continue
+                score = self.mmr_lambda * relevance[i] - (1 - self.mmr_lambda) * redundancy
+                if best_score is None or score > best_score:
+                    best, best_score = i, score
+            if best is None:
+                break
+            remaining.remove(best)
+
+            node = candidates[best]
+            text = node.node.get_content()
+            tokens = self.count_tokens(text) + (separator_tokens if parts else 0)
+            if packed.context_tokens + tokens > packed.token_budget:
+                if parts or packed.token_budget <= 0:
+                    packed.over_budget += 1
+                    continue
+                # The best chunk alone is larger than the budget, keep as much of it as fits
+                text = self._truncate(text, packed.token_budget)
+                tokens = self.count_tokens(text)
+                packed.truncated = True
+
+            parts.append(text)
+            packed.nodes.append(node)
+            packed.context_tokens += tokens
+            if vectors[best] is not None:
+                selected_vectors.append(vectors[best])
+
+        packed.text = SEPARATOR.join(parts)
+        packed.usage = {
+            "context_tokens": packed.context_tokens,
+            "token_budget": packed.token_budget,
+            "chunks_retrieved": packed.retrieved,
+            "chunks_used": len(packed.nodes),
+            "duplicates_dropped": packed.duplicates + packed.near_duplicates,
+            "over_budget_dropped": packed.over_budget,
+            "truncated": packed.truncated,
+        }
+        return packed
+
+    def _truncate(self, text: str, budget: int) -> str:
+        # Shrink proportionally until the token count fits, usually one or two rounds
+        while text and self.count_tokens(text) > budget:
+            text = text[:int(len(text) * budget / self.count_tokens(text) * 0.95)]
+        return text
+
+    @staticmethod
+    def _normalize(vector) -> Optional[np.ndarray]:
+        if vector is None:
+            return None
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
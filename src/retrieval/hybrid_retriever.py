@@ -0,0 +1,76 @@
+# rag_system/retrieval/hybrid_retriever.py
+import logging
+import re
+from typing import Callable, List
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from src.config.app_settings import AppSettings
+from src.vectorstore.lexical_index import LexicalIndex, query_terms
+from src.config.logging_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+HYBRID = "hybrid"
+VECTOR = "vector"
+LEXICAL = "lexical"
+
+_IDENTIFIER = re.compile(r"\d|\w[-_./:]\w")
+
+def is_keyword_query(query: str) -> bool:
+    # Quoted phrases and short identifier lookups (part numbers, clause ids) need no embedding
+    query = query.strip()
+    if len(query) > 2 and query[0] == query[-1] == '"':
+        return True
+    terms = query_terms(query)
+    return (
+        0 < len(terms) <= AppSettings.LEXICAL_FAST_MAX_TERMS
+        and not query.endswith("?")
+        and any(_IDENTIFIER.search(term) for term in terms)
+    )
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int) -> dict:
+    scores = {}
+    for ranking in rankings:
+        for rank, node_id in enumerate(ranking, start=1):
+            scores[node_id] = scores.get(node_id, 0.0) + 1.0 / (k + rank)
+    return scores
+
+class HybridRetriever(BaseRetriever):
+    """Fuses Chroma vector search and FTS5 BM25 search with reciprocal rank fusion."""
+
+    def __init__(self, vector_retriever: BaseRetriever, lexical_index: LexicalIndex, fetch_nodes: Callable,
+                 session_id: str = None, similarity_top_k: int = 5, mode: str = None, rrf_k: int = None):
+        super().__init__()
+        self.vector_retriever = vector_retriever
+        self.lexical_index = lexical_index
+        self.fetch_nodes = fetch_nodes      # (node ids, session id) -> nodes, for lexical hits the vector search did not return
+        self.session_id = session_id
+        self.similarity_top_k = similarity_top_k
+        self.mode = mode or AppSettings.RETRIEVAL_MODE
+        self.rrf_k = rrf_k or AppSettings.RRF_K
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        # Without an embedding (lexical fast mode) only the lexical side can run
+        if self.mode == LEXICAL or query_bundle.embedding is None:
+            return self._lexical(query_bundle.query_str)
+        if self.mode == VECTOR:
+            return self.vector_retriever.retrieve(query_bundle)
+
+        vector_nodes = self.vector_retriever.retrieve(query_bundle)
+        lexical_hits = self.lexical_index.search(query_bundle.query_str, self.session_id, self.similarity_top_k)
+        scores = reciprocal_rank_fusion(
+            [[n.node.node_id for n in vector_nodes], [node_id for node_id, _ in lexical_hits]], self.rrf_k
+        )
+        ranked = sorted(scores, key=scores.get, reverse=True)[:self.similarity_top_k]
+
+        nodes = {n.node.node_id: n.node for n in vector_nodes}
+        missing = [node_id for node_id in ranked if node_id not in nodes]
+        for node in self.fetch_nodes(missing, self.session_id):
+            nodes[node.node_id] = node
+        return [NodeWithScore(node=nodes[node_id], score=scores[node_id]) for node_id in ranked if node_id in nodes]
+
+    def _lexical(self, query: str) -> List[NodeWithScore]:
+        hits = self.lexical_index.search(query, self.session_id, self.similarity_top_k)
+        nodes = {node.node_id: node for node in self.fetch_nodes([node_id for node_id, _ in hits], self.session_id)}
+        return [NodeWithScore(node=nodes[node_id], score=score) for node_id, score in hits if node_id in nodes]
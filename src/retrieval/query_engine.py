@@ -1,89 +1,322 @@
 # rag_system/retrieval/query_engine.py
 from src.vectorstore.index_manager import IndexManager
-from llama_index.core.query_engine import RetrieverQueryEngine
-from src.llm.ollama_llm import OllamaLLM
+from llama_index.core.schema import QueryBundle
+from llama_index.core.llms import CompletionResponse
+from src.retrieval.answer_cache import AnswerCache
+from src.retrieval.context_packer import ContextPacker
+from src.retrieval.hybrid_retriever import is_keyword_query, VECTOR
 from src.config.app_settings import AppSettings
+from src.monitoring.metrics import timed
+from src.chat.context_store import conversation_contexts
+from src.clients.single_flight import SingleFlight, AsyncSingleFlight, StreamSingleFlight, normalize_query
+from src.clients.admission import Overloaded
+import asyncio
 import logging
 from pathlib import Path
 from fastapi import HTTPException
-from src.ingestion.pdf_loader import load_pdf
+from src.ingestion.pdf_loader import load_pdf, tag_documents
+from src.ingestion.job_queue import get_session_job_statuses, FINISHED_STATUSES
 from src.config.logging_config import setup_logging
 
 setup_logging()
 logger = logging.getLogger(__name__)
 
+PROMPT_TEMPLATE = "[user] Answer the question based on the context.\n\nContext:\n{context}\n\nQuestion: {question} [assistant]"
+
+def too_busy(e: Overloaded) -> HTTPException:
+    return HTTPException(status_code=429, detail=f"Too many requests: {e}", headers={"Retry-After": str(e.retry_after)})
+
 class QueryEngine:
-    def __init__(self):
+    def __init__(self, index_manager: IndexManager = None):
         try:
-            self.index_manager = IndexManager()
+            self.index_manager = index_manager or IndexManager()
             self.llm_model = self.index_manager.llm_model
+            self.answer_cache = AnswerCache() if AppSettings.ANSWER_CACHE_ENABLED else None
+            self.context_packer = ContextPacker()
+            # Follow-up questions continue the session's Ollama context instead of starting a new prompt
+            self.contexts = conversation_contexts if AppSettings.LLM_CONTEXT_REUSE else None
+            # Identical concurrent questions in a scope share one retrieval and one generation
+            self._flight = SingleFlight("query")
+            self._async_flight = AsyncSingleFlight("query")
+            self._stream_flight = StreamSingleFlight("stream")
         except Exception as e:
             logger.exception("Failed to initialize QueryEngine.")
             raise RuntimeError("Failed to initialize QueryEngine") from e
 
-    def query(self, question: str, session_id: str = None):
+    def query(self, question: str, session_id: str = None, use_cache: bool = True):
         try:
-            if session_id:
-                session_folder = Path(f"{AppSettings.SOURCE_DATA}/{session_id}")
-                if not session_folder.exists() or not any(session_folder.iterdir()):
-                    logger.warning(f"No source data found for session: {session_id}")
-                    raise HTTPException(
-                        status_code=404,
-                        detail=f"No source data found for session ID: {session_id}"
-                    )
+            if AppSettings.COALESCE_REQUESTS:
+                key = self._flight_key(question, session_id, use_cache)
+                answer, sources, cache_hit, usage = self._flight.do(key, lambda: self._answer(question, session_id, use_cache))
+            else:
+                answer, sources, cache_hit, usage = self._answer(question, session_id, use_cache)
+
+        except HTTPException as http_exc:
+            raise http_exc
 
-                logger.info(f"Building index from session folder: {session_folder}")
-                
-                # Load documents from session folder
-                all_documents = []
-                for file in session_folder.glob("*.pdf"):
-                    docs, _ = load_pdf(str(file))
-                    all_documents.extend(docs)
+        except Overloaded as e:
+            raise too_busy(e) from e
 
-                if not all_documents:
-                    raise HTTPException(
-                        status_code=404,
-                        detail=f"No valid documents found in session: {session_id}"
-                    )
+        except Exception as e:
+            logger.exception("Query failed.")
+            answer = "Failed to get answer from language model."
+            sources, cache_hit, usage = [], False, None
 
-                index = self.index_manager.build_index(documents=all_documents)
+        return {
+            "answer": answer,
+            "sources": sources,
+            "cache_hit": cache_hit,
+            "usage": usage
+        }
 
+    async def aquery(self, question: str, session_id: str = None, use_cache: bool = True):
+        try:
+            if AppSettings.COALESCE_REQUESTS:
+                key = self._flight_key(question, session_id, use_cache)
+                answer, sources, cache_hit, usage = await self._async_flight.do(
+                    key, lambda: self._aanswer(question, session_id, use_cache)
+                )
             else:
-                logger.info("Loading global index...")
-                index = self.index_manager.build_index()
-
-            # Build retriever and query engine
-            retriever = index.as_retriever(similarity_top_k=5)
-            query_engine = RetrieverQueryEngine.from_args(retriever)
-
-            # Retrieve context
-            nodes = retriever.retrieve(question)
-            context = "\n\n".join([n.node.text for n in nodes])
-            # issue-> sources = [f"{n.node.metadata.get('filename')}, page {n.node.metadata.get('page')}" for n in nodes]
-            # Deduplicate sources while preserving order
-            seen = set()
-            sources = []
-            for n in nodes:
-                src = f"{n.node.metadata.get('filename')}, page {n.node.metadata.get('page')}"
-                if src not in seen:
-                    seen.add(src)
-                    sources.append(src)
-
-            # Format and send prompt
-            prompt = f"[user] Answer the question based on the context.\n\nContext:\n{context}\n\nQuestion: {question} [assistant]"
-            completion = self.llm_model.complete(prompt)
-            answer = completion.text
+                answer, sources, cache_hit, usage = await self._aanswer(question, session_id, use_cache)
 
         except HTTPException as http_exc:
             raise http_exc
 
+        except Overloaded as e:
+            raise too_busy(e) from e
+
         except Exception as e:
             logger.exception("Query failed.")
             answer = "Failed to get answer from language model."
-            sources = []
+            sources, cache_hit, usage = [], False, None
 
         return {
             "answer": answer,
-            "sources": sources
+            "sources": sources,
+            "cache_hit": cache_hit,
+            "usage": usage
         }
-    
+
+    async def astream_query(self, question: str, session_id: str = None, use_cache: bool = True):
+        # Retrieval errors surface here, before the caller starts streaming
+        try:
+            if AppSettings.COALESCE_REQUESTS:
+                # Identical concurrent questions read the same token stream, from its first token
+                key = self._flight_key(question, session_id, use_cache)
+                (sources, cache_hit, usage), tokens = await self._stream_flight.do(
+                    key, lambda: self._astart_stream(question, session_id, use_cache)
+                )
+            else:
+                (sources, cache_hit, usage), tokens = await self._astart_stream(question, session_id, use_cache)
+        except Overloaded as e:
+            raise too_busy(e) from e
+        return sources, tokens, cache_hit, usage
+
+    def _answer(self, question: str, session_id: str, use_cache: bool) -> tuple:
+        retriever = self._prepare_retriever(session_id)
+        scope, version = self._cache_scope(session_id)
+        embedding = None if self._lexical_fast_path(question) else self.index_manager.embed_model.get_query_embedding(question)
+
+        cached = self._lookup_answer(scope, embedding, use_cache)
+        if cached:
+            return cached.answer, cached.sources, True, None
+
+        history = self._history(session_id)
+        prompt, sources, nodes, usage = self._retrieve_context(retriever, question, embedding, history)
+        completion = self.llm_model.complete(prompt, context=history)
+        self._remember(session_id, completion)
+        self._store_answer(scope, version, embedding, nodes, completion.text, sources, use_cache)
+        return completion.text, sources, False, usage
+
+    async def _aanswer(self, question: str, session_id: str, use_cache: bool) -> tuple:
+        # Chroma and the filesystem are blocking, only the Ollama calls run on the event loop
+        retriever = await asyncio.to_thread(self._prepare_retriever, session_id)
+        scope, version = self._cache_scope(session_id)
+        embedding = None if self._lexical_fast_path(question) else await self.index_manager.embed_model.aget_query_embedding(question)
+
+        cached = self._lookup_answer(scope, embedding, use_cache)
+        if cached:
+            return cached.answer, cached.sources, True, None
+
+        history = await asyncio.to_thread(self._history, session_id)
+        prompt, sources, nodes, usage = await asyncio.to_thread(self._retrieve_context, retriever, question, embedding, history)
+        completion = await self.llm_model.acomplete(prompt, context=history)
+        await asyncio.to_thread(self._remember, session_id, completion)
+        self._store_answer(scope, version, embedding, nodes, completion.text, sources, use_cache)
+        return completion.text, sources, False, usage
+
+    async def _astart_stream(self, question: str, session_id: str, use_cache: bool) -> tuple:
+        retriever = await asyncio.to_thread(self._prepare_retriever, session_id)
+        scope, version = self._cache_scope(session_id)
+        embedding = None if self._lexical_fast_path(question) else await self.index_manager.embed_model.aget_query_embedding(question)
+
+        cached = self._lookup_answer(scope, embedding, use_cache)
+        if cached:
+            async def replay():
+                yield CompletionResponse(text=cached.answer, delta=cached.answer)
+
+            return (cached.sources, True, None), replay()
+
+        history = await asyncio.to_thread(self._history, session_id)
+        prompt, sources, nodes, usage = await asyncio.to_thread(self._retrieve_context, retriever, question, embedding, history)
+        completions = await self.llm_model.astream_complete(prompt, context=history)
+
+        async def tokens():
+            completion = None
+            async for completion in completions:
+                yield completion
+            if completion is not None:
+                await asyncio.to_thread(self._remember, session_id, completion)
+                self._store_answer(scope, version, embedding, nodes, completion.text, sources, use_cache)
+
+        return (sources, False, usage), tokens()
+
+    def _history(self, session_id: str) -> list:
+        # Token ids of the session's earlier turns, empty when there are none to continue.
+        # Blocking when contexts are persisted, the async paths call it in a thread.
+        if self.contexts is None or not session_id:
+            return []
+        return self.contexts.get(session_id, self.llm_model.model, max_tokens=self._history_limit()) or []
+
+    def _remember(self, session_id: str, completion):
+        # Ollama returns the context on the final response, streamed answers carry it on their last chunk.
+        # A conversation that no longer fits starts over on the next question.
+        if self.contexts is None or not session_id or not completion.raw:
+            return
+        self.contexts.put(session_id, self.llm_model.model, completion.raw.get("context"), max_tokens=self._history_limit())
+
+    def _history_limit(self) -> int:
+        # A continued context must leave the window room for the next answer and at least one new chunk;
+        # the store caps it further at LLM_CONTEXT_MAX_TOKENS
+        metadata = self.llm_model.metadata
+        return metadata.context_window - metadata.num_output - AppSettings.CHUNK_SIZE
+
+    def _flight_key(self, question: str, session_id: str, use_cache: bool) -> tuple:
+        # A new cache version (documents changed) starts a new call instead of joining one over the old documents
+        scope, version = self._cache_scope(session_id)
+        return scope, version, normalize_query(question), use_cache
+
+    def invalidate_cache(self, session_id: str = None):
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate(session_id)
+
+    def _cache_scope(self, session_id: str = None) -> tuple[str, int]:
+        scope = AnswerCache.scope_for(session_id)
+        version = self.answer_cache.version(scope) if self.answer_cache is not None else 0
+        return scope, version
+
+    def _lookup_answer(self, scope: str, embedding: list, use_cache: bool):
+        if self.answer_cache is None or not use_cache or embedding is None:
+            return None
+        found = self.answer_cache.lookup(scope, embedding)
+        if found is None:
+            return None
+        entry, similarity = found
+        logger.info(f"Answer cache hit for scope {scope} (similarity {similarity:.3f})")
+        return entry
+
+    def _store_answer(self, scope: str, version: int, embedding: list, nodes: list, answer: str, sources: list, use_cache: bool):
+        if self.answer_cache is None or not use_cache or embedding is None:
+            return
+        self.answer_cache.store(scope, version, embedding, [n.node.node_id for n in nodes], answer, sources)
+
+    def _prepare_retriever(self, session_id: str = None):
+        if session_id:
+            session_folder = Path(f"{AppSettings.SOURCE_DATA}/{session_id}")
+            if not session_folder.exists() or not any(session_folder.iterdir()):
+                logger.warning(f"No source data found for session: {session_id}")
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"No source data found for session ID: {session_id}"
+                )
+
+            if not self.index_manager.has_session_documents(session_id):
+                statuses = get_session_job_statuses(session_id)
+                if any(status not in FINISHED_STATUSES for status in statuses):
+                    raise HTTPException(
+                        status_code=409,
+                        detail=f"Documents for session {session_id} are still being ingested"
+                    )
+                if statuses:
+                    raise HTTPException(
+                        status_code=404,
+                        detail=f"No valid documents found in session: {session_id}"
+                    )
+                self._index_session_folder(session_id, session_folder)
+
+            logger.info(f"Loading index filtered to session: {session_id}")
+        else:
+            logger.info("Loading global index...")
+
+        return self.index_manager.get_retriever(session_id=session_id, similarity_top_k=AppSettings.CONTEXT_CANDIDATES)
+
+    def _lexical_fast_path(self, question: str) -> bool:
+        # Keyword-like queries skip the embedding call and the answer cache, retrieval is lexical only
+        fast = AppSettings.LEXICAL_FAST_MODE and AppSettings.RETRIEVAL_MODE != VECTOR and is_keyword_query(question)
+        if fast:
+            logger.info(f"Keyword query, using lexical retrieval without embedding: {question!r}")
+        return fast
+
+    def _retrieve_context(self, retriever, question: str, embedding: list, history: list = None) -> tuple[str, list, list, dict]:
+        with timed("retrieve"):
+            nodes = retriever.retrieve(QueryBundle(query_str=question, embedding=embedding))
+        lexical_only = embedding is None
+        if lexical_only and not nodes:
+            # Nothing matched lexically, fall back to the full hybrid search
+            embedding = self.index_manager.embed_model.get_query_embedding(question)
+            with timed("retrieve"):
+                nodes = retriever.retrieve(QueryBundle(query_str=question, embedding=embedding))
+            lexical_only = False
+        with timed("pack_context"):
+            embeddings = self.index_manager.get_embeddings([n.node.node_id for n in nodes], retriever.session_id)
+            # Only the context actually continued takes room, the answer's num_output is already reserved
+            budget = self._token_budget(question) - len(history or ())
+            packed = self.context_packer.pack(nodes, budget, embedding, embeddings)
+
+        prompt, sources = self._format_prompt(question, packed.text, packed.nodes)
+        usage = dict(packed.usage, prompt_tokens=self.context_packer.count_tokens(prompt), lexical_only=lexical_only,
+                     history_tokens=len(history or ()))
+        logger.info(
+            f"Packed {usage['chunks_used']}/{usage['chunks_retrieved']} chunks into {usage['context_tokens']} context tokens "
+            f"(budget {usage['token_budget']}, {usage['duplicates_dropped']} duplicates dropped), prompt {usage['prompt_tokens']} tokens"
+        )
+        return prompt, sources, packed.nodes, usage
+
+    def _token_budget(self, question: str) -> int:
+        # Whatever the context window leaves after the answer, the instructions and the question
+        metadata = self.llm_model.metadata
+        reserved = self.context_packer.count_tokens(PROMPT_TEMPLATE.format(context="", question=question))
+        return metadata.context_window - metadata.num_output - reserved
+
+    def _format_prompt(self, question: str, context: str, nodes: list) -> tuple[str, list]:
+        # issue-> sources = [f"{n.node.metadata.get('filename')}, page {n.node.metadata.get('page')}" for n in nodes]
+        # Deduplicate sources while preserving order
+        seen = set()
+        sources = []
+        for n in nodes:
+            src = f"{n.node.metadata.get('filename')}, page {n.node.metadata.get('page')}"
+            if src not in seen:
+                seen.add(src)
+                sources.append(src)
+
+        # Format prompt
+        prompt = PROMPT_TEMPLATE.format(context=context, question=question)
+        return prompt, sources
+
+    def _index_session_folder(self, session_id: str, session_folder: Path):
+        # Sessions uploaded before vectors were tagged with their session_id are indexed once here
+        logger.info(f"No tagged vectors for session {session_id}, indexing session folder: {session_folder}")
+        all_documents = []
+        for file in session_folder.glob("*.pdf"):
+            with timed("load_pdf"):
+                docs, file_hash = load_pdf(str(file))
+            all_documents.extend(tag_documents(docs, file_hash=file_hash, session_id=session_id))
+
+        if not all_documents:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No valid documents found in session: {session_id}"
+            )
+
+        self.index_manager.build_index(documents=all_documents)
+        self.invalidate_cache(session_id)
@@ -1,58 +1,264 @@
 # rag_system/vectorstore/index_manager.py
 from llama_index.core import VectorStoreIndex, Settings, StorageContext
+from llama_index.core.vector_stores import MetadataFilters, MetadataFilter
+from llama_index.core.schema import MetadataMode
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
 from llama_index.vector_stores.chroma import ChromaVectorStore
 from chromadb import PersistentClient
 from src.embedding.ollama_embedder import OllamaEmbedding
+from src.ingestion.chunker import get_node_parser, stable_node_id
+from src.retrieval.hybrid_retriever import HybridRetriever
+from src.vectorstore.lexical_index import LexicalIndex
+from src.vectorstore.numpy_store import get_numpy_store, NumpyCollection
 from src.llm.ollama_llm import OllamaLLM
 from src.config.app_settings import AppSettings
+import json
 import logging
+import os
+import sqlite3
 from src.config.logging_config import setup_logging
 
 setup_logging()
 logger = logging.getLogger(__name__)
 
+NUMPY_MAX_BATCH = 10000
+
 class IndexManager:
     def __init__(self):
         try:
-            self.client = PersistentClient(path=AppSettings.CHROMA_DB)
-            self.collection = self.client.get_or_create_collection(name="rag_collection")
-            self.vector_store = ChromaVectorStore(chroma_collection=self.collection)
+            if AppSettings.VECTOR_BACKEND == "numpy":
+                # Exact in-process search, the adapter keeps the collection calls below backend independent
+                self.vector_store = get_numpy_store()
+                self.collection = NumpyCollection(self.vector_store)
+                self.max_batch_size = NUMPY_MAX_BATCH
+            else:
+                self._open_chroma()
+            # BM25 index of the same chunks for hybrid and keyword retrieval
+            self.lexical_index = LexicalIndex()
+            if self.lexical_index.count() == 0 and self.collection.count() > 0:
+                self._backfill_lexical_index()
 
             # Instantiate embedding model with nomic-embed-text
             self.embed_model = OllamaEmbedding(model=AppSettings.EMBED_MODEL)
             # Instantiate LLM model with deepseek-r1:1.5b
             self.llm_model = OllamaLLM(model=AppSettings.QA_MODEL)
 
+            # Token-aware chunking with deterministic node ids (CHUNK_STRATEGY, CHUNK_SIZE, CHUNK_OVERLAP)
+            self.node_parser = get_node_parser()
+
             Settings.embed_model = self.embed_model
             Settings.llm = self.llm_model
+            Settings.node_parser = self.node_parser
 
             logger.info("IndexManager initialized successfully.")
         except Exception as e:
             logger.exception(f"Failed to initialize IndexManager.")
             raise RuntimeError("Initialization failed for IndexManager") from e
 
+    def _open_chroma(self):
+        self.client = PersistentClient(path=AppSettings.CHROMA_DB)
+        self.collection = self.client.get_or_create_collection(name="rag_collection")
+        self.vector_store = ChromaVectorStore(chroma_collection=self.collection)
+        self.max_batch_size = self.client.get_max_batch_size()
+
     def build_index(self, documents=None):
         try:
             storage_context = StorageContext.from_defaults(vector_store=self.vector_store)
             if documents:
                 logger.info(f"Building index from {len(documents)} documents.")
-                index = VectorStoreIndex.from_documents(
-                    documents,
-                    storage_context=storage_context,
-                )
+                self.add_documents(documents)
                 logger.info("Index successfully built from documents.")
             else:
                 logger.info("Loading index from existing vector store.")
-                index = VectorStoreIndex.from_vector_store(
-                    vector_store=self.vector_store,
-                    storage_context=storage_context,
-                )
-                logger.info("Index successfully loaded from vector store.")
+            index = VectorStoreIndex.from_vector_store(
+                vector_store=self.vector_store,
+                storage_context=storage_context,
+            )
+            logger.info("Index successfully loaded from vector store.")
             return index
         except Exception as e:
             logger.exception(f"Error while building/loading index.")
             raise RuntimeError("Failed to build/load index.") from e
-        
+
+    def add_documents(self, documents, batch_size: int = None, progress=None) -> int:
+        # Split, embed and write in batches so memory stays bounded and progress can be reported
+        batch_size = batch_size or AppSettings.INGEST_BATCH_SIZE
+        written = 0
+        try:
+            for i in range(0, len(documents), batch_size):
+                batch = documents[i:i + batch_size]
+                nodes = self.node_parser.get_nodes_from_documents(batch)
+                texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+                embeddings = self.embed_model.get_text_embedding_batch(texts)
+                for node, embedding in zip(nodes, embeddings):
+                    node.embedding = embedding
+                if progress:
+                    progress("embedded", len(batch))
+
+                self.upsert_nodes(nodes)
+                written += len(nodes)
+                if progress:
+                    progress("written", len(batch))
+            return written
+        except Exception as e:
+            logger.exception(f"Failed to add {len(documents)} documents to the vector store.")
+            raise RuntimeError("Failed to add documents.") from e
+
+    def upsert_nodes(self, nodes: list):
+        # Chunk ids are derived from session, file, page hash and position: writing a chunk again
+        # replaces the stored copy instead of adding another one
+        ids, embeddings, metadatas, documents = [], [], [], []
+        for node in nodes:
+            metadata = node_to_metadata_dict(node, remove_text=True, flat_metadata=True)
+            ids.append(node.node_id)
+            embeddings.append(node.get_embedding())
+            metadatas.append({key: "" if value is None else value for key, value in metadata.items()})
+            documents.append(node.get_content(metadata_mode=MetadataMode.NONE))
+        for i in range(0, len(ids), self.max_batch_size):
+            self.collection.upsert(
+                ids=ids[i:i + self.max_batch_size],
+                embeddings=embeddings[i:i + self.max_batch_size],
+                metadatas=metadatas[i:i + self.max_batch_size],
+                documents=documents[i:i + self.max_batch_size],
+            )
+        self.lexical_index.upsert_nodes(nodes)
+
+    def delete_ids(self, node_ids: list) -> int:
+        try:
+            for i in range(0, len(node_ids), self.max_batch_size):
+                self.collection.delete(ids=list(node_ids[i:i + self.max_batch_size]))
+            self.lexical_index.delete_ids(node_ids)
+            return len(node_ids)
+        except Exception as e:
+            logger.exception(f"Failed to delete {len(node_ids)} vectors.")
+            raise RuntimeError("Failed to delete vectors.") from e
+
+    def compact_storage(self) -> int:
+        # Offline only. Numpy scopes are rewritten without their deleted rows; Chroma's SQLite file is
+        # vacuumed, its HNSW segment files keep their size until Chroma rebuilds them
+        try:
+            dropped = 0
+            if isinstance(self.collection, NumpyCollection):
+                dropped = self.collection.compact()
+            else:
+                self._vacuum_chroma()
+            self.lexical_index.compact()
+            return dropped
+        except Exception as e:
+            logger.exception("Failed to compact vector storage.")
+            raise RuntimeError("Failed to compact vector storage.") from e
+
+    def _vacuum_chroma(self):
+        # Chroma holds its SQLite connections until the client is closed: they are released for VACUUM
+        # and the collection is opened again afterwards
+        path = os.path.join(AppSettings.CHROMA_DB, "chroma.sqlite3")
+        if not os.path.exists(path):
+            return
+        self.client.close()
+        try:
+            conn = sqlite3.connect(path, timeout=30)
+            try:
+                conn.execute("VACUUM")
+            except sqlite3.OperationalError as e:
+                # Another process, usually the API, still uses the file
+                raise RuntimeError(f"Cannot vacuum {path} while another process uses it, stop the API first: {e}") from e
+            finally:
+                conn.close()
+        finally:
+            self._open_chroma()
+
+    def delete_file_vectors(self, file_hash: str, session_id: str = None):
+        # session_id=None deletes the file in every session, "" only its bulk-ingested rows
+        try:
+            where = {"file_hash": file_hash}
+            if session_id is not None:
+                where = {"$and": [{"file_hash": file_hash}, {"session_id": session_id}]}
+            self.collection.delete(where=where)
+            self.lexical_index.delete(file_hash, session_id)
+            logger.info(f"Deleted vectors of file {file_hash} for session {session_id}.")
+        except Exception as e:
+            logger.exception(f"Failed to delete vectors of file {file_hash}.")
+            raise RuntimeError("Failed to delete file vectors.") from e
+
+    def get_retriever(self, session_id: str = None, similarity_top_k: int = 5):
+        try:
+            index = self.build_index()
+            if not session_id:
+                vector_retriever = index.as_retriever(similarity_top_k=similarity_top_k)
+            else:
+                # Restrict the vector search to vectors ingested for this session
+                filters = MetadataFilters(filters=[MetadataFilter(key="session_id", value=session_id)])
+                vector_retriever = index.as_retriever(similarity_top_k=similarity_top_k, filters=filters)
+
+            return HybridRetriever(
+                vector_retriever,
+                self.lexical_index,
+                self.get_nodes,
+                session_id=session_id,
+                similarity_top_k=similarity_top_k,
+            )
+        except Exception as e:
+            logger.exception(f"Failed to create retriever for session {session_id}.")
+            raise RuntimeError("Failed to create retriever.") from e
+
+    def get_nodes(self, node_ids: list, session_id: str = None) -> list:
+        # A session id lets the numpy backend look in that session's scope only, instead of opening every scope
+        if not node_ids:
+            return []
+        try:
+            results = self.collection.get(ids=list(node_ids), where=self._session_where(session_id), include=["documents", "metadatas"])
+            return [
+                metadata_dict_to_node(metadata, text=document)
+                for metadata, document in zip(results["metadatas"], results["documents"])
+            ]
+        except Exception as e:
+            logger.exception(f"Failed to fetch {len(node_ids)} nodes.")
+            raise RuntimeError("Failed to fetch nodes.") from e
+
+    def get_embeddings(self, node_ids: list, session_id: str = None) -> dict:
+        # The retriever returns text and scores only, the context packer also needs the vectors
+        if not node_ids:
+            return {}
+        try:
+            results = self.collection.get(ids=list(node_ids), where=self._session_where(session_id), include=["embeddings"])
+            return {node_id: embedding for node_id, embedding in zip(results["ids"], results["embeddings"])}
+        except Exception as e:
+            logger.exception(f"Failed to fetch embeddings for {len(node_ids)} nodes.")
+            return {}
+
+    @staticmethod
+    def _session_where(session_id: str = None):
+        return {"session_id": session_id} if session_id else None
+
+    def has_session_documents(self, session_id: str) -> bool:
+        try:
+            results = self.collection.get(where={"session_id": session_id}, limit=1, include=[])
+            return len(results.get("ids", [])) > 0
+        except Exception as e:
+            logger.exception(f"Failed to check documents for session {session_id}.")
+            return False
+
+    def delete_session_vectors(self, session_id: str, batch_size: int = None) -> tuple:
+        # Returns (vectors deleted, bytes reclaimed); Chroma keeps its file size, so only the numpy backend reports bytes
+        batch_size = min(batch_size or AppSettings.SESSION_GC_BATCH_SIZE, self.max_batch_size)
+        try:
+            if isinstance(self.collection, NumpyCollection):
+                deleted, reclaimed = self.collection.drop_session(session_id)
+            else:
+                # Fixed-size batches keep each delete transaction short while queries keep running
+                deleted, reclaimed = 0, 0
+                while True:
+                    ids = self.collection.get(where={"session_id": session_id}, limit=batch_size, include=[])["ids"]
+                    if not ids:
+                        break
+                    self.collection.delete(ids=ids)
+                    deleted += len(ids)
+            self.lexical_index.delete_session(session_id)
+            logger.info(f"Deleted {deleted} vectors of session {session_id}.")
+            return deleted, reclaimed
+        except Exception as e:
+            logger.exception(f"Failed to delete vectors of session {session_id}.")
+            raise RuntimeError("Failed to delete session vectors.") from e
 
     # def get_all_doc_ids(self) -> set:
     #     try:
@@ -62,13 +268,65 @@ class IndexManager:
     #         logger.exception(f"Failed to fetch existing document IDs.")
     #         return set()
 
-    def get_all_file_hashes(self) -> set:
+    def attach_file_to_session(self, file_hash: str, session_id: str, filename: str = None) -> int:
+        # Copy the stored vectors of an already ingested file into another session, no parsing or embedding
         try:
-            results = self.collection.get(include=["metadatas"])
-            file_hashes = {
-                meta.get("file_hash") for meta in results.get("metadatas", []) if "file_hash" in meta
-            }
-            return file_hashes
+            # The file may already be attached to several sessions: one row names a session holding it,
+            # only that session's copy is read, embeddings included
+            probe = self.collection.get(where={"file_hash": file_hash}, limit=1, include=["metadatas"])
+            if not probe["ids"]:
+                return 0
+            source_session = probe["metadatas"][0].get("session_id", "")
+            results = self.collection.get(
+                where={"$and": [{"file_hash": file_hash}, {"session_id": source_session}]},
+                include=["embeddings", "metadatas", "documents"],
+            )
+
+            ids, embeddings, metadatas, documents = [], [], [], []
+            for source_id, embedding, metadata, document in zip(results["ids"], results["embeddings"], results["metadatas"], results["documents"]):
+                node_id = stable_node_id(source_id, session_id)
+                # Cite the file under the name it was uploaded with in this session
+                overrides = {"session_id": session_id, "filename": filename or metadata.get("filename")}
+                metadata = dict(metadata, **overrides)
+                if "_node_content" in metadata:
+                    node_content = json.loads(metadata["_node_content"])
+                    node_content["id_"] = node_id
+                    node_content.setdefault("metadata", {}).update(overrides)
+                    metadata["_node_content"] = json.dumps(node_content)
+                ids.append(node_id)
+                embeddings.append(embedding)
+                metadatas.append(metadata)
+                documents.append(document)
+
+            batch_size = self.max_batch_size
+            for i in range(0, len(ids), batch_size):
+                self.collection.upsert(
+                    ids=ids[i:i + batch_size],
+                    embeddings=embeddings[i:i + batch_size],
+                    metadatas=metadatas[i:i + batch_size],
+                    documents=documents[i:i + batch_size],
+                )
+            self.lexical_index.upsert([
+                (node_id, session_id, file_hash, document) for node_id, document in zip(ids, documents)
+            ])
+            logger.info(f"Attached {len(ids)} existing vectors of file {file_hash} to session {session_id}.")
+            return len(ids)
         except Exception as e:
-            logger.exception("Failed to fetch file-level hashes.")
-            return set()
+            logger.exception(f"Failed to attach file {file_hash} to session {session_id}.")
+            raise RuntimeError("Failed to attach file to session.") from e
+
+    def _backfill_lexical_index(self):
+        # Vector stores written before the lexical index existed are indexed once, in batches
+        batch_size = self.max_batch_size
+        total, offset = self.collection.count(), 0
+        logger.info(f"Backfilling lexical index from {total} stored vectors.")
+        while offset < total:
+            results = self.collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+            if not results["ids"]:
+                break
+            self.lexical_index.add([
+                (node_id, metadata.get("session_id"), metadata.get("file_hash"), document or "")
+                for node_id, metadata, document in zip(results["ids"], results["metadatas"], results["documents"])
+            ])
+            offset += len(results["ids"])
+        logger.info(f"Lexical index backfilled with {offset} chunks.")
@@ -0,0 +1,153 @@
+# rag_system/vectorstore/lexical_index.py
+import logging
+import re
+import sqlite3
+import threading
+from typing import List, Tuple
+from src.config.app_settings import AppSettings
+from src.config.logging_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Words, numbers and identifiers such as AB-1234, 4.2.1 or part_no
+_TERM = re.compile(r"\w+(?:[-_./:]\w+)*")
+
+def query_terms(query: str) -> List[str]:
+    return _TERM.findall(query)
+
+def to_match_expression(query: str) -> str:
+    # Every term is quoted, so user input never hits FTS5 syntax; identifiers become phrases ("ab 1234")
+    return " OR ".join(f'"{term}"' for term in query_terms(query))
+
+class LexicalIndex:
+    """SQLite FTS5 (BM25) index of chunk text, written next to the Chroma vectors."""
+
+    def __init__(self, path: str = None):
+        self.path = path or AppSettings.LEXICAL_DB
+        self._lock = threading.Lock()
+        try:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunk_meta ("
+                " id INTEGER PRIMARY KEY,"
+                " node_id TEXT NOT NULL UNIQUE,"
+                " session_id TEXT NOT NULL,"
+                " file_hash TEXT NOT NULL"
+                ")"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunk_meta_file ON chunk_meta (file_hash, session_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunk_meta_session ON chunk_meta (session_id)")
+            # The FTS rowid is chunk_meta.id
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(text, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+            self._conn.commit()
+        except Exception as e:
+            logger.exception(f"Failed to open lexical index at {self.path}")
+            raise RuntimeError(f"Failed to open lexical index: {str(e)}") from e
+
+    def add(self, rows: List[Tuple[str, str, str, str]]):
+        # rows of (node_id, session_id, file_hash, text); ids already indexed are kept, like Chroma's add
+        if not rows:
+            return
+        with self._lock:
+            for node_id, session_id, file_hash, text in rows:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO chunk_meta (node_id, session_id, file_hash) VALUES (?, ?, ?)",
+                    (node_id, session_id or "", file_hash or ""),
+                )
+                if cursor.rowcount:
+                    self._conn.execute("INSERT INTO chunks (rowid, text) VALUES (?, ?)", (cursor.lastrowid, text))
+            self._conn.commit()
+
+    def upsert(self, rows: List[Tuple[str, str, str, str]]):
+        # Same rows as add(), an id already indexed gets the new text and tags
+        if not rows:
+            return
+        with self._lock:
+            for node_id, session_id, file_hash, text in rows:
+                found = self._conn.execute("SELECT id FROM chunk_meta WHERE node_id = ?", (node_id,)).fetchone()
+                if found is None:
+                    cursor = self._conn.execute(
+                        "INSERT INTO chunk_meta (node_id, session_id, file_hash) VALUES (?, ?, ?)",
+                        (node_id, session_id or "", file_hash or ""),
+                    )
+                    self._conn.execute("INSERT INTO chunks (rowid, text) VALUES (?, ?)", (cursor.lastrowid, text))
+                    continue
+                self._conn.execute("UPDATE chunk_meta SET session_id = ?, file_hash = ? WHERE id = ?",
+                                   (session_id or "", file_hash or "", found[0]))
+                self._conn.execute("UPDATE chunks SET text = ? WHERE rowid = ?", (text, found[0]))
+            self._conn.commit()
+
+    def upsert_nodes(self, nodes: list):
+        self.upsert(self._node_rows(nodes))
+
+    @staticmethod
+    def _node_rows(nodes: list) -> list:
+        return [
+            (node.node_id, node.metadata.get("session_id"), node.metadata.get("file_hash"), node.get_content())
+            for node in nodes
+        ]
+
+    def delete(self, file_hash: str, session_id: str = None):
+        where, params = "file_hash = ?", [file_hash]
+        if session_id is not None:
+            where, params = "file_hash = ? AND session_id = ?", [file_hash, session_id]
+        with self._lock:
+            self._conn.execute(f"DELETE FROM chunks WHERE rowid IN (SELECT id FROM chunk_meta WHERE {where})", params)
+            self._conn.execute(f"DELETE FROM chunk_meta WHERE {where}", params)
+            self._conn.commit()
+
+    def delete_session(self, session_id: str) -> int:
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE rowid IN (SELECT id FROM chunk_meta WHERE session_id = ?)", (session_id,))
+            deleted = self._conn.execute("DELETE FROM chunk_meta WHERE session_id = ?", (session_id,)).rowcount
+            self._conn.commit()
+        return deleted
+
+    def delete_ids(self, node_ids: List[str], batch_size: int = 500) -> int:
+        deleted = 0
+        with self._lock:
+            for i in range(0, len(node_ids), batch_size):
+                batch = list(node_ids[i:i + batch_size])
+                marks = ",".join("?" * len(batch))
+                self._conn.execute(f"DELETE FROM chunks WHERE rowid IN (SELECT id FROM chunk_meta WHERE node_id IN ({marks}))", batch)
+                deleted += self._conn.execute(f"DELETE FROM chunk_meta WHERE node_id IN ({marks})", batch).rowcount
+            self._conn.commit()
+        return deleted
+
+    def compact(self):
+        # Merges the FTS segments and returns the pages of deleted rows to the file system
+        with self._lock:
+            self._conn.execute("INSERT INTO chunks (chunks) VALUES ('optimize')")
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def search(self, query: str, session_id: str = None, limit: int = 10) -> List[Tuple[str, float]]:
+        expression = to_match_expression(query)
+        if not expression:
+            return []
+        sql = ("SELECT m.node_id, bm25(chunks) AS rank FROM chunks JOIN chunk_meta m ON m.id = chunks.rowid "
+               "WHERE chunks MATCH ?")
+        params = [expression]
+        if session_id:
+            sql += " AND m.session_id = ?"
+            params.append(session_id)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        # bm25() is lower for better matches, flip it so higher is better like vector scores
+        return [(node_id, -rank) for node_id, rank in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunk_meta").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,524 @@
+# rag_system/vectorstore/numpy_store.py
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from llama_index.core.schema import BaseNode, MetadataMode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore, FilterCondition, FilterOperator, MetadataFilters, VectorStoreQuery, VectorStoreQueryResult
+)
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
+from pydantic import PrivateAttr
+from src.config.app_settings import AppSettings
+from src.config.logging_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+GLOBAL_SCOPE = "__global__"
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+# Rows scored per matmul, bounds the float32 copy made for float16/int8 matrices
+_SCORE_BLOCK = 16384
+
+def _scope_key(session_id: Optional[str]) -> str:
+    return session_id or GLOBAL_SCOPE
+
+def _compare(op: str, actual: Any, expected: Any) -> bool:
+    if op in ("$eq", FilterOperator.EQ):
+        return actual == expected
+    if op in ("$ne", FilterOperator.NE):
+        return actual != expected
+    if op in ("$in", FilterOperator.IN):
+        return actual in expected
+    if op in ("$nin", FilterOperator.NIN):
+        return actual not in expected
+    if actual is None:
+        return False
+    if op in ("$gt", FilterOperator.GT):
+        return actual > expected
+    if op in ("$gte", FilterOperator.GTE):
+        return actual >= expected
+    if op in ("$lt", FilterOperator.LT):
+        return actual < expected
+    if op in ("$lte", FilterOperator.LTE):
+        return actual <= expected
+    raise ValueError(f"Unsupported filter operator: {op}")
+
+def where_predicate(where: Optional[dict]) -> Optional[Callable[[dict], bool]]:
+    # Chroma-style where clauses: {"key": value}, {"key": {"$op": value}}, {"$and": [...]}, {"$or": [...]}
+    if not where:
+        return None
+    predicates = []
+    for key, value in where.items():
+        if key in ("$and", "$or"):
+            parts = [where_predicate(clause) for clause in value]
+            combine = all if key == "$and" else any
+            predicates.append(lambda meta, parts=parts, combine=combine: combine(p(meta) for p in parts))
+        elif isinstance(value, dict):
+            (op, expected), = value.items()
+            predicates.append(lambda meta, key=key, op=op, expected=expected: _compare(op, meta.get(key), expected))
+        else:
+            predicates.append(lambda meta, key=key, value=value: meta.get(key) == value)
+    return lambda meta: all(p(meta) for p in predicates)
+
+def filters_predicate(filters: Optional[MetadataFilters]) -> Optional[Callable[[dict], bool]]:
+    if not filters or not filters.filters:
+        return None
+    parts = []
+    for item in filters.filters:
+        if isinstance(item, MetadataFilters):
+            parts.append(filters_predicate(item) or (lambda meta: True))
+        else:
+            parts.append(lambda meta, f=item: _compare(f.operator, meta.get(f.key), f.value))
+    combine = any if filters.condition == FilterCondition.OR else all
+    return lambda meta: combine(p(meta) for p in parts)
+
+def _pinned_session(where: Optional[dict] = None, filters: Optional[MetadataFilters] = None) -> Optional[str]:
+    # A session_id equality that every match must satisfy limits the search to that scope,
+    # "" pins the global scope of bulk-ingested rows
+    if where:
+        if isinstance(where.get("session_id"), str):
+            return where["session_id"]
+        for clause in where.get("$and", []):
+            session = _pinned_session(where=clause)
+            if session is not None:
+                return session
+    if filters and filters.condition != FilterCondition.OR:
+        for item in filters.filters:
+            if not isinstance(item, MetadataFilters) and item.key == "session_id" and item.operator == FilterOperator.EQ:
+                return item.value
+    return None
+
+class _Scope:
+    """Vectors of one session: an append-only memory-mapped matrix plus a JSONL sidecar of ids and metadata."""
+
+    def __init__(self, directory: Path, dim: int, dtype: str):
+        self.directory = directory
+        self.dim = dim
+        self.dtype = DTYPES[dtype]
+        self.row_bytes = dim * np.dtype(self.dtype).itemsize
+        self.vectors_path = directory / "vectors.bin"
+        self.rows_path = directory / "rows.jsonl"
+        self.ids: List[str] = []
+        self.metadatas: List[dict] = []
+        self.documents: List[str] = []
+        self.row_of: Dict[str, int] = {}
+        self.alive = np.zeros(0, dtype=bool)
+        self.scales = np.zeros(0, dtype=np.float32)
+        self._matrix = None
+        directory.mkdir(parents=True, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        scales, alive = [], []
+        if self.rows_path.exists():
+            with open(self.rows_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning(f"Ignoring malformed row in {self.rows_path}")
+                        continue
+                    if "deleted" in row:
+                        # Replayed in order, an id deleted and added again stays alive
+                        for node_id in row["deleted"]:
+                            index = self.row_of.pop(node_id, None)
+                            if index is not None:
+                                alive[index] = False
+                        continue
+                    self.row_of[row["id"]] = len(self.ids)
+                    alive.append(True)
+                    self.ids.append(row["id"])
+                    self.metadatas.append(row["metadata"])
+                    self.documents.append(row["document"])
+                    scales.append(row.get("scale", 1.0))
+
+        # Vectors are written before their sidecar rows, drop any written by an interrupted append
+        expected = len(self.ids) * self.row_bytes
+        if self.vectors_path.exists() and self.vectors_path.stat().st_size > expected:
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(expected)
+
+        self.alive = np.asarray(alive, dtype=bool)
+        self.scales = np.asarray(scales, dtype=np.float32)
+
+    def matrix(self) -> np.ndarray:
+        rows = len(self.ids)
+        if self._matrix is None or self._matrix.shape[0] != rows:
+            if rows == 0:
+                return np.zeros((0, self.dim), dtype=self.dtype)
+            self._matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode="r", shape=(rows, self.dim))
+        return self._matrix
+
+    def append(self, ids: List[str], vectors: np.ndarray, metadatas: List[dict], documents: List[str]) -> int:
+        # Ids already stored are ignored, the same behaviour as Chroma's add
+        keep, seen = [], set()
+        for i, node_id in enumerate(ids):
+            if node_id not in self.row_of and node_id not in seen:
+                seen.add(node_id)
+                keep.append(i)
+        if not keep:
+            return 0
+        vectors = vectors[keep]
+        if self.dtype == np.int8:
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            stored = np.round(vectors / scales[:, None]).astype(np.int8)
+        else:
+            scales = np.ones(len(keep), dtype=np.float32)
+            stored = vectors.astype(self.dtype)
+
+        with open(self.vectors_path, "ab") as f:
+            f.write(np.ascontiguousarray(stored).tobytes())
+        with open(self.rows_path, "a", encoding="utf-8") as f:
+            for i, scale in zip(keep, scales):
+                row = {"id": ids[i], "metadata": metadatas[i], "document": documents[i]}
+                if self.dtype == np.int8:
+                    row["scale"] = float(scale)
+                f.write(json.dumps(row) + "\n")
+
+        for i in keep:
+            self.row_of[ids[i]] = len(self.ids)
+            self.ids.append(ids[i])
+            self.metadatas.append(metadatas[i])
+            self.documents.append(documents[i])
+        self.alive = np.concatenate([self.alive, np.ones(len(keep), dtype=bool)])
+        self.scales = np.concatenate([self.scales, scales.astype(np.float32)])
+        return len(keep)
+
+    def replace(self, ids: List[str], vectors: np.ndarray, metadatas: List[dict], documents: List[str]) -> int:
+        # Upsert: a stored id with new content is tombstoned and appended again, unchanged rows stay as they are
+        stale, keep = set(), []
+        for i, node_id in enumerate(ids):
+            row = self.row_of.get(node_id)
+            if row is None:
+                keep.append(i)
+            elif self.metadatas[row] != metadatas[i] or self.documents[row] != documents[i]:
+                stale.add(row)
+                keep.append(i)
+        self.delete_rows(sorted(stale))
+        return self.append([ids[i] for i in keep], vectors[keep], [metadatas[i] for i in keep], [documents[i] for i in keep])
+
+    def compact(self) -> int:
+        # Rewrites both files with the live rows only; returns the number of rows dropped
+        live = np.flatnonzero(self.alive).tolist()
+        dropped = len(self.ids) - len(live)
+        if not dropped:
+            return 0
+        stored = np.asarray(self.matrix()[live]) if live else np.zeros((0, self.dim), dtype=self.dtype)
+        vectors_tmp, rows_tmp = self.vectors_path.with_suffix(".tmp"), self.rows_path.with_suffix(".tmp")
+        with open(vectors_tmp, "wb") as f:
+            f.write(np.ascontiguousarray(stored).tobytes())
+        with open(rows_tmp, "w", encoding="utf-8") as f:
+            for row in live:
+                line = {"id": self.ids[row], "metadata": self.metadatas[row], "document": self.documents[row]}
+                if self.dtype == np.int8:
+                    line["scale"] = float(self.scales[row])
+                f.write(json.dumps(line) + "\n")
+        # The memory map must be closed before its file is replaced
+        self._matrix = None
+        os.replace(vectors_tmp, self.vectors_path)
+        os.replace(rows_tmp, self.rows_path)
+
+        self.ids = [self.ids[row] for row in live]
+        self.metadatas = [self.metadatas[row] for row in live]
+        self.documents = [self.documents[row] for row in live]
+        self.row_of = {node_id: row for row, node_id in enumerate(self.ids)}
+        self.alive = np.ones(len(live), dtype=bool)
+        self.scales = self.scales[live]
+        return dropped
+
+    def delete_rows(self, rows: List[int]):
+        if not rows:
+            return
+        ids = [self.ids[row] for row in rows]
+        with open(self.rows_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"deleted": ids}) + "\n")
+        for row, node_id in zip(rows, ids):
+            self.alive[row] = False
+            self.row_of.pop(node_id, None)
+
+    def live_rows(self, predicate: Optional[Callable[[dict], bool]] = None) -> List[int]:
+        rows = np.flatnonzero(self.alive).tolist()
+        if predicate is None:
+            return rows
+        return [row for row in rows if predicate(self.metadatas[row])]
+
+    def vectors(self, rows: List[int]) -> np.ndarray:
+        matrix = self.matrix()
+        vectors = np.asarray(matrix[rows], dtype=np.float32)
+        if self.dtype == np.int8:
+            vectors *= self.scales[rows][:, None]
+        return vectors
+
+    def search(self, query: np.ndarray, k: int, predicate: Optional[Callable[[dict], bool]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        rows = len(self.ids)
+        if rows == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        # Rows appended while this search runs are not part of the snapshot
+        matrix, alive, scales = self.matrix()[:rows], self.alive[:rows].copy(), self.scales[:rows]
+        if predicate is not None:
+            alive &= np.fromiter((predicate(meta) for meta in self.metadatas[:rows]), dtype=bool, count=rows)
+
+        scores = np.empty(rows, dtype=np.float32)
+        for start in range(0, rows, _SCORE_BLOCK):
+            block = matrix[start:start + _SCORE_BLOCK]
+            scores[start:start + len(block)] = np.asarray(block, dtype=np.float32) @ query
+        if self.dtype == np.int8:
+            scores *= scales
+        scores[~alive] = -np.inf
+
+        k = min(k, int(alive.sum()))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top]
+
+class NumpyVectorStore(BasePydanticVectorStore):
+    """Exact in-process vector search over per-session memory-mapped matrices (float32, float16 or int8)."""
+
+    stores_text: bool = True
+    flat_metadata: bool = True
+    path: str
+    dtype: str
+
+    _scopes: Dict[str, _Scope] = PrivateAttr(default_factory=dict)
+    _dim: Optional[int] = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default_factory=threading.RLock)
+
+    def __init__(self, path: str = None, dtype: str = None):
+        path = path or AppSettings.NUMPY_VECTOR_DIR
+        dtype = dtype or AppSettings.VECTOR_DTYPE
+        config_path = Path(path) / "store.json"
+        if config_path.exists():
+            config = json.loads(config_path.read_text())
+            if config["dtype"] != dtype:
+                logger.warning(f"Vector store at {path} uses {config['dtype']}, ignoring VECTOR_DTYPE={dtype}")
+            dtype = config["dtype"]
+        elif dtype not in DTYPES:
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        super().__init__(path=path, dtype=dtype)
+        Path(path).mkdir(parents=True, exist_ok=True)
+        if config_path.exists():
+            self._dim = json.loads(config_path.read_text())["dim"]
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    # LlamaIndex vector store interface
+
+    def add(self, nodes: Sequence[BaseNode], **kwargs: Any) -> List[str]:
+        ids, embeddings, metadatas, documents = [], [], [], []
+        for node in nodes:
+            ids.append(node.node_id)
+            embeddings.append(node.get_embedding())
+            metadatas.append(node_to_metadata_dict(node, remove_text=True, flat_metadata=self.flat_metadata))
+            documents.append(node.get_content(metadata_mode=MetadataMode.NONE))
+        self.add_rows(ids, embeddings, metadatas, documents)
+        return ids
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        self.delete_where({"ref_doc_id": ref_doc_id})
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.query_embedding is None:
+            raise ValueError("NumpyVectorStore requires a query embedding")
+        vector = self._normalize(np.asarray(query.query_embedding, dtype=np.float32)[None, :])[0]
+        session = _pinned_session(filters=query.filters)
+        # Searching the pinned scope already applies a session-only filter
+        only_session = session is not None and len(query.filters.filters) == 1
+        predicate = None if only_session else filters_predicate(query.filters)
+
+        # Candidates from every matching scope, then one global top-k
+        candidates = []
+        for scope in self._scopes_for(session):
+            rows, scores = scope.search(vector, query.similarity_top_k, predicate)
+            candidates.extend((float(score), scope, int(row)) for row, score in zip(rows, scores))
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        candidates = candidates[:query.similarity_top_k]
+
+        nodes, similarities, ids = [], [], []
+        for score, scope, row in candidates:
+            nodes.append(metadata_dict_to_node(scope.metadatas[row], text=scope.documents[row]))
+            similarities.append(score)
+            ids.append(scope.ids[row])
+        return VectorStoreQueryResult(nodes=nodes, similarities=similarities, ids=ids)
+
+    # Chroma collection style access used by IndexManager
+
+    def add_rows(self, ids: List[str], embeddings: list, metadatas: List[dict], documents: List[str],
+                 replace: bool = False) -> int:
+        # replace=True upserts, otherwise ids already stored are ignored like Chroma's add
+        if not ids:
+            return 0
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            self._ensure_dim(vectors.shape[1])
+            groups: Dict[str, List[int]] = {}
+            for i, metadata in enumerate(metadatas):
+                groups.setdefault(_scope_key(metadata.get("session_id")), []).append(i)
+            added = 0
+            for key, rows in groups.items():
+                scope = self._scope(key, create=True)
+                write = scope.replace if replace else scope.append
+                added += write([ids[i] for i in rows], vectors[rows], [metadatas[i] for i in rows], [documents[i] for i in rows])
+            return added
+
+    def get_rows(self, ids: List[str] = None, where: dict = None, include: Sequence[str] = ("metadatas", "documents"),
+                 limit: int = None, offset: int = None) -> dict:
+        predicate = where_predicate(where)
+        with self._lock:
+            matches = []
+            scopes = self._scopes_for(_pinned_session(where=where))
+            if ids is not None:
+                for node_id in ids:
+                    for scope in scopes:
+                        row = scope.row_of.get(node_id)
+                        if row is not None and (predicate is None or predicate(scope.metadatas[row])):
+                            matches.append((scope, row))
+                            break
+            else:
+                for scope in scopes:
+                    matches.extend((scope, row) for row in scope.live_rows(predicate))
+            matches = matches[offset or 0:]
+            if limit is not None:
+                matches = matches[:limit]
+
+            result = {"ids": [scope.ids[row] for scope, row in matches]}
+            if "metadatas" in include:
+                result["metadatas"] = [scope.metadatas[row] for scope, row in matches]
+            if "documents" in include:
+                result["documents"] = [scope.documents[row] for scope, row in matches]
+            if "embeddings" in include:
+                result["embeddings"] = [scope.vectors([row])[0] for scope, row in matches]
+            return result
+
+    def delete_where(self, where: dict) -> int:
+        predicate = where_predicate(where)
+        deleted = 0
+        with self._lock:
+            for scope in self._scopes_for(_pinned_session(where=where)):
+                rows = scope.live_rows(predicate)
+                scope.delete_rows(rows)
+                deleted += len(rows)
+        return deleted
+
+    def delete_ids(self, ids: List[str]) -> int:
+        wanted = set(ids)
+        deleted = 0
+        with self._lock:
+            for scope in self._scopes_for(None):
+                rows = sorted(scope.row_of[node_id] for node_id in wanted.intersection(scope.row_of))
+                scope.delete_rows(rows)
+                deleted += len(rows)
+        return deleted
+
+    def compact(self) -> int:
+        # Deleted rows stay on disk as tombstones until this rewrites the files. Offline only: another process keeps the old files
+        dropped = 0
+        with self._lock:
+            for scope in self._scopes_for(None):
+                dropped += scope.compact()
+        return dropped
+
+    def drop_session(self, session_id: str) -> Tuple[int, int]:
+        # Removes the whole scope directory, unlike delete_where the disk space comes back at once
+        with self._lock:
+            name = re.sub(r"[^\w.-]", "_", _scope_key(session_id))
+            directory = Path(self.path) / name
+            if not directory.is_dir():
+                return 0, 0
+            scope = self._scope(name)
+            vectors = int(scope.alive.sum()) if scope else 0
+            reclaimed = sum(entry.stat().st_size for entry in directory.iterdir() if entry.is_file())
+            self._scopes.pop(name, None)
+            shutil.rmtree(directory)
+        return vectors, reclaimed
+
+    def count(self) -> int:
+        with self._lock:
+            return sum(int(scope.alive.sum()) for scope in self._scopes_for(None))
+
+    def _scopes_for(self, session_id: Optional[str]) -> List[_Scope]:
+        if session_id is not None:
+            scope = self._scope(_scope_key(session_id))
+            return [scope] if scope else []
+        # Unpinned queries search every scope, load those not opened yet
+        with self._lock:
+            for entry in os.scandir(self.path):
+                if entry.is_dir():
+                    self._scope(entry.name)
+            return list(self._scopes.values())
+
+    def _scope(self, key: str, create: bool = False) -> Optional[_Scope]:
+        name = re.sub(r"[^\w.-]", "_", key)
+        scope = self._scopes.get(name)
+        if scope is None and self._dim is not None and (create or (Path(self.path) / name).is_dir()):
+            with self._lock:
+                scope = self._scopes.get(name)
+                if scope is None:
+                    scope = _Scope(Path(self.path) / name, self._dim, self.dtype)
+                    self._scopes[name] = scope
+        return scope
+
+    def _ensure_dim(self, dim: int):
+        if self._dim is None:
+            self._dim = dim
+            (Path(self.path) / "store.json").write_text(json.dumps({"dim": dim, "dtype": self.dtype}))
+        elif self._dim != dim:
+            raise ValueError(f"Embedding dimension {dim} does not match the vector store ({self._dim})")
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+_stores: Dict[str, NumpyVectorStore] = {}
+_stores_lock = threading.Lock()
+
+def get_numpy_store(path: str = None) -> NumpyVectorStore:
+    # One instance per directory, every IndexManager in the process must see the same rows
+    path = os.path.abspath(path or AppSettings.NUMPY_VECTOR_DIR)
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = NumpyVectorStore(path=path)
+        return _stores[path]
+
+class NumpyCollection:
+    """Adapter exposing the Chroma collection methods IndexManager calls."""
+
+    def __init__(self, store: NumpyVectorStore):
+        self.store = store
+
+    def get(self, ids: List[str] = None, where: dict = None, include: Sequence[str] = ("metadatas", "documents"),
+            limit: int = None, offset: int = None) -> dict:
+        return self.store.get_rows(ids=ids, where=where, include=include, limit=limit, offset=offset)
+
+    def add(self, ids: List[str], embeddings: list, metadatas: List[dict], documents: List[str]):
+        self.store.add_rows(ids, embeddings, metadatas, documents)
+
+    def upsert(self, ids: List[str], embeddings: list, metadatas: List[dict], documents: List[str]):
+        self.store.add_rows(ids, embeddings, metadatas, documents, replace=True)
+
+    def delete(self, ids: List[str] = None, where: dict = None):
+        if ids is not None:
+            self.store.delete_ids(ids)
+        else:
+            self.store.delete_where(where)
+
+    def compact(self) -> int:
+        return self.store.compact()
+
+    def drop_session(self, session_id: str) -> Tuple[int, int]:
+        return self.store.drop_session(session_id)
+
+    def count(self) -> int:
+        return self.store.count()
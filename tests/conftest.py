@@ -0,0 +1,88 @@
+# rag_system/tests/conftest.py
+import os
+import shutil
+import tempfile
+import uuid
+from pathlib import Path
+import pytest
+
+# Settings are read when src.config.app_settings is imported: every file the app writes goes to a
+# scratch folder and every call to Ollama to the fake server, before any test imports src
+_DATA_DIR = Path(tempfile.mkdtemp(prefix="rag_tests_"))
+
+from benchmarks.fake_ollama import FakeOllama
+
+_fake_ollama = FakeOllama(latency=0.0, item_latency=0.0, parallel=8).start()
+
+os.environ.update(
+    OLLAMA_BASE_URL=_fake_ollama.url,
+    CHROMA_DB=str(_DATA_DIR / "chroma_db"),
+    NUMPY_VECTOR_DIR=str(_DATA_DIR / "numpy_vectors"),
+    VECTOR_BACKEND="numpy",
+    SESSION_DB=f"sqlite:///{_DATA_DIR / 'chat.db'}",
+    FILE_REGISTRY_DB=f"sqlite:///{_DATA_DIR / 'file_registry.db'}",
+    SOURCE_DATA=str(_DATA_DIR / "source-data"),
+    LOG_DIR=str(_DATA_DIR / "logs"),
+    LOG_CLEANUP_FILE=str(_DATA_DIR / "cleanup_log.csv"),
+    EMBED_CACHE_DB=str(_DATA_DIR / "embed_cache.db"),
+    LEXICAL_DB=str(_DATA_DIR / "lexical_index.db"),
+    PARSE_WORKERS="1",
+    INGEST_BATCH_SIZE="4",
+    SESSION_GC_INTERVAL="0",
+    WARMUP_ON_STARTUP="false",
+)
+
+_FAKE_DEFAULTS = {key: getattr(_fake_ollama, key) for key in
+                  ("latency", "item_latency", "prompt_latency", "token_rate", "answer_tokens", "legacy")}
+
+def pytest_unconfigure(config):
+    _fake_ollama.stop()
+    shutil.rmtree(_DATA_DIR, ignore_errors=True)
+
+@pytest.fixture
+def fake_ollama():
+    # Tests may slow the server down or count its calls; both are reset afterwards
+    _fake_ollama.reset_calls()
+    yield _fake_ollama
+    for key, value in _FAKE_DEFAULTS.items():
+        setattr(_fake_ollama, key, value)
+    _fake_ollama.reset_calls()
+
+@pytest.fixture
+def data_dir() -> Path:
+    return _DATA_DIR
+
+@pytest.fixture(scope="session")
+def client():
+    # One app for the whole run, the container and its workers are process-wide
+    from fastapi.testclient import TestClient
+    from src.api.app import app
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def session_id() -> str:
+    return str(uuid.uuid4())
+
+@pytest.fixture
+def make_pdf(tmp_path):
+    # make_pdf(name, pages, seed) writes a synthetic PDF whose pages each name a part number
+    from benchmarks.end_to_end import make_pdf as write_pdf
+
+    def make(name: str = "doc.pdf", pages: int = 3, seed: int = 1) -> Path:
+        path = tmp_path / name
+        write_pdf(str(path), pages, seed)
+        return path
+    return make
+
+@pytest.fixture
+def chroma_manager(tmp_path, monkeypatch):
+    # An IndexManager on the Chroma backend, in stores of its own
+    from src.config.app_settings import AppSettings
+    from src.vectorstore.index_manager import IndexManager
+    monkeypatch.setattr(AppSettings, "VECTOR_BACKEND", "chroma")
+    monkeypatch.setattr(AppSettings, "CHROMA_DB", str(tmp_path / "chroma_db"))
+    monkeypatch.setattr(AppSettings, "LEXICAL_DB", str(tmp_path / "lexical.db"))
+    manager = IndexManager()
+    yield manager
+    manager.client.close()
@@ -0,0 +1,41 @@
+# rag_system/tests/helpers.py
+import time
+from pathlib import Path
+
+def wait_for(condition, timeout: float = 30.0, interval: float = 0.02):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = condition()
+        if value:
+            return value
+        time.sleep(interval)
+    raise AssertionError(f"Condition not met within {timeout}s")
+
+def ingest(client, path: Path, session_id: str, filename: str = None) -> dict:
+    # Uploads one PDF through /ingest and waits for its job to finish
+    with open(path, "rb") as f:
+        response = client.post("/ingest", files={"file": (filename or path.name, f, "application/pdf")},
+                               data={"session_id": session_id})
+    assert response.status_code == 202, response.text
+    job_id = response.json()["job_id"]
+    return wait_for(lambda: _finished(client.get(f"/ingest/{job_id}").json()))
+
+def ask(client, session_id: str, query: str, bypass_cache: bool = True) -> dict:
+    response = client.post("/ask", data={"query": query, "session_id": session_id,
+                                         "bypass_cache": str(bypass_cache).lower()})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def _finished(job: dict):
+    return job if job["status"] in ("done", "duplicate", "failed") else None
+
+def ingest_batch(client, files: list, session_id: str) -> dict:
+    # Uploads (name, bytes) pairs through /ingest/batch and waits for every file of the batch
+    response = client.post("/ingest/batch", files=[("files", (name, content, "application/octet-stream"))
+                                                   for name, content in files], data={"session_id": session_id})
+    assert response.status_code == 202, response.text
+    batch_id = response.json()["batch_id"]
+    return wait_for(lambda: _batch_finished(client.get(f"/ingest/batch/{batch_id}").json()))
+
+def _batch_finished(batch: dict):
+    return batch if batch["status"] == "done" else None
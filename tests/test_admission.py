@@ -0,0 +1,86 @@
+# rag_system/tests/test_admission.py
+import asyncio
+import threading
+import pytest
+from helpers import ingest, wait_for
+from src.clients.admission import BULK, INTERACTIVE, AdmissionScheduler, Overloaded, admission, work_class
+
+def queue_call(scheduler: AdmissionScheduler, order: list, name: str, priority: str, session_id: str) -> threading.Thread:
+    # Waits for a slot as the given class and session, then records its turn and hands the slot on
+    def call():
+        with work_class(priority, session_id), scheduler.slot():
+            order.append(name)
+    depth = scheduler.depth()
+    thread = threading.Thread(target=call)
+    thread.start()
+    wait_for(lambda: scheduler.depth() == depth + 1)
+    return thread
+
+def test_interactive_calls_go_first_then_sessions_take_turns():
+    scheduler = AdmissionScheduler(concurrency=1, queue_size=10, max_wait=0)
+    order = []
+    held = scheduler.acquire()
+    threads = [
+        queue_call(scheduler, order, "bulk", BULK, "ingest"),
+        queue_call(scheduler, order, "a1", INTERACTIVE, "a"),
+        queue_call(scheduler, order, "a2", INTERACTIVE, "a"),
+        queue_call(scheduler, order, "a3", INTERACTIVE, "a"),
+        queue_call(scheduler, order, "b1", INTERACTIVE, "b"),
+    ]
+    held.release()
+    for thread in threads:
+        thread.join(5)
+
+    assert order == ["a1", "b1", "a2", "a3", "bulk"]
+    assert scheduler.active() == 0 and scheduler.depth() == 0
+
+def test_interactive_calls_are_refused_when_the_queue_is_full():
+    scheduler = AdmissionScheduler(concurrency=1, queue_size=0, max_wait=0)
+    held = scheduler.acquire()
+    with pytest.raises(Overloaded) as refused:
+        scheduler.acquire()
+    assert refused.value.retry_after >= 1
+
+    # Bulk work is never refused, it waits for the slot
+    order = []
+    thread = queue_call(scheduler, order, "bulk", BULK, "ingest")
+    held.release()
+    thread.join(5)
+    assert order == ["bulk"]
+
+def test_interactive_wait_is_bounded():
+    scheduler = AdmissionScheduler(concurrency=1, queue_size=10, max_wait=0.05)
+    held = scheduler.acquire()
+    with pytest.raises(Overloaded):
+        scheduler.acquire()
+    assert scheduler.depth() == 0
+    held.release()
+    assert scheduler.active() == 0
+
+def test_cancelled_async_waiter_does_not_keep_a_slot():
+    async def main():
+        scheduler = AdmissionScheduler(concurrency=1, queue_size=10, max_wait=0)
+        held = await scheduler.aacquire()
+        waiter = asyncio.ensure_future(scheduler.aacquire())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        held.release()
+        return scheduler
+    scheduler = asyncio.run(main())
+
+    assert scheduler.active() == 0 and scheduler.depth() == 0
+
+def test_ask_answers_429_with_retry_after_when_ollama_is_saturated(client, make_pdf, session_id, monkeypatch):
+    ingest(client, make_pdf("busy.pdf", pages=1, seed=240), session_id)
+    monkeypatch.setattr(admission, "queue_size", 0)
+    slots = [admission.acquire() for _ in range(admission.concurrency)]
+    try:
+        response = client.post("/ask", data={"query": f"what is in {session_id}?", "session_id": session_id,
+                                             "bypass_cache": "true"})
+    finally:
+        for slot in slots:
+            slot.release()
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
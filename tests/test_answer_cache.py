@@ -0,0 +1,69 @@
+# rag_system/tests/test_answer_cache.py
+import time
+from helpers import ask, ingest
+from src.retrieval.answer_cache import GLOBAL_SCOPE, AnswerCache
+
+def store(cache, scope, embedding, answer="an answer", version=None):
+    version = cache.version(scope) if version is None else version
+    cache.store(scope, version, embedding, ["node-1"], answer, ["doc.pdf - page 1"])
+
+def test_lookup_hits_above_threshold_only():
+    cache = AnswerCache(threshold=0.95, ttl=60, max_entries=10)
+    store(cache, "s1", [1.0, 0.0])
+
+    entry, score = cache.lookup("s1", [0.99, 0.05])
+    assert entry.answer == "an answer" and score >= 0.95
+    assert cache.lookup("s1", [0.5, 0.5]) is None
+    assert cache.lookup("s2", [1.0, 0.0]) is None
+
+def test_invalidate_clears_session_and_global_scopes():
+    cache = AnswerCache(threshold=0.9, ttl=60, max_entries=10)
+    store(cache, "s1", [1.0, 0.0])
+    store(cache, "s2", [1.0, 0.0])
+    store(cache, GLOBAL_SCOPE, [1.0, 0.0])
+    cache.invalidate("s1")
+
+    assert cache.version("s1") == 1 and cache.version(GLOBAL_SCOPE) == 1
+    assert cache.lookup("s1", [1.0, 0.0]) is None
+    assert cache.lookup(GLOBAL_SCOPE, [1.0, 0.0]) is None
+    assert cache.lookup("s2", [1.0, 0.0]) is not None
+
+def test_answer_generated_before_invalidation_is_not_stored():
+    cache = AnswerCache(threshold=0.9, ttl=60, max_entries=10)
+    version = cache.version("s1")
+    cache.invalidate("s1")
+    store(cache, "s1", [1.0, 0.0], version=version)
+
+    assert cache.lookup("s1", [1.0, 0.0]) is None
+
+def test_expired_entries_miss():
+    cache = AnswerCache(threshold=0.9, ttl=0.01, max_entries=10)
+    store(cache, "s1", [1.0, 0.0])
+    time.sleep(0.02)
+
+    assert cache.lookup("s1", [1.0, 0.0]) is None
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AnswerCache(threshold=0.9, ttl=60, max_entries=2)
+    store(cache, "s1", [1.0, 0.0], answer="first")
+    store(cache, "s1", [0.0, 1.0], answer="second")
+    cache.lookup("s1", [1.0, 0.0])
+    store(cache, "s1", [-1.0, 0.0], answer="third")
+
+    assert cache.lookup("s1", [1.0, 0.0])[0].answer == "first"
+    assert cache.lookup("s1", [0.0, 1.0]) is None
+    assert cache.lookup("s1", [-1.0, 0.0])[0].answer == "third"
+
+def test_ask_reuses_answer_until_session_documents_change(client, fake_ollama, make_pdf, session_id):
+    ingest(client, make_pdf("cached.pdf", pages=2, seed=160), session_id)
+    question = "which section specifies part PN-160-0001?"
+    first = ask(client, session_id, question, bypass_cache=False)
+    generated = fake_ollama.calls["generate"]
+    second = ask(client, session_id, question, bypass_cache=False)
+
+    assert not first["cache_hit"] and second["cache_hit"]
+    assert second["answer"] == first["answer"]
+    assert fake_ollama.calls["generate"] == generated
+
+    ingest(client, make_pdf("more.pdf", pages=1, seed=161), session_id)
+    assert not ask(client, session_id, question, bypass_cache=False)["cache_hit"]
@@ -0,0 +1,47 @@
+# rag_system/tests/test_async_clients.py
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from helpers import ingest
+from src.clients.http_pool import aclose_async_client, get_async_client
+from src.llm.ollama_llm import OllamaLLM
+
+def test_async_completion_matches_the_blocking_one(fake_ollama):
+    llm = OllamaLLM()
+
+    async def main():
+        completion = await llm.acomplete("Why is the pump loud?")
+        tokens = [chunk.delta async for chunk in await llm.astream_complete("Why is the pump loud?")]
+        await aclose_async_client()
+        return completion.text, "".join(tokens)
+    text, streamed = asyncio.run(main())
+
+    assert text == streamed == llm.complete("Why is the pump loud?").text
+    assert fake_ollama.calls["generate"] == 3
+
+def test_async_client_is_pooled_per_event_loop():
+    async def clients():
+        first, second = get_async_client(), get_async_client()
+        await aclose_async_client()
+        return first, second
+    first, second = asyncio.run(clients())
+    other, _ = asyncio.run(clients())
+
+    assert first is second
+    assert other is not first
+
+def test_concurrent_questions_do_not_wait_for_each_other(client, fake_ollama, make_pdf, session_id):
+    ingest(client, make_pdf("async.pdf", pages=2, seed=260), session_id)
+    fake_ollama.latency = 0.3
+
+    def ask(i: int) -> int:
+        return client.post("/ask", data={"query": f"what does part {i} of the valve do in {session_id}?",
+                                         "session_id": session_id, "bypass_cache": "true"}).status_code
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        statuses = list(pool.map(ask, range(4)))
+    elapsed = time.perf_counter() - started
+
+    assert statuses == [200] * 4
+    # An embedding and a generation of 0.3s each per question, one after the other would take 2.4s
+    assert elapsed < 1.6
@@ -0,0 +1,57 @@
+# rag_system/tests/test_chat_writer.py
+from helpers import wait_for
+from src.chat import session_store
+from src.chat.session_store import ChatWriter, delete_history, get_history, save_chat
+
+class CountingWriter(ChatWriter):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = []
+
+    def _write(self, seqs: list):
+        self.batches.append(len(seqs))
+        super()._write(seqs)
+
+def record(session_id: str, i: int) -> dict:
+    return {"session_id": session_id, "session_name": None, "query": f"q{i}", "response": f"r{i}", "sources": []}
+
+def test_records_are_group_committed(session_id):
+    writer = CountingWriter(batch_size=4, max_delay=5.0)
+    writer.start()
+    try:
+        for i in range(8):
+            writer.submit(record(session_id, i))
+        wait_for(lambda: writer.depth() == 0)
+    finally:
+        writer.stop()
+
+    assert writer.batches == [4, 4]
+    assert [r.query for r in get_history(session_id)] == [f"q{i}" for i in range(8)]
+
+def test_stop_flushes_a_partial_batch(session_id):
+    writer = ChatWriter(batch_size=100, max_delay=60.0)
+    writer.start()
+    writer.submit(record(session_id, 0))
+    writer.stop()
+
+    assert writer.depth() == 0
+    assert [r.query for r in get_history(session_id)] == ["q0"]
+
+def test_queued_records_are_read_and_deleted_before_commit(client, session_id, monkeypatch):
+    # Commits wait for a full batch, so the records stay queued while the history is read
+    writer = ChatWriter(batch_size=1000, max_delay=60.0)
+    monkeypatch.setattr(session_store, "chat_writer", writer)
+    writer.start()
+    try:
+        save_chat(session_id, "first", "one", [])
+        save_chat(session_id, "second", "two", [])
+
+        history = client.get(f"/history/{session_id}").json()
+        assert [(entry["id"], entry["query"]) for entry in history] == [(None, "first"), (None, "second")]
+        assert "X-Next-Cursor" not in client.get(f"/history/{session_id}?limit=2").headers
+
+        assert delete_history(session_id) == 2
+        assert client.get(f"/history/{session_id}").json() == []
+    finally:
+        writer.stop()
+    assert get_history(session_id) == []
@@ -0,0 +1,43 @@
+# rag_system/tests/test_chunker.py
+import pytest
+from llama_index.core.utils import get_tokenizer
+from src.ingestion.chunker import PAGE, SENTENCE, get_node_parser
+from src.ingestion.pdf_loader import load_pdf, tag_documents
+
+def pages(path, session_id: str = "s1") -> list:
+    documents, file_hash = load_pdf(str(path))
+    return tag_documents(documents, file_hash=file_hash, session_id=session_id)
+
+def test_sentence_chunks_fit_the_token_size(make_pdf):
+    documents = pages(make_pdf(pages=2, seed=180))
+    nodes = get_node_parser(SENTENCE, chunk_size=64, chunk_overlap=8).get_nodes_from_documents(documents)
+    tokenizer = get_tokenizer()
+
+    assert len(nodes) > len(documents)
+    assert all(len(tokenizer(node.get_content())) <= 64 for node in nodes)
+    assert {node.metadata["page"] for node in nodes} == {1, 2}
+    # Bookkeeping metadata is filtered on, never embedded
+    assert "session_id" not in nodes[0].get_content(metadata_mode="embed")
+
+def test_page_strategy_keeps_one_node_per_page(make_pdf):
+    documents = pages(make_pdf(pages=3, seed=181))
+    nodes = get_node_parser(PAGE).get_nodes_from_documents(documents)
+
+    assert [node.get_content() for node in nodes] == [doc.get_content() for doc in documents]
+
+def test_node_ids_are_stable_and_scoped(make_pdf):
+    path = make_pdf(pages=2, seed=182)
+
+    def ids(session_id: str = "s1", **settings) -> list:
+        parser = get_node_parser(SENTENCE, **settings)
+        return [node.node_id for node in parser.get_nodes_from_documents(pages(path, session_id))]
+
+    first = ids(chunk_size=64, chunk_overlap=8)
+    assert ids(chunk_size=64, chunk_overlap=8) == first
+    assert len(set(first)) == len(first)
+    assert not set(ids("s2", chunk_size=64, chunk_overlap=8)) & set(first)
+    assert not set(ids(chunk_size=128, chunk_overlap=8)) & set(first)
+
+def test_unknown_strategy_is_rejected():
+    with pytest.raises(ValueError):
+        get_node_parser("paragraph")
@@ -0,0 +1,70 @@
+# rag_system/tests/test_cli_ingest.py
+import os
+from helpers import ask, ingest
+from src.cli.ingest import MANIFEST_NAME, Manifest, hash_file, ingest_folder
+from src.container import get_container
+
+def file_rows(file_hash: str, session_id: str) -> list:
+    where = {"$and": [{"file_hash": file_hash}, {"session_id": session_id}]}
+    return get_container().index_manager.collection.get(where=where, include=[])["ids"]
+
+def test_rerun_skips_files_in_the_manifest(client, make_pdf, tmp_path):
+    folder = tmp_path / "bulk"
+    folder.mkdir()
+    for seed in (600, 601):
+        os.replace(make_pdf(f"bulk-{seed}.pdf", pages=2, seed=seed), folder / f"bulk-{seed}.pdf")
+
+    stats = ingest_folder(str(folder), workers=1)
+    assert stats["ingested"] == 2 and stats["failed"] == 0
+    assert {entry["status"] for entry in Manifest(str(folder / MANIFEST_NAME)).entries.values()} == {"ingested"}
+
+    assert ingest_folder(str(folder), workers=1)["unchanged"] == 2
+    # Touched but identical: hashed again and only re-recorded
+    os.utime(folder / "bulk-600.pdf")
+    stats = ingest_folder(str(folder), workers=1)
+    assert stats["unchanged"] == 1 and stats["duplicate"] == 1 and stats["ingested"] == 0
+
+def test_bulk_delete_keeps_session_copies(client, make_pdf, session_id, tmp_path):
+    folder = tmp_path / "shared"
+    folder.mkdir()
+    path = folder / "shared-bulk.pdf"
+    os.replace(make_pdf("shared-bulk.pdf", pages=3, seed=610), path)
+    ingest_folder(str(folder), workers=1)
+    file_hash = hash_file(str(path))
+    bulk = file_rows(file_hash, "")
+    assert bulk
+
+    # The API session reuses the bulk vectors, copied under its own session id
+    job = ingest(client, path, session_id)
+    assert "reused existing vectors" in job["message"]
+    assert len(file_rows(file_hash, session_id)) == len(bulk)
+
+    # What the CLI deletes on a retried batch or a replaced file version
+    get_container().index_manager.delete_file_vectors(file_hash, session_id="")
+    assert file_rows(file_hash, "") == []
+    assert len(file_rows(file_hash, session_id)) == len(bulk)
+    assert ask(client, session_id, "what does the document say about the pump valve?")["sources"]
+
+def test_long_files_are_parsed_in_page_ranges(client, make_pdf, tmp_path, monkeypatch):
+    from concurrent.futures import ProcessPoolExecutor
+    from src.cli import ingest as cli
+    from src.config.app_settings import AppSettings
+    folder = tmp_path / "ranges"
+    folder.mkdir()
+    os.replace(make_pdf("ranges-long.pdf", pages=5, seed=620), folder / "ranges-long.pdf")
+    os.replace(make_pdf("ranges-short.pdf", pages=1, seed=621), folder / "ranges-short.pdf")
+    submitted = []
+
+    class RecordingPool(ProcessPoolExecutor):
+        def submit(self, fn, path, *args):
+            submitted.append((fn.__name__, os.path.basename(path), *args))
+            return super().submit(fn, path, *args)
+    monkeypatch.setattr(AppSettings, "PARSE_PAGES_PER_TASK", 2)
+    monkeypatch.setattr(cli, "ProcessPoolExecutor", RecordingPool)
+    stats = cli.ingest_folder(str(folder), workers=2)
+
+    assert stats["ingested"] == 2 and stats["pages"] == 6
+    assert sorted(submitted) == [("load_pdf_range", "ranges-long.pdf", 2, 4), ("load_pdf_range", "ranges-long.pdf", 4, 6),
+                                 ("parse_file", "ranges-long.pdf", 2), ("parse_file", "ranges-short.pdf", 2)]
+    pages = [entry["pages"] for entry in Manifest(str(folder / MANIFEST_NAME)).entries.values()]
+    assert sorted(pages) == [1, 5]
@@ -0,0 +1,59 @@
+# rag_system/tests/test_compaction.py
+import os
+import sqlite3
+from helpers import ask, ingest
+from src.config.app_settings import AppSettings
+from src.vectorstore import index_manager as index_manager_module
+
+def test_chroma_vacuum_runs_on_a_released_client(chroma_manager, monkeypatch):
+    ids = [f"chunk-{i}" for i in range(200)]
+    chroma_manager.collection.add(ids=ids, embeddings=[[float(i), 1.0, 0.5] for i in range(200)],
+                                  documents=["filler text " * 50] * 200, metadatas=[{"session_id": "s"}] * 200)
+    chroma_manager.delete_ids(ids[:150])
+    closed_at_vacuum = []
+    real_connect = sqlite3.connect
+
+    def connect(path, *args, **kwargs):
+        closed_at_vacuum.append(chroma_manager.client._closed)
+        return real_connect(path, *args, **kwargs)
+    monkeypatch.setattr(index_manager_module.sqlite3, "connect", connect)
+    size_before = os.path.getsize(os.path.join(AppSettings.CHROMA_DB, "chroma.sqlite3"))
+
+    chroma_manager.compact_storage()
+
+    assert closed_at_vacuum == [True]
+    assert os.path.getsize(os.path.join(AppSettings.CHROMA_DB, "chroma.sqlite3")) < size_before
+    # The collection is usable again after the vacuum
+    assert chroma_manager.collection.count() == 50
+    chroma_manager.collection.add(ids=["after"], embeddings=[[0.0, 1.0, 0.0]], documents=["after"])
+    assert chroma_manager.collection.count() == 51
+
+def test_compact_cli_removes_orphans(client, make_pdf, session_id, data_dir):
+    from src.cli.compact import compact_collection
+    ingest(client, make_pdf("kept.pdf", pages=2, seed=800), session_id)
+    ingest(client, make_pdf("gone.pdf", pages=2, seed=801), session_id)
+    os.remove(data_dir / "source-data" / session_id / "gone.pdf")
+
+    dry = compact_collection(dry_run=True, queries=5)
+    assert dry["orphans"] > 0 and "removed" not in dry
+    report = compact_collection(queries=5)
+    assert report["removed"] == dry["orphans"] + dry["duplicates"]
+
+    sources = ask(client, session_id, "what does the document say about the pump valve?")["sources"]
+    assert sources and all(source.startswith("kept.pdf") for source in sources)
+
+def test_compact_cli_removes_legacy_copies(client, make_pdf, session_id):
+    from src.cli.compact import compact_collection
+    from src.container import get_container
+    collection = get_container().index_manager.collection
+    ingest(client, make_pdf("copied.pdf", pages=2, seed=802), session_id)
+    rows = collection.get(where={"session_id": session_id}, include=["embeddings", "metadatas", "documents"])
+    # Copies of every chunk under random ids, as ingests before stable chunk ids wrote them
+    legacy = [f"legacy-{node_id}" for node_id in rows["ids"]]
+    collection.add(ids=legacy, embeddings=rows["embeddings"], metadatas=rows["metadatas"], documents=rows["documents"])
+
+    report = compact_collection(queries=5)
+
+    assert report["duplicates"] >= len(legacy)
+    remaining = collection.get(where={"session_id": session_id})["ids"]
+    assert sorted(remaining) == sorted(rows["ids"])
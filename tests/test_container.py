@@ -0,0 +1,47 @@
+# rag_system/tests/test_container.py
+import subprocess
+import sys
+import threading
+import time
+import pytest
+from src.container import Container, get_container
+
+class SlowIndexManager:
+    built = 0
+
+    def __init__(self):
+        SlowIndexManager.built += 1
+        time.sleep(0.05)
+
+@pytest.mark.parametrize("module", ["src.api.app", "src.cli.ingest"])
+def test_importing_entry_points_skips_the_heavy_packages(module):
+    code = f"import sys, {module}; print(sorted({{'llama_index.core', 'chromadb', 'fitz'}} & set(sys.modules)))"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip().splitlines()[-1] == "[]"
+
+def test_resources_are_built_once_on_first_use(monkeypatch):
+    from src.vectorstore import index_manager
+    monkeypatch.setattr(index_manager, "IndexManager", SlowIndexManager)
+    SlowIndexManager.built = 0
+    container = Container()
+
+    # Invalidating the cache before any question builds nothing
+    container.invalidate_cache("s1")
+    assert not container.ready("index_manager") and not container.ready("query_engine")
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(container.index_manager)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert SlowIndexManager.built == 1
+    assert all(result is results[0] for result in results)
+    assert container.ingest_queue.index_manager is results[0]
+    assert container.session_gc.index_manager is results[0]
+
+def test_query_engine_uses_the_shared_index_manager(client):
+    container = get_container()
+    assert container is get_container()
+    assert container.query_engine.index_manager is container.index_manager
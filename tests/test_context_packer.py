@@ -0,0 +1,55 @@
+# rag_system/tests/test_context_packer.py
+from llama_index.core.schema import NodeWithScore, TextNode
+from src.retrieval.context_packer import ContextPacker
+
+def words(text: str) -> list:
+    return text.split()
+
+def node(node_id: str, text: str, score: float = 0.5) -> NodeWithScore:
+    return NodeWithScore(node=TextNode(id_=node_id, text=text), score=score)
+
+def packer(**kwargs) -> ContextPacker:
+    # One token per word keeps the budgets readable
+    return ContextPacker(tokenizer=words, mmr_lambda=kwargs.get("mmr_lambda", 0.7),
+                         duplicate_threshold=kwargs.get("duplicate_threshold", 0.95))
+
+def test_exact_duplicates_keep_the_best_ranked_copy():
+    nodes = [node("a", "pump pressure  limits", 0.9), node("b", "Pump pressure limits", 0.8), node("c", "valve seals", 0.7)]
+    packed = packer().pack(nodes, budget=100)
+
+    assert [n.node.node_id for n in packed.nodes] == ["a", "c"]
+    assert packed.duplicates == 1
+    assert packed.usage["duplicates_dropped"] == 1 and packed.usage["chunks_retrieved"] == 3
+
+def test_near_duplicates_are_dropped_by_embedding():
+    nodes = [node("a", "pump pressure limits"), node("b", "pump pressure limit values"), node("c", "valve seals")]
+    embeddings = {"a": [1.0, 0.0], "b": [0.99, 0.01], "c": [0.0, 1.0]}
+    packed = packer().pack(nodes, budget=100, query_embedding=[1.0, 0.0], embeddings=embeddings)
+
+    assert [n.node.node_id for n in packed.nodes] == ["a", "c"]
+    assert packed.near_duplicates == 1
+
+def test_chunks_over_the_budget_are_skipped():
+    nodes = [node("a", "one two three four", 0.9), node("b", "five six seven eight nine", 0.8), node("c", "ten", 0.7)]
+    packed = packer().pack(nodes, budget=6)
+
+    # "\n\n" counts no words, so a and c fit together while b does not
+    assert [n.node.node_id for n in packed.nodes] == ["a", "c"]
+    assert packed.context_tokens <= 6
+    assert packed.over_budget == 1
+    assert packed.text == "one two three four\n\nten"
+
+def test_best_chunk_larger_than_budget_is_truncated():
+    packed = packer().pack([node("a", " ".join(f"w{i}" for i in range(50)))], budget=10)
+
+    assert packed.truncated
+    assert 0 < packed.context_tokens <= 10
+    assert packed.text.startswith("w0 w1")
+
+def test_mmr_prefers_a_different_chunk_over_a_similar_one():
+    nodes = [node("a", "alpha"), node("b", "beta"), node("c", "gamma")]
+    embeddings = {"a": [1.0, 0.0, 0.0], "b": [0.9, 0.43, 0.0], "c": [0.7, 0.0, 0.71]}
+    packed = packer(mmr_lambda=0.5, duplicate_threshold=0.99).pack(nodes, budget=100, query_embedding=[1.0, 0.1, 0.1],
+                                                                   embeddings=embeddings)
+
+    assert [n.node.node_id for n in packed.nodes] == ["a", "c", "b"]
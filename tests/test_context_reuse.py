@@ -0,0 +1,57 @@
+# rag_system/tests/test_context_reuse.py
+from helpers import ask, ingest
+from src.chat.context_store import ContextStore
+from src.container import get_container
+
+def test_first_turn_gets_the_whole_budget(client, make_pdf, session_id, monkeypatch):
+    ingest(client, make_pdf("budget.pdf", pages=6, seed=402), session_id)
+    question = "what does the document say about the motor sensor?"
+    with_reuse = ask(client, session_id, question)["usage"]
+    monkeypatch.setattr(get_container().query_engine, "contexts", None)
+    without_reuse = ask(client, session_id, question)["usage"]
+
+    assert with_reuse["history_tokens"] == 0
+    assert with_reuse["token_budget"] == without_reuse["token_budget"]
+    assert with_reuse["chunks_used"] == without_reuse["chunks_used"]
+
+def test_second_turn_continues_the_first_turns_context(client, fake_ollama, make_pdf, session_id):
+    # A short first turn, its context stays under LLM_CONTEXT_MAX_TOKENS
+    ingest(client, make_pdf("turns.pdf", pages=1, seed=400), session_id)
+    fake_ollama.answer_tokens = 50
+
+    first = ask(client, session_id, "what does the document say about the pump valve?")["usage"]
+    second = ask(client, session_id, "and what about the sensor bearing?")["usage"]
+
+    assert first["history_tokens"] == 0
+    # The first turn's prompt and answer are carried as token ids, the new chunks fit next to them
+    assert second["history_tokens"] > first["prompt_tokens"]
+    assert 0 < second["context_tokens"] <= second["token_budget"]
+
+def test_session_starts_over_when_its_context_outgrows_the_window(client, fake_ollama, make_pdf, session_id):
+    ingest(client, make_pdf("long-turns.pdf", pages=6, seed=401), session_id)
+    fake_ollama.answer_tokens = 800
+
+    ask(client, session_id, "what does the document say about the pump valve?")
+    usage = ask(client, session_id, "and what about the sensor bearing?")["usage"]
+    assert usage["history_tokens"] == 0
+
+def test_persisted_context_survives_a_new_store(session_id):
+    ContextStore(persist=True).put(session_id, "model-a", [1, 2, 3])
+    store = ContextStore(persist=True)
+
+    assert store.get(session_id, "model-a") == [1, 2, 3]
+    assert store.get(session_id, "model-b") is None
+    store.reset(session_id)
+    assert ContextStore(persist=True).get(session_id, "model-a") is None
+
+def test_store_enforces_its_size_cap(session_id):
+    store = ContextStore(max_tokens=4, persist=False)
+
+    assert store.put(session_id, "model-a", [1, 2, 3])
+    assert not store.put(session_id, "model-a", [1, 2, 3, 4, 5])
+    assert store.get(session_id, "model-a") is None
+    # Callers may tighten the cap, never raise it
+    assert not store.put(session_id, "model-a", [1, 2, 3], max_tokens=2)
+    assert not store.put(session_id, "model-a", [1, 2, 3, 4, 5], max_tokens=100)
+    store.put(session_id, "model-a", [1, 2, 3])
+    assert store.get(session_id, "model-a", max_tokens=2) is None
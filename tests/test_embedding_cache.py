@@ -0,0 +1,50 @@
+# rag_system/tests/test_embedding_cache.py
+import pytest
+from src.embedding import embedding_cache
+from src.embedding.embedding_cache import EmbeddingCache, text_hash
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path / "cache.db"), max_entries=10)
+    yield cache
+    cache.close()
+
+def test_round_trip_per_model(cache):
+    key = text_hash("hello")
+    cache.put_many("model-a", {key: [0.5, -0.25, 1.0]})
+    assert cache.get("model-a", key) == [0.5, -0.25, 1.0]
+    assert cache.get("model-b", key) is None
+    assert cache.get_many("model-a", [key, text_hash("other"), key]) == {key: [0.5, -0.25, 1.0]}
+
+def test_lookups_do_not_write(cache):
+    keys = [text_hash(str(i)) for i in range(3)]
+    cache.put_many("m", {key: [float(i)] for i, key in enumerate(keys)})
+    changes = cache._conn.total_changes
+    for _ in range(20):
+        assert len(cache.get_many("m", keys)) == 3
+    assert cache._conn.total_changes == changes
+
+def test_buffered_hits_flush_after_enough_touches(cache, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "_TOUCH_FLUSH_SIZE", 2)
+    keys = [text_hash(str(i)) for i in range(2)]
+    cache.put_many("m", {key: [1.0] for key in keys})
+    changes = cache._conn.total_changes
+    cache.get_many("m", keys)
+    assert cache._conn.total_changes == changes + 2
+    assert cache._touched == {}
+
+def test_eviction_keeps_recently_read_entries(cache):
+    # Ten entries fill the cache; the first three are read afterwards, so they are the most recent
+    old = {text_hash(f"old{i}"): [float(i)] for i in range(10)}
+    cache.put_many("m", old)
+    recent = list(old)[:3]
+    cache.get_many("m", recent)
+    cache.put_many("m", {text_hash("new"): [1.0]})
+    assert cache.size() <= 10
+    assert set(cache.get_many("m", recent)) == set(recent)
+    assert cache.get("m", text_hash("new")) == [1.0]
+
+def test_entries_and_evictions_are_exported(client):
+    embedding_cache.get_embedding_cache()
+    text = client.get("/metrics").text
+    assert 'rag_cache_entries{cache="embedding"}' in text
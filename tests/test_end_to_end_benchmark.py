@@ -0,0 +1,26 @@
+# rag_system/tests/test_end_to_end_benchmark.py
+# A small run of the end-to-end benchmark against the app under test, so its measurements keep working
+from benchmarks import end_to_end
+
+def test_benchmark_measures_ingest_ask_and_stream(client, fake_ollama, make_pdf, session_id, capsys):
+    paths = [str(make_pdf(f"bench-{seed}.pdf", pages=2, seed=200 + seed)) for seed in range(2)]
+    ingest_result = end_to_end.ingest(client, fake_ollama, paths, 2, session_id)
+    questions = ["PN-200-0001", "What does the document say about the pump valve?"] * 2
+    ask_result = end_to_end.ask_load(client, fake_ollama, questions, session_id, concurrency=2, use_cache=False)
+    stream_result = end_to_end.stream_timing(client, questions[:1], session_id)
+
+    assert ingest_result["failed"] == 0 and ingest_result["pages"] == 4
+    assert ingest_result["embed_inputs_per_page"] > 0
+    assert ask_result["errors"] == 0 and ask_result["generate_per_ask"] == 1
+    assert ask_result["p50_ms"] <= ask_result["p99_ms"]
+    assert stream_result["total_p50_ms"] >= stream_result["ttft_p50_ms"] > 0
+
+    result = {"ingest": ingest_result, "ask": [ask_result], "stream": stream_result, "peak_rss_mb": 1.0}
+    end_to_end.compare(result, result)
+    assert "ask@2.rps" in capsys.readouterr().out
+
+def test_percentile_picks_nearest_rank():
+    values = list(range(1, 101))
+    assert end_to_end.percentile(values, 0.50) == 50
+    assert end_to_end.percentile(values, 0.99) == 99
+    assert end_to_end.percentile([7], 0.95) == 7
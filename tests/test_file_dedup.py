@@ -0,0 +1,42 @@
+# rag_system/tests/test_file_dedup.py
+from helpers import ask, ingest
+from src.container import get_container
+
+def session_rows(session_id: str) -> list:
+    return get_container().index_manager.collection.get(where={"session_id": session_id}, include=["metadatas"])["metadatas"]
+
+def test_known_file_is_attached_without_embedding(client, fake_ollama, make_pdf, session_id):
+    path = make_pdf("shared.pdf", pages=3, seed=500)
+    ingest(client, path, session_id)
+    fake_ollama.reset_calls()
+
+    job = ingest(client, path, session_id + "-b", filename="renamed.pdf")
+
+    assert job["status"] == "duplicate"
+    assert "reused existing vectors" in job["message"]
+    assert fake_ollama.calls["embed"] == fake_ollama.calls["embeddings"] == 0
+    rows = session_rows(session_id + "-b")
+    assert len(rows) == len(session_rows(session_id))
+    assert {row["filename"] for row in rows} == {"renamed.pdf"}
+    assert ask(client, session_id + "-b", "what does the document say about the pump?")["sources"]
+
+def test_attach_reads_only_one_sessions_copy(client, make_pdf, session_id, monkeypatch):
+    path = make_pdf("copies.pdf", pages=2, seed=501)
+    for suffix in ("", "-b", "-c"):
+        ingest(client, path, session_id + suffix)
+    collection = get_container().index_manager.collection
+    reads = []
+    real_get = collection.get
+
+    def get(*args, **kwargs):
+        result = real_get(*args, **kwargs)
+        reads.append((kwargs, len(result["ids"])))
+        return result
+    monkeypatch.setattr(collection, "get", get)
+
+    ingest(client, path, session_id + "-d")
+
+    per_session = len(session_rows(session_id))
+    assert len(session_rows(session_id + "-d")) == per_session
+    with_embeddings = [rows for kwargs, rows in reads if "embeddings" in kwargs.get("include", ())]
+    assert with_embeddings == [per_session]
@@ -0,0 +1,62 @@
+# rag_system/tests/test_history.py
+import sqlite3
+from helpers import wait_for
+from sqlalchemy import create_engine
+from src.chat import session_store
+from src.chat.session_store import chat_writer, legacy_sources, save_chat
+
+def save(session_id: str, count: int):
+    for i in range(count):
+        save_chat(session_id, f"question {i}", f"answer {i}", [f"doc.pdf, page {i + 1}"])
+    # Pages are keyed on stored ids, wait for the write-behind writer
+    wait_for(lambda: not chat_writer.pending(session_id))
+
+def test_history_pages_follow_the_next_cursor(client, session_id):
+    save(session_id, 5)
+    pages, url = [], f"/history/{session_id}?limit=2"
+    while url:
+        response = client.get(url)
+        pages.append([entry["query"] for entry in response.json()])
+        url = response.links.get("next", {}).get("url")
+        if url:
+            assert url.endswith(f"cursor={response.headers['X-Next-Cursor']}&limit=2")
+
+    assert pages == [["question 0", "question 1"], ["question 2", "question 3"], ["question 4"]]
+
+def test_export_streams_the_whole_history(client, session_id):
+    save(session_id, 3)
+    exported = client.get(f"/history/{session_id}?export=true").json()
+
+    assert [entry["query"] for entry in exported] == ["question 0", "question 1", "question 2"]
+    assert exported[0]["sources"] == ["doc.pdf, page 1"]
+    everything = client.get("/history?export=true").json()
+    assert [entry["query"] for entry in everything if entry["session_id"] == session_id] == [
+        "question 0", "question 1", "question 2"]
+
+def test_page_size_is_bounded(client, session_id):
+    assert client.get(f"/history/{session_id}?limit=0").status_code == 422
+    assert client.get(f"/history/{session_id}?limit=100000").status_code == 422
+
+def test_legacy_sources_are_split_per_page():
+    assert legacy_sources("a.pdf, page 1, b, c.pdf, page 2") == ["a.pdf, page 1", "b, c.pdf, page 2"]
+    assert legacy_sources("") == []
+    assert legacy_sources("free text") == ["free text"]
+
+def test_migration_converts_sources_and_adds_the_index(tmp_path, monkeypatch):
+    path = tmp_path / "legacy_chat.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE chat_history (id INTEGER PRIMARY KEY, session_id VARCHAR NOT NULL, "
+                     "session_name VARCHAR, query TEXT NOT NULL, response TEXT NOT NULL, sources JSON NOT NULL)")
+        conn.executemany("INSERT INTO chat_history (session_id, query, response, sources) VALUES (?, ?, ?, ?)",
+                         [("s1", "q1", "r1", "a.pdf, page 1, a.pdf, page 2"), ("s1", "q2", "r2", '["b.pdf, page 3"]')])
+    monkeypatch.setattr(session_store, "engine", create_engine(f"sqlite:///{path}"))
+    monkeypatch.setattr(session_store, "_MIGRATION_BATCH", 1)
+    session_store.migrate()
+
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == session_store.SCHEMA_VERSION
+        assert [row[0] for row in conn.execute("SELECT sources FROM chat_history ORDER BY id")] == [
+            '["a.pdf, page 1", "a.pdf, page 2"]', '["b.pdf, page 3"]']
+        indexes = [row[1] for row in conn.execute("PRAGMA index_list(chat_history)")]
+    assert "ix_chat_history_session_id_id" in indexes
+    session_store.engine.dispose()
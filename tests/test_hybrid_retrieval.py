@@ -0,0 +1,72 @@
+# rag_system/tests/test_hybrid_retrieval.py
+from helpers import ask, ingest
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+from src.retrieval.hybrid_retriever import HybridRetriever, is_keyword_query, reciprocal_rank_fusion
+from src.vectorstore.lexical_index import LexicalIndex, to_match_expression
+
+class FixedRetriever(BaseRetriever):
+    def __init__(self, nodes: list):
+        super().__init__()
+        self.nodes = nodes
+
+    def _retrieve(self, query_bundle: QueryBundle) -> list:
+        return [NodeWithScore(node=node, score=1.0) for node in self.nodes]
+
+def lexical_index(tmp_path) -> LexicalIndex:
+    index = LexicalIndex(str(tmp_path / "lexical.db"))
+    index.add([
+        ("n1", "s1", "f1", "Pump housing, part AB-1234, torque 40 Nm."),
+        ("n2", "s1", "f1", "Valve seals are replaced every year."),
+        ("n3", "s2", "f2", "Part AB-1234 is also listed in another session."),
+    ])
+    return index
+
+def test_match_expression_quotes_user_input():
+    assert to_match_expression('AB-1234 OR "x" NEAR(') == '"AB-1234" OR "OR" OR "x" OR "NEAR"'
+    assert to_match_expression("?!") == ""
+
+def test_lexical_search_is_scoped_and_follows_deletes(tmp_path):
+    index = lexical_index(tmp_path)
+
+    assert [node_id for node_id, _ in index.search("AB-1234", "s1")] == ["n1"]
+    assert {node_id for node_id, _ in index.search("AB-1234")} == {"n1", "n3"}
+    index.delete("f1", "s1")
+    assert index.search("AB-1234", "s1") == []
+    assert index.count() == 1
+    index.close()
+
+def test_keyword_queries_are_recognized():
+    assert is_keyword_query("AB-1234")
+    assert is_keyword_query('"torque limits"')
+    assert not is_keyword_query("what is the torque for AB-1234?")
+    assert not is_keyword_query("pump")
+
+def test_rank_fusion_rewards_agreement():
+    scores = reciprocal_rank_fusion([["a", "b"], ["b", "c"]], k=60)
+    assert max(scores, key=scores.get) == "b"
+
+def test_hybrid_adds_lexical_hits_the_vector_search_missed(tmp_path):
+    index = lexical_index(tmp_path)
+    nodes = {"n1": TextNode(id_="n1", text="Pump housing, part AB-1234."), "n2": TextNode(id_="n2", text="Valve seals.")}
+    fetched = []
+
+    def fetch_nodes(ids, session_id):
+        fetched.append((list(ids), session_id))
+        return [nodes[node_id] for node_id in ids]
+    retriever = HybridRetriever(FixedRetriever([nodes["n2"]]), index, fetch_nodes, session_id="s1", similarity_top_k=2,
+                                mode="hybrid", rrf_k=60)
+    results = retriever.retrieve(QueryBundle("AB-1234", embedding=[0.1, 0.2]))
+
+    assert {n.node.node_id for n in results} == {"n1", "n2"}
+    assert fetched == [(["n1"], "s1")]
+    index.close()
+
+def test_identifier_question_skips_the_embedding(client, fake_ollama, make_pdf, session_id):
+    ingest(client, make_pdf("parts.pdf", pages=4, seed=190), session_id)
+    fake_ollama.reset_calls()
+    result = ask(client, session_id, "PN-190-0002")
+
+    assert result["usage"]["lexical_only"]
+    assert fake_ollama.calls["embed"] == fake_ollama.calls["embeddings"] == 0
+    assert result["sources"][0] == "parts.pdf, page 3"
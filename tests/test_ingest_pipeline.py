@@ -0,0 +1,131 @@
+# rag_system/tests/test_ingest_pipeline.py
+import io
+import zipfile
+from helpers import ask, ingest, ingest_batch
+from src.ingestion.pipeline import IngestPipeline
+
+def read(path) -> bytes:
+    return path.read_bytes()
+
+def test_batch_shares_embedding_calls_across_files(client, fake_ollama, make_pdf, session_id):
+    # Three one-page files fit in one batch of INGEST_BATCH_SIZE=4 pages
+    files = [(f"small-{seed}.pdf", read(make_pdf(f"small-{seed}.pdf", pages=1, seed=100 + seed))) for seed in range(3)]
+    batch = ingest_batch(client, files, session_id)
+
+    assert batch["ingested"] == 3 and batch["failed"] == 0
+    assert batch["pages_written"] == 3
+    assert 0 < fake_ollama.calls["embed"] < 3
+
+def test_failed_file_does_not_stop_the_others(client, make_pdf, session_id):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.write(make_pdf("zipped.pdf", pages=2, seed=111), "zipped.pdf")
+    good = read(make_pdf("good.pdf", pages=5, seed=112))
+    files = [("good.pdf", good), ("broken.pdf", b"%PDF-1.4 not really a pdf"), ("bundle.zip", archive.getvalue()),
+             ("again.pdf", good)]
+    batch = ingest_batch(client, files, session_id)
+
+    statuses = {f["filename"]: f["status"] for f in batch["files"]}
+    assert statuses == {"good.pdf": "done", "broken.pdf": "failed", "zipped.pdf": "done", "again.pdf": "duplicate"}
+    assert batch["pages_written"] == 7
+
+def test_stage_error_fails_jobs_instead_of_hanging(client, make_pdf, session_id, monkeypatch):
+    def broken(self, documents, parts, embedded):
+        raise RuntimeError("embedding stage exploded")
+    monkeypatch.setattr(IngestPipeline, "_embed_batch", broken)
+    # More files than the stage queues hold, the parse stage would block on a dead consumer
+    files = [(f"stuck-{seed}.pdf", read(make_pdf(f"stuck-{seed}.pdf", pages=2, seed=120 + seed))) for seed in range(6)]
+    batch = ingest_batch(client, files, session_id)
+
+    assert batch["failed"] == 6
+    assert all("exploded" in f["error"] for f in batch["files"])
+
+    # The batch worker survives and the next batch goes through
+    monkeypatch.undo()
+    batch = ingest_batch(client, [("after.pdf", read(make_pdf("after.pdf", pages=1, seed=130)))], session_id)
+    assert batch["ingested"] == 1
+
+def test_ingest_keeps_upload_inside_session_folder(client, data_dir, make_pdf, session_id):
+    job = ingest(client, make_pdf("escape.pdf", pages=1, seed=140), session_id, filename="../../escape.pdf")
+
+    assert job["status"] == "done"
+    assert job["filename"] == "escape.pdf"
+    assert (data_dir / "source-data" / session_id / "escape.pdf").exists()
+    assert not (data_dir / "escape.pdf").exists()
+
+def test_batch_parses_long_files_in_page_ranges(client, make_pdf, session_id, monkeypatch):
+    from src.config.app_settings import AppSettings
+    from src.ingestion import pipeline
+    submitted = []
+    pool = pipeline.get_parse_pool()
+
+    class RecordingPool:
+        def submit(self, fn, path, *args):
+            submitted.append((fn.__name__, path.rsplit("/", 1)[-1], *args))
+            return pool.submit(fn, path, *args)
+    monkeypatch.setattr(AppSettings, "PARSE_PAGES_PER_TASK", 2)
+    monkeypatch.setattr(pipeline, "get_parse_pool", RecordingPool)
+    files = [("long.pdf", read(make_pdf("long.pdf", pages=5, seed=150))),
+             ("short.pdf", read(make_pdf("short.pdf", pages=1, seed=151)))]
+    batch = ingest_batch(client, files, session_id)
+
+    assert batch["ingested"] == 2
+    assert {f["filename"]: f["pages_written"] for f in batch["files"]} == {"long.pdf": 5, "short.pdf": 1}
+    assert {f["filename"]: f["pages_total"] for f in batch["files"]} == {"long.pdf": 5, "short.pdf": 1}
+    assert [call for call in submitted if call[1] == "long.pdf"] == [
+        ("load_pdf_first_range", "long.pdf", 2), ("load_pdf_range", "long.pdf", 2, 4), ("load_pdf_range", "long.pdf", 4, 6)]
+
+    sources = ask(client, session_id, "which section specifies part PN-150-0004?")["sources"]
+    assert any(source.startswith("long.pdf") for source in sources)
+
+def test_oversized_archive_is_rejected(client, data_dir, make_pdf, session_id, monkeypatch):
+    from src.config.app_settings import AppSettings
+    pdf = make_pdf("bomb.pdf", pages=2, seed=160)
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.write(pdf, "bomb.pdf")
+        zf.writestr("notes.txt", "not a pdf")
+
+    def upload():
+        return client.post("/ingest/batch", files=[("files", ("bomb.zip", archive.getvalue(), "application/zip"))],
+                           data={"session_id": session_id})
+
+    monkeypatch.setattr(AppSettings, "UPLOAD_MAX_EXTRACTED_BYTES", pdf.stat().st_size - 1)
+    response = upload()
+    assert response.status_code == 413
+    assert not (data_dir / "source-data" / session_id / "bomb.pdf").exists()
+
+    monkeypatch.setattr(AppSettings, "UPLOAD_MAX_EXTRACTED_BYTES", pdf.stat().st_size)
+    monkeypatch.setattr(AppSettings, "UPLOAD_MAX_ARCHIVE_MEMBERS", 1)
+    response = upload()
+    assert response.status_code == 413
+    assert "members" in response.json()["detail"]["message"]
+
+    monkeypatch.setattr(AppSettings, "UPLOAD_MAX_ARCHIVE_MEMBERS", 2)
+    assert upload().status_code == 202
+
+def test_job_gets_one_final_status_across_stage_threads():
+    import threading
+    from types import SimpleNamespace
+    updates, finishes = [], []
+
+    class SlowIndex:
+        def delete_file_vectors(self, file_hash, session_id):
+            threading.Event().wait(0.01)    # widens the window between the check and the update
+
+    pipeline = IngestPipeline(SlowIndex(), prepare=None, update=lambda job_id, **fields: updates.append(job_id),
+                              finish=lambda job, *args: finishes.append(job.id))
+    job = SimpleNamespace(id="job-1", file_hash="hash-1", filename="race.pdf", session_id="s")
+    barrier = threading.Barrier(8)
+
+    def end():
+        barrier.wait()
+        pipeline._fail(job, RuntimeError("stage failed"))
+        pipeline._finish(job, "done", "finished", 1)
+    threads = [threading.Thread(target=end) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert updates == ["job-1"] and finishes == []
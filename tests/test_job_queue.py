@@ -0,0 +1,62 @@
+# rag_system/tests/test_job_queue.py
+import hashlib
+import shutil
+from helpers import ask, ingest, wait_for
+from src.container import get_container
+from src.ingestion.file_registry import Session
+from src.ingestion.job_queue import EMBEDDING, FAILED, QUEUED, IngestJob, IngestJobQueue
+
+def add_job(data_dir, path, session_id: str, status: str) -> str:
+    # A job row as a previous run left it, with the upload already in the session folder
+    folder = data_dir / "source-data" / session_id
+    folder.mkdir(parents=True, exist_ok=True)
+    file_path = folder / path.name
+    shutil.copy(path, file_path)
+    content = file_path.read_bytes()
+    job_id = f"job-{session_id}"
+    with Session() as s:
+        s.add(IngestJob(id=job_id, session_id=session_id, filename=path.name, file_path=str(file_path),
+                        file_hash=hashlib.sha256(content).hexdigest(), size_bytes=len(content), status=status,
+                        pages_parsed=1, pages_written=1))
+        s.commit()
+    return job_id
+
+def test_ingest_job_reports_pages_and_duplicates(client, make_pdf, session_id):
+    path = make_pdf("queued.pdf", pages=3, seed=170)
+    job = ingest(client, path, session_id)
+
+    assert job["status"] == "done" and job["error"] is None
+    assert job["pages_total"] == job["pages_parsed"] == job["pages_written"] == 3
+    assert ingest(client, path, session_id)["status"] == "duplicate"
+    assert client.get("/ingest/no-such-job").status_code == 404
+
+def test_ask_answers_409_while_session_is_ingesting(client, data_dir, make_pdf, session_id):
+    job_id = add_job(data_dir, make_pdf("pending.pdf", pages=1, seed=171), session_id, QUEUED)
+    try:
+        response = client.post("/ask", data={"query": "what is this?", "session_id": session_id, "bypass_cache": "true"})
+        assert response.status_code == 409
+    finally:
+        with Session() as s:
+            s.query(IngestJob).filter_by(id=job_id).update({"status": FAILED})
+            s.commit()
+
+def test_unfinished_job_is_resumed_on_start(client, data_dir, make_pdf, session_id, monkeypatch):
+    index_manager = get_container().index_manager
+    job_id = add_job(data_dir, make_pdf("resumed.pdf", pages=3, seed=172), session_id, EMBEDDING)
+    deleted = []
+    delete_file_vectors = index_manager.delete_file_vectors
+    monkeypatch.setattr(index_manager, "delete_file_vectors",
+                        lambda file_hash, sid=None: deleted.append(sid) or delete_file_vectors(file_hash, sid))
+
+    queue = IngestJobQueue(index_manager, workers=1)
+    queue.start()
+    try:
+        job = wait_for(lambda: (job := queue.get(job_id))["status"] in ("done", "failed") and job)
+    finally:
+        queue.stop()
+
+    assert job["status"] == "done"
+    assert job["pages_written"] == 3
+    # The pages a previous run wrote are dropped before the file is written again
+    assert deleted == [session_id]
+    assert ask(client, session_id, "which section specifies part PN-172-0002?")["sources"]
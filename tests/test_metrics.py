@@ -0,0 +1,48 @@
+# rag_system/tests/test_metrics.py
+import pytest
+from helpers import ingest
+from src.monitoring import metrics
+
+@pytest.fixture
+def histogram():
+    histogram = metrics.Histogram("test_seconds", "Test latency.", ("stage",), buckets=(0.1, 1.0))
+    yield histogram
+    metrics.REGISTRY.remove(histogram)
+
+def test_histogram_renders_cumulative_buckets(histogram):
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, stage='say "hi"')
+
+    assert histogram.render() == [
+        "# HELP test_seconds Test latency.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{stage="say \\"hi\\"",le="0.1"} 1',
+        'test_seconds_bucket{stage="say \\"hi\\"",le="1"} 2',
+        'test_seconds_bucket{stage="say \\"hi\\"",le="+Inf"} 3',
+        'test_seconds_sum{stage="say \\"hi\\""} 5.55',
+        'test_seconds_count{stage="say \\"hi\\""} 3',
+    ]
+
+def test_timed_stages_add_up_in_the_request_timings():
+    timings = metrics.start_request_timing()
+    for _ in range(2):
+        with metrics.timed("retrieve"):
+            pass
+
+    assert list(timings) == ["retrieve"]
+    assert metrics.server_timing_header({"retrieve": 0.0123}, 0.05) == "retrieve;dur=12.3, total;dur=50.0"
+
+def test_ask_reports_stages_in_server_timing_and_metrics(client, make_pdf, session_id):
+    ingest(client, make_pdf("timed.pdf", pages=2, seed=210), session_id)
+    # A question no earlier test asked, so its embedding is not cached
+    response = client.post("/ask", data={"query": f"what does the document say about the pump in {session_id}?",
+                                         "session_id": session_id, "bypass_cache": "true"})
+    stages = [part.split(";")[0] for part in response.headers["Server-Timing"].split(", ")]
+
+    assert response.status_code == 200
+    assert {"embed_batch", "retrieve", "pack_context", "llm"} <= set(stages) and stages[-1] == "total"
+
+    body = client.get("/metrics").text
+    assert 'rag_http_request_duration_seconds_count{method="POST",route="/ask",status="200"}' in body
+    assert 'rag_stage_duration_seconds_bucket{stage="retrieve",le="+Inf"}' in body
+    assert "# TYPE rag_cache_lookups_total counter" in body
@@ -0,0 +1,74 @@
+# rag_system/tests/test_numpy_store.py
+import numpy as np
+import pytest
+from helpers import ask, ingest
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import MetadataFilter, MetadataFilters, VectorStoreQuery
+from src.vectorstore.numpy_store import GLOBAL_SCOPE, NumpyVectorStore
+
+def write_rows(path, rows: dict):
+    # rows: session id -> node ids, one random vector each
+    store = NumpyVectorStore(path=str(path), dtype="float32")
+    rng = np.random.default_rng(0)
+    for session_id, ids in rows.items():
+        store.add_rows(ids, rng.normal(size=(len(ids), 8)).tolist(), [{"session_id": session_id} for _ in ids],
+                       [f"text of {node_id}" for node_id in ids])
+    return store
+
+def test_pinned_lookup_opens_only_that_scope(tmp_path):
+    write_rows(tmp_path, {"a": ["a1", "a2"], "b": ["b1"], "": ["bulk1"]})
+    store = NumpyVectorStore(path=str(tmp_path), dtype="float32")
+
+    result = store.get_rows(ids=["a2", "b1"], where={"session_id": "a"}, include=["embeddings"])
+    assert result["ids"] == ["a2"]
+    assert len(result["embeddings"][0]) == 8
+    assert set(store._scopes) == {"a"}
+
+    assert store.get_rows(ids=["bulk1", "a1"], where={"session_id": ""})["ids"] == ["bulk1"]
+    assert set(store._scopes) == {"a", GLOBAL_SCOPE}
+
+def test_unpinned_lookup_still_finds_every_scope(tmp_path):
+    write_rows(tmp_path, {"a": ["a1"], "b": ["b1"]})
+    store = NumpyVectorStore(path=str(tmp_path), dtype="float32")
+
+    assert sorted(store.get_rows(ids=["b1", "a1", "missing"])["ids"]) == ["a1", "b1"]
+
+def test_ask_reads_only_the_sessions_scope(client, make_pdf, session_id, monkeypatch):
+    ingest(client, make_pdf("scoped.pdf", pages=3, seed=700), session_id)
+    ingest(client, make_pdf("elsewhere.pdf", pages=3, seed=701), session_id + "-other")
+    scopes = []
+    real_scopes_for = NumpyVectorStore._scopes_for
+
+    def scopes_for(self, session):
+        scopes.append(session)
+        return real_scopes_for(self, session)
+    monkeypatch.setattr(NumpyVectorStore, "_scopes_for", scopes_for)
+
+    assert ask(client, session_id, "what does the document say about the pump valve?")["sources"]
+    assert ask(client, session_id, "PN-700-0001")["sources"]
+    assert scopes and set(scopes) == {session_id}
+
+@pytest.mark.parametrize("dtype", ["float32", "int8"])
+def test_search_matches_brute_force_and_skips_deleted_rows(tmp_path, dtype):
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(60, 16))
+    store = NumpyVectorStore(path=str(tmp_path), dtype=dtype)
+    store.add([TextNode(id_=f"n{i}", text=f"chunk {i}", embedding=vector.tolist(), metadata={"session_id": f"s{i % 3}"})
+               for i, vector in enumerate(vectors)])
+    query = rng.normal(size=16)
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = [f"n{i}" for i in np.argsort(-(normalized @ query))]
+
+    result = store.query(VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=5))
+    if dtype == "float32":
+        assert result.ids == expected[:5]
+    else:
+        # Quantized rows keep the best match and most of the top five
+        assert result.ids[0] == expected[0] and len(set(result.ids) & set(expected[:5])) >= 4
+
+    store.delete_ids([expected[0]])
+    reopened = NumpyVectorStore(path=str(tmp_path), dtype=dtype)
+    session = MetadataFilters(filters=[MetadataFilter(key="session_id", value="s1")])
+    ids = reopened.query(VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=60, filters=session)).ids
+    assert expected[0] not in ids
+    assert sorted(ids) == sorted(f"n{i}" for i in range(60) if i % 3 == 1 and f"n{i}" != expected[0])
@@ -0,0 +1,69 @@
+# rag_system/tests/test_ollama_embedder.py
+import asyncio
+import threading
+import pytest
+from benchmarks.fake_ollama import fake_embedding
+from src.clients.admission import AdmissionScheduler
+from src.embedding import ollama_embedder
+from src.embedding.embedding_cache import EmbeddingCache
+from src.embedding.ollama_embedder import OllamaEmbedding
+
+def close_to(a, b):
+    return all(abs(x - y) < 1e-6 for x, y in zip(a, b))
+
+@pytest.fixture
+def embedder(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path / "cache.db"))
+    yield OllamaEmbedding(batch_size=4, max_concurrency=2, cache=cache)
+    cache.close()
+
+def test_texts_are_sent_in_batches_and_keep_their_order(embedder, fake_ollama):
+    texts = [f"text number {i}" for i in range(10)]
+    embeddings = embedder.get_text_embedding_batch(texts)
+    assert fake_ollama.calls["embed"] == 3
+    assert fake_ollama.calls["embed_inputs"] == 10
+    for text, embedding in zip(texts, embeddings):
+        assert close_to(embedding, fake_embedding(text, fake_ollama.dim))
+
+def test_cached_and_repeated_texts_are_not_sent_again(embedder, fake_ollama):
+    embedder.get_text_embedding_batch(["a", "b", "a"])
+    assert fake_ollama.calls["embed_inputs"] == 2
+    embedder.get_text_embedding_batch(["a", "b", "c"])
+    assert fake_ollama.calls["embed_inputs"] == 3
+
+def test_async_batches_match_sync(embedder, fake_ollama):
+    texts = [f"async text {i}" for i in range(9)]
+    embeddings = asyncio.run(embedder.aget_text_embedding_batch(texts))
+    assert fake_ollama.calls["embed"] == 3
+    assert all(close_to(e, fake_embedding(t, fake_ollama.dim)) for t, e in zip(texts, embeddings))
+
+def test_servers_without_api_embed_fall_back_to_single_requests(embedder, fake_ollama):
+    fake_ollama.legacy = True
+    texts = [f"legacy {i}" for i in range(5)]
+    embeddings = embedder.get_text_embedding_batch(texts)
+    assert fake_ollama.calls["embeddings"] == 5
+    assert all(close_to(e, fake_embedding(t, fake_ollama.dim)) for t, e in zip(texts, embeddings))
+
+def test_async_fallback_stays_within_the_admission_limit(embedder, fake_ollama, monkeypatch):
+    # Every single-text request holds its own slot, so no more than the scheduler allows run at once
+    fake_ollama.legacy = True
+    fake_ollama.latency = 0.02
+    monkeypatch.setattr(ollama_embedder, "admission", AdmissionScheduler(concurrency=2, queue_size=100, max_wait=0))
+    lock, state = threading.Lock(), {"active": 0, "peak": 0}
+    single = OllamaEmbedding._aembed_single
+
+    async def counted(self, text):
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        try:
+            return await single(self, text)
+        finally:
+            with lock:
+                state["active"] -= 1
+
+    monkeypatch.setattr(OllamaEmbedding, "_aembed_single", counted)
+    embeddings = asyncio.run(embedder.aget_text_embedding_batch([f"bounded {i}" for i in range(12)]))
+    assert len(embeddings) == 12
+    assert fake_ollama.calls["embeddings"] == 12
+    assert state["peak"] <= 2
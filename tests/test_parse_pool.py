@@ -0,0 +1,62 @@
+# rag_system/tests/test_parse_pool.py
+import os
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+from helpers import ingest, ingest_batch
+from src.ingestion import pdf_loader
+from src.ingestion.pipeline import IngestPipeline
+
+def break_pool():
+    # A worker that exits abruptly breaks the whole pool, as an OOM kill or a crash in PyMuPDF would
+    pool = pdf_loader.get_parse_pool()
+    with pytest.raises(BrokenProcessPool):
+        pool.submit(os._exit, 1).result()
+    return pool
+
+def test_reset_replaces_the_broken_pool_once():
+    broken = break_pool()
+    replacement = pdf_loader.reset_parse_pool(broken)
+
+    assert replacement is not broken
+    assert pdf_loader.reset_parse_pool(broken) is replacement
+    assert pdf_loader.get_parse_pool() is replacement
+
+def test_iter_pdf_parts_recovers_from_a_broken_pool(make_pdf):
+    break_pool()
+    parts = list(pdf_loader.iter_pdf_parts(str(make_pdf("after-crash.pdf", pages=3, seed=300)), pages_per_part=2))
+
+    assert [len(documents) for documents, _ in parts] == [2, 1]
+
+def test_ingest_after_worker_crash(client, make_pdf, session_id):
+    break_pool()
+    job = ingest(client, make_pdf("single.pdf", pages=2, seed=301), session_id)
+
+    assert job["status"] == "done"
+    assert job["pages_written"] == 2
+
+def test_batch_retries_ranges_lost_with_the_pool(client, make_pdf, session_id, monkeypatch):
+    real_submit = IngestPipeline._submit
+    crashes = []
+
+    def submit(self, pool, job, start, last):
+        # The first range submitted takes its worker down with it
+        if not crashes:
+            crashes.append(job.filename)
+            return pool.submit(os._exit, 1)
+        return real_submit(self, pool, job, start, last)
+    monkeypatch.setattr(IngestPipeline, "_submit", submit)
+    files = [(f"crash-{seed}.pdf", make_pdf(f"crash-{seed}.pdf", pages=2, seed=310 + seed).read_bytes()) for seed in range(3)]
+    batch = ingest_batch(client, files, session_id)
+
+    assert crashes == ["crash-0.pdf"]
+    assert batch["ingested"] == 3
+    assert batch["pages_written"] == 6
+
+def test_batch_fails_a_file_that_keeps_breaking_the_pool(client, make_pdf, session_id, monkeypatch):
+    monkeypatch.setattr(IngestPipeline, "_submit", lambda self, pool, job, start, last: pool.submit(os._exit, 1))
+    batch = ingest_batch(client, [("poison.pdf", make_pdf("poison.pdf", pages=1, seed=320).read_bytes())], session_id)
+    assert batch["failed"] == 1
+
+    monkeypatch.undo()
+    batch = ingest_batch(client, [("healthy.pdf", make_pdf("healthy.pdf", pages=1, seed=321).read_bytes())], session_id)
+    assert batch["ingested"] == 1
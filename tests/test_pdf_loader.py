@@ -0,0 +1,39 @@
+# rag_system/tests/test_pdf_loader.py
+import hashlib
+from src.ingestion.pdf_loader import iter_pdf_pages, iter_pdf_parts, load_pdf, load_pdf_first_range, load_pdf_range
+
+def digest(documents) -> str:
+    hasher = hashlib.sha256()
+    for doc in documents:
+        hasher.update(doc.text.encode("utf-8"))
+    return hasher.hexdigest()
+
+def test_page_ranges_match_whole_file(make_pdf):
+    path = str(make_pdf("ranges.pdf", pages=7, seed=200))
+    documents, file_digest = load_pdf(path)
+
+    parts = list(iter_pdf_parts(path, pages_per_part=3))
+    ranged = [doc for part, _ in parts for doc in part]
+    assert [len(part) for part, _ in parts] == [3, 3, 1]
+    assert {page_count for _, page_count in parts} == {7}
+    assert [doc.doc_id for doc in ranged] == [doc.doc_id for doc in documents]
+    assert digest(ranged) == file_digest
+
+def test_shared_hasher_continues_across_ranges(make_pdf):
+    path = str(make_pdf("hasher.pdf", pages=5, seed=201))
+    _, file_digest = load_pdf(path)
+
+    hasher = hashlib.sha256()
+    for start, stop in ((0, 2), (2, 5)):
+        pages = iter_pdf_pages(path, start, stop, hasher=hasher)
+        for _ in pages:
+            pass
+    assert hasher.hexdigest() == file_digest
+
+def test_first_range_returns_page_count(make_pdf):
+    path = str(make_pdf("first.pdf", pages=4, seed=202))
+    documents, page_count = load_pdf_first_range(path, 3)
+
+    assert page_count == 4
+    assert [doc.metadata["page"] for doc in documents] == [1, 2, 3]
+    assert [doc.metadata["page"] for doc in load_pdf_range(path, 3, 6)] == [4]
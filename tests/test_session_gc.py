@@ -0,0 +1,46 @@
+# rag_system/tests/test_session_gc.py
+import csv
+import hashlib
+import pytest
+from helpers import ask, ingest
+from src.config.app_settings import AppSettings
+from src.container import get_container
+from src.ingestion.file_registry import is_file_in_session
+
+@pytest.fixture
+def source_data(tmp_path, monkeypatch):
+    # Only this test's sessions are candidates, the other tests' folders stay out of reach
+    monkeypatch.setattr(AppSettings, "SOURCE_DATA", str(tmp_path / "source-data"))
+    monkeypatch.setattr(AppSettings, "LOG_CLEANUP_FILE", str(tmp_path / "cleanup_log.csv"))
+    return tmp_path / "source-data"
+
+def test_cleanup_removes_sessions_without_history(client, make_pdf, session_id, source_data):
+    index_manager = get_container().index_manager
+    kept, unused = session_id, session_id + "-unused"
+    ingest(client, make_pdf("kept.pdf", pages=2, seed=220), kept)
+    path = make_pdf("unused.pdf", pages=2, seed=221)
+    ingest(client, path, unused)
+    ask(client, kept, "what does the document say about the valve?")
+
+    dry_run = client.delete("/cleanup-unused-sessions?dry_run=true").json()
+    assert dry_run["sessions"] == [unused] and dry_run["bytes_reclaimed"] > 0
+    assert (source_data / unused).exists()
+    assert client.delete("/cleanup-unused-sessions?min_age_seconds=3600").json()["sessions"] == []
+
+    report = client.delete("/cleanup-unused-sessions").json()
+    assert report["sessions"] == [unused]
+    assert report["vectors_deleted"] > 0
+    assert not (source_data / unused).exists()
+    assert not index_manager.has_session_documents(unused)
+    assert not is_file_in_session(hashlib.sha256(path.read_bytes()).hexdigest(), unused)
+    assert index_manager.has_session_documents(kept) and (source_data / kept).exists()
+    with open(AppSettings.LOG_CLEANUP_FILE) as f:
+        assert [row["session_id"] for row in csv.DictReader(f)] == [unused]
+
+def test_cleanup_stops_at_the_time_budget(client, source_data):
+    for name in ("old-a", "old-b"):
+        (source_data / name).mkdir(parents=True)
+    report = get_container().session_gc.run(time_budget=1e-9)
+
+    assert report["sessions"] == [] and report["remaining"] == 2
+    assert set(get_container().session_gc.run()["sessions"]) == {"old-a", "old-b"}
@@ -0,0 +1,40 @@
+# rag_system/tests/test_session_retrieval.py
+import shutil
+from pathlib import Path
+from helpers import ask, ingest
+
+def test_ask_only_retrieves_the_sessions_own_documents(client, make_pdf, session_id):
+    other_session = session_id + "-other"
+    ingest(client, make_pdf("mine.pdf", pages=3, seed=101), session_id)
+    ingest(client, make_pdf("theirs.pdf", pages=3, seed=102), other_session)
+
+    sources = ask(client, session_id, "what does the document say about the pump valve motor?")["sources"]
+    assert sources
+    assert all(source.startswith("mine.pdf") for source in sources)
+    sources = ask(client, other_session, "what does the document say about the pump valve motor?")["sources"]
+    assert all(source.startswith("theirs.pdf") for source in sources)
+
+def test_ask_does_not_ingest_the_session_again(client, make_pdf, session_id):
+    from src.container import get_container
+    ingest(client, make_pdf("once.pdf", pages=2, seed=103), session_id)
+    collection = get_container().index_manager.collection
+    before = collection.count()
+    ask(client, session_id, "which part is specified in section one?")
+    ask(client, session_id, "which part is specified in section two?")
+    assert collection.count() == before
+
+def test_untagged_session_folder_is_indexed_on_first_question(client, make_pdf, session_id, data_dir):
+    # Uploads from before session tagging only exist as files in the session folder
+    from src.container import get_container
+    folder = Path(data_dir) / "source-data" / session_id
+    folder.mkdir(parents=True)
+    shutil.copy(make_pdf("legacy.pdf", pages=2, seed=104), folder / "legacy.pdf")
+    assert not get_container().index_manager.has_session_documents(session_id)
+
+    sources = ask(client, session_id, "what does the document say about the sensor bearing?")["sources"]
+    assert sources and all(source.startswith("legacy.pdf") for source in sources)
+    assert get_container().index_manager.has_session_documents(session_id)
+
+def test_ask_without_source_data_is_404(client, session_id):
+    response = client.post("/ask", data={"query": "anything", "session_id": session_id})
+    assert response.status_code == 404
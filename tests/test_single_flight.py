@@ -0,0 +1,97 @@
+# rag_system/tests/test_single_flight.py
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from helpers import ingest
+from src.clients.single_flight import AsyncSingleFlight, SingleFlight, StreamSingleFlight, normalize_query
+
+def test_concurrent_callers_share_one_call():
+    flight, calls, release = SingleFlight("test"), [], threading.Event()
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return "value"
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(flight.do, "key", work) for _ in range(4)]
+        time.sleep(0.1)
+        release.set()
+        assert [future.result() for future in futures] == ["value"] * 4
+
+    assert len(calls) == 1
+    # Nothing is cached, the next caller runs the call again
+    assert flight.do("key", lambda: "again") == "again"
+
+def test_callers_share_the_exception():
+    flight, release = SingleFlight("test"), threading.Event()
+
+    def work():
+        release.wait(5)
+        raise ValueError("boom")
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futures = [pool.submit(flight.do, "key", work) for _ in range(2)]
+        time.sleep(0.1)
+        release.set()
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result()
+
+def test_async_call_survives_a_cancelled_caller():
+    async def main():
+        flight, calls = AsyncSingleFlight("test"), []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "value"
+        first = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second, calls
+    value, calls = asyncio.run(main())
+
+    assert value == "value" and len(calls) == 1
+
+def test_late_stream_subscriber_replays_the_items():
+    async def main():
+        flight, calls = StreamSingleFlight("test"), []
+
+        async def tokens():
+            for token in ("a", "b", "c"):
+                await asyncio.sleep(0.01)
+                yield token
+
+        async def start():
+            calls.append(1)
+            return "metadata", tokens()
+
+        async def read():
+            metadata, stream = await flight.do("key", start)
+            return metadata, [token async for token in stream]
+        first = asyncio.ensure_future(read())
+        await asyncio.sleep(0.015)
+        second = await read()
+        return await first, second, calls
+    first, second, calls = asyncio.run(main())
+
+    assert first == second == ("metadata", ["a", "b", "c"])
+    assert len(calls) == 1
+
+def test_identical_questions_in_flight_generate_once(client, fake_ollama, make_pdf, session_id):
+    ingest(client, make_pdf("flight.pdf", pages=2, seed=230), session_id)
+    fake_ollama.latency = 0.3
+    fake_ollama.reset_calls()
+
+    def ask(query: str) -> dict:
+        return client.post("/ask", data={"query": query, "session_id": session_id, "bypass_cache": "true"}).json()
+    queries = ["What is the pump  valve for?", "what is the pump valve for?", "WHAT IS THE PUMP VALVE FOR?"]
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        answers = list(pool.map(ask, queries))
+
+    assert normalize_query(queries[0]) == normalize_query(queries[2])
+    assert len({answer["answer"] for answer in answers}) == 1
+    assert fake_ollama.calls["generate"] == 1
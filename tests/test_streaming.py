@@ -0,0 +1,42 @@
+# rag_system/tests/test_streaming.py
+import json
+import re
+from helpers import ingest
+
+def parse_sse(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+def ttft_count(client, cache: str) -> int:
+    match = re.search(rf'rag_time_to_first_token_seconds_count{{cache="{cache}"}} (\d+)', client.get("/metrics").text)
+    return int(match.group(1)) if match else 0
+
+def test_stream_sends_sources_tokens_then_done(client, make_pdf, session_id, fake_ollama):
+    ingest(client, make_pdf("stream.pdf", pages=2, seed=201), session_id)
+    fake_ollama.answer_tokens = 6
+    response = client.post("/ask/stream", data={"query": "what is the pump valve used for?", "session_id": session_id,
+                                                 "bypass_cache": "true"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_sse(response.text)
+    names = [name for name, _ in events]
+    assert names[0] == "sources" and names[-1] == "done"
+    assert names.count("token") == 6
+    assert events[0][1]["sources"][0].startswith("stream.pdf")
+    answer = "".join(data["text"] for name, data in events if name == "token")
+    assert answer.startswith("Fake answer")
+    assert events[-1][1]["time_to_first_token_ms"] <= events[-1][1]["total_ms"]
+
+    history = client.get(f"/history/{session_id}").json()
+    assert any(record["response"] == answer for record in history)
+
+def test_time_to_first_token_is_a_histogram(client, make_pdf, session_id):
+    ingest(client, make_pdf("ttft.pdf", pages=2, seed=202), session_id)
+    before = ttft_count(client, "miss")
+    client.post("/ask/stream", data={"query": "tell me about the motor sensor", "session_id": session_id,
+                                     "bypass_cache": "true"})
+    assert ttft_count(client, "miss") == before + 1
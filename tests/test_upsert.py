@@ -0,0 +1,40 @@
+# rag_system/tests/test_upsert.py
+import pytest
+from src.container import get_container
+from src.ingestion.pdf_loader import load_pdf, tag_documents
+
+@pytest.fixture(params=["numpy", "chroma"])
+def manager(request):
+    if request.param == "chroma":
+        return request.getfixturevalue("chroma_manager")
+    return get_container().index_manager
+
+def session_rows(manager, session_id: str) -> dict:
+    rows = manager.collection.get(where={"session_id": session_id}, include=["documents"])
+    return dict(zip(rows["ids"], rows["documents"]))
+
+def test_writing_a_file_again_replaces_its_chunks(client, manager, make_pdf, session_id):
+    documents, file_hash = load_pdf(str(make_pdf("again.pdf", pages=2, seed=250)))
+    tag_documents(documents, file_hash=file_hash, session_id=session_id, filename="again.pdf")
+    written = manager.add_documents(documents)
+    first = session_rows(manager, session_id)
+    count = manager.collection.count()
+
+    assert manager.add_documents(documents) == written
+    assert session_rows(manager, session_id) == first
+    assert manager.collection.count() == count
+
+def test_changed_chunk_text_replaces_the_stored_copy(client, manager, make_pdf, session_id):
+    documents, file_hash = load_pdf(str(make_pdf("edited.pdf", pages=1, seed=251)))
+    tag_documents(documents, file_hash=file_hash, session_id=session_id, filename="edited.pdf")
+    manager.add_documents(documents)
+    node = manager.get_nodes([next(iter(session_rows(manager, session_id)))], session_id)[0]
+    count = manager.collection.count()
+
+    node.set_content("Replacement text about the flywheel.")
+    node.embedding = [0.5] * len(manager.get_embeddings([node.node_id], session_id)[node.node_id])
+    manager.upsert_nodes([node])
+
+    assert session_rows(manager, session_id)[node.node_id] == "Replacement text about the flywheel."
+    assert manager.collection.count() == count
+    assert [node_id for node_id, _ in manager.lexical_index.search("flywheel", session_id)] == [node.node_id]